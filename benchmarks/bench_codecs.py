@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Benchmark the cost of every output codec.
+
+For every codec configuration this encodes a number of synthetic parts and
+reports the average encode time and the average size of a part. Run it from
+the root of the repository::
+
+    python3 benchmarks/bench_codecs.py --segment-size 30 --parts 5
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dj_feet.codecs import get_codec
+
+logging.getLogger().setLevel(logging.WARNING)
+
+SAMPLING_RATE = 22050
+
+#: The codec configurations to benchmark: (format, bitrate, complexity)
+CONFIGURATIONS = [
+    ('wav', None, None),
+    ('flac', None, 0),
+    ('flac', None, 5),
+    ('flac', None, 12),
+    ('opus', 32, 0),
+    ('opus', 64, 5),
+    ('opus', 64, 10),
+    ('mp3', 64, 9),
+    ('mp3', 128, 5),
+    ('mp3', 128, 0),
+    ('mp3', 192, 5),
+]
+
+
+def synthetic_part(segment_size, seed=0):
+    """Create a part of music like audio: a bass tone, clicks and noise."""
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(segment_size * SAMPLING_RATE)) / SAMPLING_RATE
+    part = 0.3 * np.sin(2 * np.pi * 55 * t) + 0.1 * np.sin(2 * np.pi * 440 * t)
+    beat = (t % 0.5) < 0.02  # 120 BPM
+    part[beat] += 0.5 * rng.uniform(-1, 1, beat.sum())
+    part += 0.05 * rng.normal(size=len(t))
+    return np.clip(part, -1, 1).astype(np.float32)
+
+
+def benchmark(codec, parts, folder):
+    times = []
+    sizes = []
+    for i, part in enumerate(parts):
+        filename = os.path.join(folder, 'part{}.{}'.format(i, codec.extension))
+        start = time.perf_counter()
+        codec.encode(part, SAMPLING_RATE, filename)
+        times.append(time.perf_counter() - start)
+        sizes.append(os.path.getsize(filename))
+    return np.mean(times), np.mean(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--segment-size', type=float, default=30)
+    parser.add_argument('--parts', type=int, default=3)
+    args = parser.parse_args()
+
+    parts = [synthetic_part(args.segment_size, i) for i in range(args.parts)]
+    print('{:<6} {:>8} {:>10} {:>14} {:>12} {:>10}'.format(
+        'codec', 'bitrate', 'complexity', 'encode (s)', 'size (kB)',
+        'realtime'))
+    with tempfile.TemporaryDirectory() as folder:
+        for name, bitrate, complexity in CONFIGURATIONS:
+            codec = get_codec(name, bitrate, complexity)
+            encode_time, size = benchmark(codec, parts, folder)
+            print('{:<6} {:>8} {:>10} {:>14.3f} {:>12.1f} {:>9.0f}x'.format(
+                name, '-' if bitrate is None else bitrate, '-'
+                if complexity is None else complexity, encode_time,
+                size / 1024, args.segment_size / encode_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Benchmark the numeric kernels of the transitioners.
+
+Every kernel of :mod:`dj_feet.kernels` is compared with the implementation
+that was used before the kernels existed. The compiled kernels are only
+benchmarked if numba is installed. Run it from the root of the repository::
+
+    python3 benchmarks/bench_kernels.py --repeat 20
+"""
+
+import argparse
+import logging
+import os
+import sys
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dj_feet import kernels
+
+logging.getLogger().setLevel(logging.WARNING)
+
+SAMPLING_RATE = 22050
+
+
+def reference_correlation_average(prev_beat, next_beat):
+    return np.average(np.correlate(prev_beat, next_beat, mode="valid"))
+
+
+def reference_fade(prev_seg, next_seg, fade_steps):
+    final_seg = np.array([])
+    delta = 1 / len(prev_seg)
+    for p in range(0, len(prev_seg), fade_steps):
+        end = min(p + fade_steps, len(prev_seg))
+        final_seg = np.append(final_seg, prev_seg[p:end] * (1 - delta * (
+            (end + p) / 2)))
+    for n in range(0, len(next_seg), fade_steps):
+        end = min(n + fade_steps, len(next_seg))
+        final_seg[n:end] += next_seg[n:end] * (delta * ((end + n) / 2))
+    return final_seg
+
+
+def implementations(name):
+    result = [('reference', globals()['reference_' + name]),
+              ('numpy', getattr(kernels, name + '_numpy'))]
+    if getattr(kernels, name + '_jit') is not None:
+        result.append(('numba', getattr(kernels, name + '_jit')))
+    return result
+
+
+def benchmark(name, args, repeat):
+    print('{} {}'.format(name, ' x '.join(str(len(a)) for a in args[:2])))
+    reference = None
+    for impl_name, func in implementations(name):
+        func(*args)  # Compile the jitted kernels before timing them.
+        duration = min(timeit.repeat(
+            lambda: func(*args), number=1, repeat=repeat))
+        if reference is None:
+            reference = duration
+        print('    {:<10} {:>12.3f} ms {:>9.1f}x'.format(
+            impl_name, duration * 1000, reference / duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--bpm', type=float, default=120)
+    parser.add_argument('--fade-time', type=float, default=6)
+    parser.add_argument('--fade-steps', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    beat = int(60 / args.bpm * SAMPLING_RATE)
+    for prev_len, next_len in [(beat, beat), (beat, int(beat * 0.95))]:
+        benchmark('correlation_average', (
+            rng.uniform(-1, 1, prev_len).astype(np.float32),
+            rng.uniform(-1, 1, next_len).astype(np.float32)), args.repeat)
+
+    fade = int(args.fade_time * SAMPLING_RATE)
+    benchmark('fade', (rng.uniform(-1, 1, fade).astype(np.float32),
+                       rng.uniform(-1, 1, fade).astype(np.float32),
+                       args.fade_steps), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Benchmark the distance calculations of the NCA picker.
+
+The songs are synthetic: every song has a random covariance matrix and mean,
+so no music files are needed. For every amount of songs the time to calculate
+the distance from one song to all other songs is reported, both pair by pair
+with the implementation that was used before ``NCAPicker.distances`` existed
+and in one batch with ``NCAPicker.distances``, without and with the cached
+factorizations of the songs. After that the time needed by
+``NCAPicker._optimize_weights`` is reported for different amounts of
+feedback, both with the finite differences that were used before the
+gradient was calculated and with ``NCAPicker.feedback_loss``. Finally the
+time needed for one online step (``learning_rate``) over a window of
+``history_size`` transitions is reported, and the time needed to find the
+next song with and without the nearest neighbour index (``ann_candidates``)
+in a large library of songs in ``--clusters`` similar groups. The recall is
+the part of the 10 closest songs that are candidates of the index.
+Run it from the root of the repository::
+
+    python3 benchmarks/bench_pickers.py --songs 50 200 800
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import timeit
+import numpy as np
+import scipy.optimize
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dj_feet.pickers import NCAPicker
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+class SyntheticNCAPicker(NCAPicker):
+    """A :class:`NCAPicker` with random characteristics for its songs.
+
+    If ``clusters`` is set every song is a small variation of one of this
+    amount of random songs.
+    """
+    clusters = 0
+
+    def calculate_songs_characteristics(self, mfcc_amount, cache_dir):
+        rng = np.random.RandomState(0)
+        size = (max(self.clusters, 1), mfcc_amount, mfcc_amount)
+        bases = rng.normal(size=size)
+        centers = rng.normal(size=size[:2])
+        spread = 0.3 if self.clusters else 1
+        song_properties = dict()
+        for song_file in self.song_files:
+            cluster = rng.randint(len(bases))
+            base = spread * rng.normal(size=(mfcc_amount, mfcc_amount))
+            mean = spread * rng.normal(size=mfcc_amount)
+            if self.clusters:
+                base += bases[cluster]
+                mean += centers[cluster]
+            covariance = np.dot(base, base.T) + np.eye(mfcc_amount)
+            song_properties[song_file] = (np.linalg.cholesky(covariance),
+                                          mean, rng.uniform(115, 125))
+        pca = rng.uniform(0.5, 1, size=(mfcc_amount, self.weight_amount))
+        weights = np.ones(self.weight_amount) / self.weight_amount
+        return pca, song_properties, weights
+
+
+def reference_distance(picker, song_q, song_p, weights=None):
+    # A copy of the weights, so the cached covariance matrices are not used.
+    weights = np.array(picker.weights if weights is None else weights)
+
+    def kl(p, q):
+        cov_p = picker.covariance(p, weights)
+        cov_q = picker.covariance(q, weights)
+        cov_q_inv = np.linalg.inv(cov_q)
+        m_p = picker.song_properties[p][1]
+        m_q = picker.song_properties[q][1]
+        d = cov_p.shape[0]
+        return (np.log(np.linalg.det(cov_q) / np.linalg.det(cov_p)) +
+                np.trace(np.dot(cov_q_inv, cov_p)) + np.dot(
+                    np.transpose(m_p - m_q), np.dot(cov_q_inv,
+                                                    (m_p - m_q))) - d) / 2
+
+    return (kl(song_q, song_p) + kl(song_p, song_q)) / 2
+
+
+def reference_loss(picker, weights, transitions):
+    dsts = [
+        reference_distance(picker, p, n, weights) for p, n, _ in transitions
+    ]
+    factor = 50 / max(dsts)
+    chances = picker.normalize_chances([np.exp(-d * factor) for d in dsts])
+    return sum(abs(fb - c) for (_, _, fb), c in zip(transitions, chances))
+
+
+def optimize(picker, transitions, reference):
+    if reference:
+        fun, jac = lambda w: reference_loss(picker, w, transitions), False
+    else:
+        fun, jac = lambda w: picker.feedback_loss(w, transitions), True
+    return scipy.optimize.minimize(
+        fun, tuple(picker.weights), method='SLSQP', jac=jac,
+        constraints={'type': 'eq', 'fun': lambda w: sum(w) - 1},
+        bounds=[[0, 1] for _ in picker.weights])
+
+
+def make_picker(amount, mfcc_amount, weight_amount, **kwargs):
+    folder = tempfile.mkdtemp()
+    for i in range(amount):
+        with open(os.path.join(folder, 'song{}.wav'.format(i)), 'w'):
+            pass
+    return SyntheticNCAPicker(
+        folder, mfcc_amount=mfcc_amount, weight_amount=weight_amount,
+        **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--songs', type=int, nargs='+',
+                        default=[50, 200, 800])
+    parser.add_argument('--mfcc-amount', type=int, default=20)
+    parser.add_argument('--weight-amount', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--feedback', type=int, nargs='+',
+                        default=[10, 50, 200])
+    parser.add_argument('--library', type=int, nargs='+',
+                        default=[5000, 20000])
+    parser.add_argument('--clusters', type=int, default=50)
+    parser.add_argument('--ann-candidates', type=int, default=100)
+    args = parser.parse_args()
+
+    print('{:>6} {:>12} {:>12} {:>12} {:>9} {:>10}'.format(
+        'songs', 'pairwise', 'batched', 'cached', 'speedup', 'max error'))
+    for amount in args.songs:
+        picker = make_picker(amount, args.mfcc_amount, args.weight_amount)
+        current, *others = sorted(picker.song_properties)
+
+        pairwise = min(timeit.repeat(
+            lambda: [reference_distance(picker, current, other)
+                     for other in others],
+            number=1, repeat=args.repeat))
+        batched = min(timeit.repeat(
+            lambda: picker.distances(current, others, picker.weights.copy()),
+            number=1, repeat=args.repeat))
+        cached = min(timeit.repeat(
+            lambda: picker.distances(current, others),
+            number=1, repeat=args.repeat))
+
+        expected = np.array(
+            [reference_distance(picker, current, o) for o in others])
+        error = np.max(np.abs(picker.distances(current, others) - expected) /
+                       np.maximum(1, np.abs(expected)))
+        print('{:>6} {:>9.2f} ms {:>9.2f} ms {:>9.2f} ms {:>8.1f}x {:>10.1e}'
+              .format(amount, 1000 * pairwise, 1000 * batched, 1000 * cached,
+                      pairwise / cached, error))
+
+    print()
+    print('{:>8} {:>12} {:>12} {:>9} {:>10} {:>10} {:>10}'.format(
+        'feedback', 'finite diff', 'gradient', 'speedup', 'loss', 'diff loss',
+        'grad loss'))
+    picker = make_picker(min(args.songs), args.mfcc_amount,
+                         args.weight_amount)
+    songs = sorted(picker.song_properties)
+    rng = random.Random(0)
+    for amount in args.feedback:
+        transitions = [
+            tuple(rng.sample(songs, 2)) + (rng.random(), )
+            for _ in range(amount)
+        ]
+        durations, losses = [], []
+        for reference in [True, False]:
+            start = timeit.default_timer()
+            losses.append(optimize(picker, transitions, reference).fun)
+            durations.append(timeit.default_timer() - start)
+        print('{:>8} {:>9.1f} ms {:>9.1f} ms {:>8.1f}x {:>10.4f} {:>10.4f} '
+              '{:>10.4f}'.format(
+                  amount, 1000 * durations[0], 1000 * durations[1],
+                  durations[0] / durations[1],
+                  picker.feedback_loss(picker.weights, transitions)[0],
+                  *losses))
+
+    print()
+    print('{:>8} {:>12}'.format('history', 'online step'))
+    picker.learning_rate = 0.01
+    for amount in args.feedback:
+        picker.done_transitions = [
+            tuple(rng.sample(songs, 2)) + (rng.random(), )
+            for _ in range(amount)
+        ]
+        duration = min(timeit.repeat(
+            picker._optimize_weights, number=1, repeat=args.repeat))
+        print('{:>8} {:>9.2f} ms'.format(amount, 1000 * duration))
+
+    print()
+    print('{:>8} {:>12} {:>12} {:>12} {:>8}'.format(
+        'library', 'index build', 'exact pick', 'ann pick', 'recall'))
+    SyntheticNCAPicker.clusters = args.clusters
+    for amount in args.library:
+        picker = make_picker(amount, args.mfcc_amount, args.weight_amount,
+                             max_tempo_percent=100,
+                             ann_candidates=args.ann_candidates)
+        songs = sorted(picker.song_properties)
+        start = timeit.default_timer()
+        picker.ann_index()
+        build = timeit.default_timer() - start
+        exact, approximate, recalls = 0, 0, []
+        for current in songs[:args.repeat]:
+            picker.current_song = current
+            others = list(picker.all_but_current_song())
+            start = timeit.default_timer()
+            distances = picker.distances(current, others)
+            exact += timeit.default_timer() - start
+            start = timeit.default_timer()
+            candidates = picker.nearest_songs(others)
+            picker.distances(current, candidates)
+            approximate += timeit.default_timer() - start
+            closest = {others[i] for i in np.argsort(distances)[:10]}
+            recalls.append(len(closest & set(candidates)) / 10)
+        print('{:>8} {:>9.0f} ms {:>9.1f} ms {:>9.1f} ms {:>7.0f}%'.format(
+            amount, 1000 * build, 1000 * exact / args.repeat,
+            1000 * approximate / args.repeat, 100 * np.mean(recalls)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Benchmark the cost of creating a part for different segment sizes.
+
+This runs the work the core loop does for every part: merging two songs,
+writing the part and talking to the remote, which is a local HTTP server
+here. The songs are the synthetic click tracks of :mod:`corpus`, so no
+music files are needed.
+For every segment size it reports the time needed per part and if parts are
+created faster than they are played. Run it from the root of the
+repository::
+
+    python3 benchmarks/bench_segments.py --segment-sizes 5 10 30 --parts 20
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dj_feet.communicators import ProtocolCommunicator
+from dj_feet.transitioners import InfJukeboxTransitioner
+from corpus import make_corpus, to_song
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+class Remote(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    #: The time in seconds the remote needs to answer a request.
+    latency = 0
+
+
+class RemoteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.server.latency)
+        body = json.dumps({'feedback': {}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(segment_size, args, songs, communicator, remote):
+    output_folder = tempfile.mkdtemp()
+    transitioner = InfJukeboxTransitioner(
+        output_folder,
+        segment_size=segment_size,
+        fade_time=min(args.fade_time, segment_size / 2),
+        stream_parts=args.stream_parts)
+    rng = random.Random(0)
+    prev_song = None
+    pending_feedback = None
+    times = {'merge': [], 'write': [], 'remote': []}
+    for _ in range(args.parts):
+        next_song = prev_song
+        if prev_song is None or rng.random() < args.change:
+            next_song = rng.choice([s for s in songs if s is not prev_song])
+            next_song.curr_time = 0
+
+        start = time.perf_counter()
+        try:
+            part, _ = transitioner.merge(prev_song, next_song)
+        except ValueError:
+            # Like the core loop, pick another song when this one ends.
+            next_song = rng.choice([s for s in songs if s is not prev_song])
+            next_song.curr_time = 0
+            part, _ = transitioner.merge(prev_song, next_song)
+        merged = time.perf_counter()
+        transitioner.write_sample(part)
+        written = time.perf_counter()
+        # Like the core loop, use the feedback requested for the previous
+        # part and request the feedback for the next part.
+        if pending_feedback is not None:
+            pending_feedback()
+        communicator.iteration(remote, 0, next_song)
+        pending_feedback = communicator.request_user_feedback(
+            remote, 0, 0, segment_size)
+        done = time.perf_counter()
+
+        times['merge'].append(merged - start)
+        times['write'].append(written - merged)
+        times['remote'].append(done - written)
+        prev_song = next_song
+    communicator.flush()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--segment-sizes', type=int, nargs='+',
+                        default=[5, 10, 30])
+    parser.add_argument('--parts', type=int, default=20)
+    parser.add_argument('--fade-time', type=float, default=2)
+    parser.add_argument('--change', type=float, default=0.5,
+                        help='The chance to change songs after a part')
+    parser.add_argument('--stream-parts', action='store_true')
+    parser.add_argument('--latency', type=float, default=50,
+                        help='The time in ms the remote needs per request')
+    args = parser.parse_args()
+
+    songs = [to_song(track) for track in make_corpus(4, length=120)]
+    server = Remote(('127.0.0.1', 0), RemoteHandler)
+    server.latency = args.latency / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    remote = 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    communicators = [
+        ('blocking', lambda: ProtocolCommunicator()),
+        ('keep alive, async', lambda: ProtocolCommunicator(
+            keep_alive=True, async_iteration=True, async_feedback=True)),
+    ]
+    # Compile the kernels before timing anything.
+    run(args.segment_sizes[0], argparse.Namespace(
+        parts=2, fade_time=args.fade_time, change=1, stream_parts=False),
+        songs, ProtocolCommunicator(), remote)
+    print('{:>8} {:<18} {:>9} {:>9} {:>9} {:>9} {:>8}'.format(
+        'segment', 'communicator', 'merge', 'write', 'remote', 'worst',
+        'speed'))
+    for segment_size in args.segment_sizes:
+        for name, make_communicator in communicators:
+            times = run(segment_size, args, songs, make_communicator(),
+                        remote)
+            total = np.sum([times[key] for key in times], axis=0)
+            print('{:>7}s {:<18} {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms '
+                  '{:>7.0f}x {}'.format(
+                      segment_size, name, 1000 * np.mean(times['merge']),
+                      1000 * np.mean(times['write']),
+                      1000 * np.mean(times['remote']), 1000 * total.max(),
+                      segment_size / total.mean(), 'real-time'
+                      if total.max() < segment_size else 'TOO SLOW'))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
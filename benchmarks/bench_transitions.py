@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Benchmark the speed and the quality of the transitions.
+
+Transitions between the synthetic click tracks of :mod:`corpus` are created
+for every combination of segment size and fade time. The time needed by
+``merge``, ``combine_similar_frames``, ``fade_frames`` and ``write_sample``
+is reported, together with how often the middle of a transition is on a real
+beat of both tracks, how often both beats have the same position in their
+bar and how often a transition is in a silent region. Run it from the root of
+the repository::
+
+    python3 benchmarks/bench_transitions.py --transitions 20
+
+Use ``--detect-beats`` to let librosa find the beats of the tracks instead of
+using the known beats. The error is the mean distance between the middle of
+a transition and the nearest real beat.
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import librosa
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dj_feet.transitioners import InfJukeboxTransitioner
+from corpus import make_corpus, to_song
+
+logging.getLogger().setLevel(logging.WARNING)
+
+TIMED = ['merge', 'combine_similar_frames', 'fade_frames', 'write_sample']
+
+
+def timed(times, name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    times[name].append(time.perf_counter() - start)
+    return result
+
+
+def run(transitioner, songs, tracks, transitions, tolerance, seed):
+    rng = random.Random(seed)
+    segment_size = transitioner.segment_size
+    offset = librosa.core.time_to_samples(
+        [transitioner.fade_time / 2], songs[0].sampling_rate)[0]
+    times = {name: [] for name in TIMED}
+    checks = {'on beat': 0, 'same bar position': 0, 'in silence': 0}
+    errors = []
+
+    for _ in range(transitions):
+        prev_song, next_song = rng.sample(songs, 2)
+        length = len(prev_song.time_series) / prev_song.sampling_rate
+        prev_song.curr_time = rng.uniform(0, length - 2 * segment_size - 1)
+        next_song.curr_time = 0
+
+        seg_start, seg_end = prev_song.next_segment(segment_size)
+        _, prev_end, next_start = timed(
+            times, 'combine_similar_frames',
+            transitioner.combine_similar_frames, prev_song, next_song,
+            seg_start, seg_end)
+        prev_mid, next_mid = prev_end + offset, next_start - offset
+        timed(times, 'fade_frames', transitioner.fade_frames, prev_song,
+              prev_mid, next_song, next_mid)
+        part, _ = timed(times, 'merge', transitioner.merge, prev_song,
+                        next_song)
+        timed(times, 'write_sample', transitioner.write_sample, part)
+
+        prev_track = tracks[prev_song.file_location]
+        next_track = tracks[next_song.file_location]
+        prev_beat, prev_distance = prev_track.nearest_beat(prev_mid)
+        next_beat, next_distance = next_track.nearest_beat(next_mid)
+        errors.append(max(prev_distance, next_distance))
+        if max(prev_distance, next_distance) <= tolerance:
+            checks['on beat'] += 1
+            if prev_track.bar_positions[prev_beat] == \
+               next_track.bar_positions[next_beat]:
+                checks['same bar position'] += 1
+        if prev_track.in_silence(prev_mid) or \
+           next_track.in_silence(next_mid):
+            checks['in silence'] += 1
+    return times, checks, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--tracks', type=int, default=6)
+    parser.add_argument('--transitions', type=int, default=10)
+    parser.add_argument('--segment-sizes', type=int, nargs='+',
+                        default=[5, 10, 30])
+    parser.add_argument('--fade-times', type=float, nargs='+',
+                        default=[1, 2, 6])
+    parser.add_argument('--output-format', default='mp3')
+    parser.add_argument('--tolerance', type=float, default=0.06,
+                        help='The maximum distance in seconds to a beat, '
+                        'detected beats are a few tens of ms late')
+    parser.add_argument('--detect-beats', action='store_true')
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    corpus = make_corpus(args.tracks, length=max(args.segment_sizes) * 4)
+    songs = [
+        to_song(track, folder if args.detect_beats else None)
+        for track in corpus
+    ]
+    tracks = {
+        song.file_location: track
+        for song, track in zip(songs, corpus)
+    }
+
+    print('{:>8} {:>5} {:>9} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8} {:>8}'.format(
+        'segment', 'fade', 'merge', 'combine', 'fade', 'write', 'error',
+        'on beat', 'in bar', 'silent'))
+    for segment_size in args.segment_sizes:
+        for fade_time in args.fade_times:
+            if fade_time >= segment_size:
+                continue
+            transitioner = InfJukeboxTransitioner(
+                folder,
+                segment_size=segment_size,
+                fade_time=fade_time,
+                output_format=args.output_format)
+            # Compile the kernels before timing anything.
+            run(transitioner, songs, tracks, 1, args.tolerance, -1)
+            times, checks, errors = run(transitioner, songs, tracks,
+                                        args.transitions, args.tolerance, 0)
+            print('{:>7}s {:>4}s {} {:>7.1f}ms  {}'.format(
+                segment_size, fade_time, ' '.join(
+                    '{:>7.1f}ms'.format(1000 * np.mean(times[name]))
+                    for name in TIMED), 1000 * np.mean(errors), ' '.join(
+                        '{:>7.0f}%'.format(100 * checks[name] /
+                                           args.transitions)
+                        for name in ['on beat', 'same bar position',
+                                     'in silence'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""A corpus of synthetic click tracks with known properties.
+
+Every track is a click on every beat, with an accented click on the first
+beat of every bar, on top of a quiet tone and some noise. The tempo, the
+position of every beat and bar and the silent regions of a track are known,
+so the transitions a transitioner chooses can be checked against them. The
+benchmarks import this module::
+
+    from corpus import make_corpus, to_song
+"""
+
+import os
+import librosa
+import numpy as np
+
+from dj_feet.song import Song
+
+SAMPLING_RATE = 22050
+
+
+class ClickTrack:
+    """A synthetic track and its ground truth.
+
+    :ivar numpy.array time_series: The samples of the track.
+    :ivar numpy.array beats: The sample index of every beat, beats in silent
+                             regions are not included.
+    :ivar numpy.array bar_positions: The position of every beat in its bar,
+                                     0 is the accented first beat.
+    :ivar list silences: The silent regions as ``(start, end)`` sample
+                         indices.
+    """
+
+    def __init__(self,
+                 name,
+                 bpm,
+                 length,
+                 seed=0,
+                 beats_per_bar=4,
+                 offset=0.25,
+                 silences=(),
+                 sampling_rate=SAMPLING_RATE):
+        """
+        :param str name: The file name of the track.
+        :param float bpm: The tempo in beats per minute.
+        :param float length: The length in seconds.
+        :param int seed: The seed of the noise and the tone.
+        :param int beats_per_bar: The amount of beats in a bar.
+        :param float offset: The time in seconds of the first beat.
+        :param silences: The silent regions as ``(start, end)`` in seconds.
+        :type silences: list(tuple(float, float))
+        :param int sampling_rate: The sampling rate of the track.
+        """
+        rng = np.random.RandomState(seed)
+        self.name = name
+        self.bpm = bpm
+        self.sampling_rate = sampling_rate
+        self.beats_per_bar = beats_per_bar
+
+        t = np.arange(int(length * sampling_rate)) / sampling_rate
+        tone = rng.uniform(110, 440)
+        series = 0.05 * np.sin(2 * np.pi * tone * t)
+        series += 0.02 * rng.normal(size=len(t))
+
+        beat_times = np.arange(offset, length, 60 / bpm)
+        beats = (beat_times * sampling_rate).astype(int)
+        bar_positions = np.arange(len(beats)) % beats_per_bar
+        click = int(0.02 * sampling_rate)
+        decay = np.exp(-np.arange(click) / (click / 4))
+        for beat, position in zip(beats, bar_positions):
+            pitch = 1760 if position == 0 else 880
+            volume = 0.9 if position == 0 else 0.5
+            end = min(beat + click, len(series))
+            series[beat:end] += volume * decay[:end - beat] * np.sin(
+                2 * np.pi * pitch * t[:end - beat])
+
+        self.silences = [(int(start * sampling_rate),
+                          int(end * sampling_rate))
+                         for start, end in silences]
+        audible = np.ones(len(beats), dtype=bool)
+        for start, end in self.silences:
+            series[start:end] = 0
+            audible &= (beats < start) | (beats >= end)
+        self.time_series = series.astype(np.float32)
+        self.beats = beats[audible]
+        self.bar_positions = bar_positions[audible]
+
+    def in_silence(self, sample):
+        """Check if the given sample is in a silent region.
+
+        :param int sample: The index of the sample.
+        :rtype: bool
+        """
+        return any(start <= sample < end for start, end in self.silences)
+
+    def nearest_beat(self, sample):
+        """Find the beat nearest to the given sample.
+
+        :param int sample: The index of the sample.
+        :returns: The index of the beat in :attr:`beats` and its distance in
+                  seconds to ``sample``.
+        :rtype: tuple(int, float)
+        """
+        idx = int(np.argmin(np.abs(self.beats - sample)))
+        return idx, abs(int(self.beats[idx]) - sample) / self.sampling_rate
+
+
+def make_corpus(amount=8, length=120, seed=0, min_bpm=90, max_bpm=150):
+    """Create tracks with different tempos, offsets and silent regions.
+
+    Every third track has a silent break in its first minute.
+
+    :param int amount: The amount of tracks.
+    :param float length: The length in seconds of every track.
+    :param int seed: The seed of the corpus.
+    :param float min_bpm: The lowest tempo.
+    :param float max_bpm: The highest tempo.
+    :rtype: list(ClickTrack)
+    """
+    rng = np.random.RandomState(seed)
+    tracks = []
+    for i in range(amount):
+        silences = []
+        if i % 3 == 2:
+            start = rng.uniform(10, 50)
+            silences.append((start, start + rng.uniform(1, 4)))
+        tracks.append(
+            ClickTrack(
+                'click{}.wav'.format(i),
+                bpm=round(rng.uniform(min_bpm, max_bpm), 1),
+                length=length,
+                seed=seed * 1000 + i,
+                offset=rng.uniform(0.1, 0.6),
+                silences=silences))
+    return tracks
+
+
+def to_song(track, folder=None):
+    """Create a processed :class:`dj_feet.song.Song` of the given track.
+
+    :param ClickTrack track: The track to use.
+    :param folder: If this is given the track is written to a wav file in this
+                   folder and processed by the song itself, so its beats are
+                   detected by librosa. Otherwise the song uses the known
+                   beats.
+    :type folder: str or None
+    :rtype: dj_feet.song.Song
+    """
+    if folder is not None:
+        song_file = os.path.join(folder, track.name)
+        librosa.output.write_wav(
+            song_file, track.time_series, track.sampling_rate, norm=False)
+        return Song(song_file)
+
+    song = Song(track.name, process=False)
+    song.time_series = track.time_series
+    song.sampling_rate = track.sampling_rate
+    song.tempo = track.bpm
+    song.beat_track = track.beats
+    return song
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""This module contains an approximate nearest neighbour index.
+
+The index is a forest of random projection trees, every tree splits the
+points in two halves at the median of their projection on the difference of
+two random points until a leaf has at most ``leaf_size`` points. A query
+searches the leaves of all trees closest to the query point first, which
+gives a small set of candidates that are compared exactly.
+"""
+
+import heapq
+import logging
+import numpy as np
+
+l = logging.getLogger(__name__)
+
+
+class RandomProjectionForest:
+    """A forest of random projection trees over a fixed set of points."""
+
+    def __init__(self, points, tree_amount=8, leaf_size=32, seed=0):
+        """
+        :param numpy.array points: The points to index, one point per row.
+        :param int tree_amount: The amount of trees to build, more trees give
+                                better results but make queries slower.
+        :param int leaf_size: The maximum amount of points in a leaf.
+        :param int seed: The seed of the random projections.
+        :raises ValueError: If the amount of trees or the leaf size is less
+                            than 1.
+        """
+        if tree_amount < 1 or leaf_size < 1:
+            raise ValueError("At least one tree and one point per leaf are"
+                             " needed")
+        self.points = np.asarray(points, dtype=float)
+        self.leaf_size = leaf_size
+        rng = np.random.RandomState(seed)
+        # Every node is a tuple of a direction, a threshold and the two
+        # children, or a tuple of ``None`` and the indices of a leaf.
+        self._nodes = []
+        self._roots = [
+            self._build(np.arange(len(self.points)), rng)
+            for _ in range(tree_amount)
+        ]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, indices, rng):
+        node = len(self._nodes)
+        self._nodes.append(None)
+        if len(indices) <= self.leaf_size:
+            self._nodes[node] = (None, indices)
+            return node
+
+        first, second = self.points[rng.choice(indices, 2, replace=False)]
+        direction = first - second
+        if not direction.any():
+            direction = rng.normal(size=self.points.shape[1])
+        projections = self.points[indices].dot(direction)
+        threshold = np.median(projections)
+        left = projections < threshold
+        if left.all() or not left.any():
+            # All projections are the same, so split the points randomly.
+            left = np.zeros(len(indices), dtype=bool)
+            left[rng.permutation(len(indices))[:len(indices) // 2]] = True
+        self._nodes[node] = (direction, threshold,
+                             self._build(indices[left], rng),
+                             self._build(indices[~left], rng))
+        return node
+
+    def query(self, point, amount, allowed=None, search_amount=None):
+        """Find the points closest to the given point.
+
+        :param numpy.array point: The point to search for.
+        :param int amount: The maximum amount of points to return.
+        :param allowed: A mask of the points that can be returned, if this is
+                        ``None`` all points can be returned.
+        :type allowed: numpy.array or None
+        :param search_amount: The amount of allowed candidates to compare
+                              exactly, more candidates give better results.
+                              If this is ``None`` it is ``amount`` times the
+                              amount of trees.
+        :type search_amount: int or None
+        :returns: The indices of the found points, the closest point first.
+        :rtype: numpy.array
+        """
+        if search_amount is None:
+            search_amount = amount * len(self._roots)
+        point = np.asarray(point, dtype=float)
+        # Search the nodes by the distance of the point to the splitting
+        # plane that separated them from the point, closest first.
+        heap = [(-np.inf, root) for root in self._roots]
+        found = set()
+        candidates = []
+        while heap and len(candidates) < search_amount:
+            margin, node = heapq.heappop(heap)
+            content = self._nodes[node]
+            if content[0] is None:
+                for idx in content[1]:
+                    if idx not in found and (allowed is None or
+                                             allowed[idx]):
+                        found.add(idx)
+                        candidates.append(idx)
+                continue
+            direction, threshold, left, right = content
+            side = point.dot(direction) - threshold
+            norm = np.linalg.norm(direction)
+            heapq.heappush(heap, (max(margin, side / norm), left))
+            heapq.heappush(heap, (max(margin, -side / norm), right))
+
+        candidates = np.array(candidates, dtype=int)
+        distances = np.linalg.norm(self.points[candidates] - point, axis=1)
+        return candidates[np.argsort(distances, kind='stable')[:amount]]
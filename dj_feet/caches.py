@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""This module contains the persistent caches used by DJFeet."""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+import logging
+
+l = logging.getLogger(__name__)
+
+
+class TransitionCache:
+    """A persistent cache of the transitions found by a transitioner.
+
+    The cache maps a transition to the beats chosen for it, so a transition
+    that is done again does not have to search for similar beats. The cache is
+    stored as a JSON file which is rewritten atomically on every change.
+    """
+
+    def __init__(self, cache_file):
+        """
+        :param str cache_file: The file to store the cache in. If the file
+                               exists the cache is loaded from it, if it is
+                               broken it is ignored.
+        """
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._transitions = {}
+        self.detached = False
+        #: The transitions stored since :func:`detach` was called, as tuples
+        #: of a key and a value.
+        self.added = []
+        if os.path.isfile(cache_file):
+            try:
+                with open(cache_file) as f:
+                    self._transitions = json.load(f)
+            except (OSError, ValueError):
+                l.warning("Could not load transition cache %s, ignoring it.",
+                          cache_file)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _to_key(key):
+        return json.dumps(list(key))
+
+    def __len__(self):
+        return len(self._transitions)
+
+    def get(self, key):
+        """Get the cached transition for the given key.
+
+        :param tuple key: The key of the transition, this should only contain
+                          values that can be serialized as JSON.
+        :returns: The cached value or ``None`` if the key is not cached.
+        :rtype: list or None
+        """
+        with self._lock:
+            return self._transitions.get(self._to_key(key))
+
+    def put(self, key, value):
+        """Store the given value for the given key and write the cache.
+
+        :param tuple key: The key of the transition.
+        :param value: The value to store, this should be serializable as JSON.
+        :returns: Nothing of value.
+        """
+        self.update([(key, value)])
+
+    def update(self, transitions):
+        """Store the given transitions and write the cache once.
+
+        :param transitions: The keys and values to store, like the arguments
+                            of :func:`put`.
+        :type transitions: list(tuple(tuple, list))
+        :returns: Nothing of value.
+        """
+        with self._lock:
+            for key, value in transitions:
+                self._transitions[self._to_key(key)] = list(value)
+                if self.detached:
+                    self.added.append((tuple(key), list(value)))
+            if self.detached or not transitions:
+                return
+            # Other processes can use the same cache file, so every writer
+            # needs its own temporary file.
+            tmp_file = '{}.{}.tmp'.format(self.cache_file, os.getpid())
+            try:
+                with open(tmp_file, 'w') as f:
+                    json.dump(self._transitions, f)
+                os.replace(tmp_file, self.cache_file)
+            except OSError:
+                l.warning("Could not write transition cache %s.",
+                          self.cache_file)
+
+    def detach(self):
+        """Stop writing the cache file.
+
+        The transitions stored after this call are collected in
+        :attr:`added`, so the process that owns the cache can store them.
+        This is used for copies of the cache in worker processes, which would
+        otherwise overwrite the transitions found by each other.
+
+        :returns: Nothing of value.
+        """
+        with self._lock:
+            self.detached = True
+            self.added = []
+
+
+class PartCache:
+    """A persistent cache of encoded parts with a maximum size.
+
+    Every part is stored in a file named after the hash of its key, so a part
+    that was created with the same inputs before can be copied instead of
+    being mixed and encoded again. The cache outlives the songs, so a key
+    should identify a song by its content instead of its name, see
+    :attr:`dj_feet.song.Song.content_id`. When the cache grows larger than its
+    maximum size the least recently used parts are deleted.
+    """
+
+    def __init__(self, cache_folder, max_size):
+        """
+        :param str cache_folder: The folder to store the parts in, it is
+                                 created if it does not exist.
+        :param int max_size: The maximum amount of bytes of all cached parts.
+        """
+        self.cache_folder = cache_folder
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _cached_file(self, key):
+        digest = hashlib.sha256(json.dumps(list(key)).encode()).hexdigest()
+        return os.path.join(self.cache_folder, digest)
+
+    def _cached_files(self):
+        for filename in os.listdir(self.cache_folder):
+            cached_file = os.path.join(self.cache_folder, filename)
+            if not filename.endswith('.tmp'):
+                yield cached_file, os.stat(cached_file)
+
+    @property
+    def size(self):
+        """The amount of bytes of all cached parts.
+
+        :rtype: int
+        """
+        with self._lock:
+            return sum(stat.st_size for _, stat in self._cached_files())
+
+    def get(self, key, part_file):
+        """Copy the cached part for the given key to ``part_file``.
+
+        The part is hard linked if possible, otherwise it is copied.
+
+        :param tuple key: The key of the part, this should only contain values
+                          that can be serialized as JSON.
+        :param str part_file: The location to copy the part to.
+        :returns: If the part was cached.
+        :rtype: bool
+        """
+        cached_file = self._cached_file(key)
+        with self._lock:
+            try:
+                # Mark the part as recently used.
+                os.utime(cached_file)
+                if os.path.lexists(part_file):
+                    os.remove(part_file)
+                try:
+                    os.link(cached_file, part_file)
+                except OSError:
+                    shutil.copyfile(cached_file, part_file)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def put(self, key, part_file):
+        """Store a copy of the given part and delete old parts if needed.
+
+        :param tuple key: The key of the part.
+        :param str part_file: The encoded part to store.
+        :returns: Nothing of value.
+        """
+        cached_file = self._cached_file(key)
+        tmp_file = '{}.{}.tmp'.format(cached_file, os.getpid())
+        with self._lock:
+            try:
+                shutil.copyfile(part_file, tmp_file)
+                os.replace(tmp_file, cached_file)
+            except OSError:
+                l.warning("Could not cache part %s.", part_file)
+                return
+            self._evict()
+
+    def _evict(self):
+        cached = sorted(
+            self._cached_files(), key=lambda item: item[1].st_mtime)
+        size = sum(stat.st_size for _, stat in cached)
+        for cached_file, stat in cached:
+            if size <= self.max_size:
+                break
+            l.debug("Evicting cached part %s.", cached_file)
+            try:
+                os.remove(cached_file)
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
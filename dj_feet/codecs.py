@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""This module contains the codecs that can be used to encode the parts.
+
+A codec is selected by its :attr:`Codec.name`, see :func:`get_codec`.
+"""
+
+import os
+import subprocess
+import tempfile
+import librosa
+import numpy as np
+import pydub
+from pydub.exceptions import CouldntEncodeError
+
+from .helpers import get_all_subclasses
+from .part import Part
+
+
+class EncoderStream:
+    """A running encoder that writes the audio it receives to a file.
+
+    The encoder writes its output directly to the file, so the encoded audio
+    becomes available while audio is still being written to the stream. Use
+    :func:`Codec.open_stream` to create a stream.
+    """
+
+    def __init__(self, args, output=None):
+        """
+        :param list(str) args: The command to start the encoder with. The
+                               encoder should read raw 32 bit float samples
+                               from its stdin.
+        :param output: The file or socket to connect to the stdout of the
+                       encoder, if this is ``None`` the stdout is discarded.
+        """
+        self.args = args
+        self.process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL if output is None else output,
+            stderr=subprocess.PIPE)
+
+    def write(self, sample):
+        """Write the given audio to the encoder.
+
+        :param numpy.array sample: The audio to write.
+        :raises CouldntEncodeError: If the encoder stopped.
+        :returns: Nothing of value.
+        """
+        try:
+            self.process.stdin.write(
+                np.asarray(sample, dtype='<f4').tobytes())
+        except BrokenPipeError:
+            self.close()
+            raise CouldntEncodeError("Encoder stopped unexpectedly")
+
+    def close(self):
+        """Finish the encoding and wait for the encoder to stop.
+
+        :raises CouldntEncodeError: If the encoder failed.
+        :returns: Nothing of value.
+        """
+        if self.process.returncode is not None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        error = self.process.stderr.read()
+        self.process.stderr.close()
+        if self.process.wait() != 0:
+            raise CouldntEncodeError(
+                "Encoding failed. Command: {}, error: {}".format(
+                    ' '.join(self.args), error.decode(errors='replace')))
+
+
+class Codec:
+    """This is the base Codec class.
+
+    You should not use this class directly but should inherit from this class
+    if you want to implement a new output format. A subclass should set
+    :attr:`name`, :attr:`extension` and :attr:`format`.
+    """
+
+    #: The name used to select this codec.
+    name = None
+    #: The extension (without dot) of the files written by this codec.
+    extension = None
+    #: The format passed to ffmpeg by :mod:`pydub`.
+    format = None
+    #: The ffmpeg encoder to use, ``None`` means the default of the format.
+    codec = None
+
+    def __init__(self, bitrate=None, complexity=None):
+        """
+        :param bitrate: The bitrate in kbps to encode with, ``None`` means the
+                        default of the encoder. This is ignored by lossless
+                        codecs.
+        :type bitrate: int or None
+        :param complexity: The compression level of the encoder, ``None``
+                           means the default of the encoder. Its meaning and
+                           range depend on the codec.
+        :type complexity: int or None
+        """
+        self.bitrate = bitrate
+        self.complexity = complexity
+
+    def parameters(self):
+        """Get the extra parameters passed to the encoder.
+
+        :returns: A list of extra command line arguments for ffmpeg.
+        :rtype: list(str)
+        """
+        if self.complexity is None:
+            return []
+        return ['-compression_level', str(self.complexity)]
+
+    def encode(self, sample, sampling_rate, filename):
+        """Encode the given sample and write it to ``filename``.
+
+        The regions of a :class:`dj_feet.part.Part` are written to an encoder
+        one by one, so the part is never copied in one array. The encoded
+        part is written to a temporary file that replaces ``filename`` when
+        it is complete.
+
+        :param sample: The audio to encode.
+        :type sample: numpy.array or dj_feet.part.Part
+        :param int sampling_rate: The sampling rate of ``sample``.
+        :param str filename: The file to write the encoded audio to.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        if isinstance(sample, Part):
+            self._encode_regions(sample, sampling_rate, filename)
+            return
+
+        kwargs = {'format': self.format}
+        if self.codec is not None:
+            kwargs['codec'] = self.codec
+        if self.bitrate is not None:
+            kwargs['bitrate'] = '{}k'.format(self.bitrate)
+        parameters = self.parameters()
+        if parameters:
+            kwargs['parameters'] = parameters
+
+        with tempfile.NamedTemporaryFile() as wavfile:
+            librosa.output.write_wav(
+                wavfile.name, sample, sr=sampling_rate, norm=False)
+            wavfile.flush()
+            pydub.AudioSegment.from_wav(wavfile.name).export(
+                filename, **kwargs)
+
+    def _encode_regions(self, part, sampling_rate, filename):
+        tmp_file = filename + '.tmp'
+        try:
+            stream = self.open_stream(sampling_rate, tmp_file)
+            try:
+                for chunk in part.chunks(sampling_rate):
+                    stream.write(chunk)
+            finally:
+                stream.close()
+            os.replace(tmp_file, filename)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def stream_arguments(self, sampling_rate, filename):
+        """Get the ffmpeg command used by :func:`open_stream`.
+
+        :param int sampling_rate: The sampling rate of the audio.
+        :param str filename: The file to write the encoded audio to.
+        :returns: The command as a list of arguments.
+        :rtype: list(str)
+        """
+        args = [
+            pydub.AudioSegment.converter, '-y', '-loglevel', 'error', '-f',
+            'f32le', '-ar', str(sampling_rate), '-ac', '1', '-i', 'pipe:0'
+        ]
+        if self.codec is not None:
+            args += ['-acodec', self.codec]
+        if self.bitrate is not None:
+            args += ['-b:a', '{}k'.format(self.bitrate)]
+        return args + self.parameters() + ['-f', self.format, filename]
+
+    def open_stream(self, sampling_rate, filename, output=None):
+        """Start an encoder that writes to ``filename`` while it receives
+        audio.
+
+        :param int sampling_rate: The sampling rate of the audio that will be
+                                  written to the stream.
+        :param str filename: The file to write the encoded audio to, this is
+                             ``pipe:1`` to write it to ``output``.
+        :param output: The file or socket the encoder writes ``pipe:1`` to.
+        :returns: The stream to write the audio to, it should be closed when
+                  all audio is written.
+        :rtype: EncoderStream
+        """
+        args = self.stream_arguments(sampling_rate, filename)
+        if output is not None:
+            # Do not wait for megabytes of input to probe the raw audio and
+            # write every packet immediately, so the listener receives the
+            # audio as soon as it is encoded.
+            args[-3:-3] = ['-flush_packets', '1']
+            args[args.index('-f'):args.index('-f')] = ['-probesize', '32']
+        return EncoderStream(args, output)
+
+
+class WavCodec(Codec):
+    """Write raw WAV files.
+
+    This costs almost no CPU but results in very large parts.
+    """
+    name = 'wav'
+    extension = 'wav'
+    format = 'wav'
+    codec = 'pcm_f32le'
+
+    def encode(self, sample, sampling_rate, filename):
+        if isinstance(sample, Part):
+            super(WavCodec, self).encode(sample, sampling_rate, filename)
+        else:
+            librosa.output.write_wav(
+                filename, sample, sr=sampling_rate, norm=False)
+
+
+class FlacCodec(Codec):
+    """Write lossless FLAC files, ``complexity`` ranges from 0 to 12."""
+    name = 'flac'
+    extension = 'flac'
+    format = 'flac'
+
+
+class OpusCodec(Codec):
+    """Write Opus files, ``complexity`` ranges from 0 to 10.
+
+    Opus does not support our sampling rate so the audio is resampled to
+    24kHz while encoding.
+    """
+    name = 'opus'
+    extension = 'opus'
+    format = 'opus'
+    codec = 'libopus'
+
+    def parameters(self):
+        return ['-ar', '24000'] + super(OpusCodec, self).parameters()
+
+
+class Mp3Codec(Codec):
+    """Write MP3 files, ``complexity`` ranges from 0 (best) to 9 (fastest)."""
+    name = 'mp3'
+    extension = 'mp3'
+    format = 'mp3'
+
+
+class PassthroughMp3Codec(Mp3Codec):
+    """Write MP3 files that can be cut at frame boundaries.
+
+    The bit reservoir is disabled so every frame can be decoded without the
+    frames before it, and no Xing header is written. This codec cannot be
+    selected by its name, see :mod:`dj_feet.mp3`.
+    """
+    name = None
+
+    def parameters(self):
+        return ['-reservoir', '0', '-write_xing', '0'] + super(
+            PassthroughMp3Codec, self).parameters()
+
+
+def get_codec(name, bitrate=None, complexity=None):
+    """Get a codec instance by its name.
+
+    :param str name: The :attr:`Codec.name` of the codec to get.
+    :param bitrate: The bitrate to pass to the codec.
+    :type bitrate: int or None
+    :param complexity: The complexity to pass to the codec.
+    :type complexity: int or None
+    :raises ValueError: If there is no codec with the given name.
+    :returns: A new codec instance.
+    :rtype: Codec
+    """
+    for cls in get_all_subclasses(Codec):
+        if cls.name == name:
+            return cls(bitrate=bitrate, complexity=complexity)
+    raise ValueError("Unknown output format {}".format(name))
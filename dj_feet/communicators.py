@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 import requests
 import os
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 from .helpers import SongStruct
+from .workers import TaskQueue
 
 
 class Communicator:
@@ -26,6 +29,24 @@ class Communicator:
         """
         raise NotImplementedError("This method should be overridden")
 
+    def request_user_feedback(self, remote, controller_id, start, end):
+        """Request the user feedback before it is needed.
+
+        The core loop calls this before it sleeps and calls the returned
+        function when it needs the feedback. By default the feedback is only
+        requested when the returned function is called.
+
+        :param string remote: The http address of the remote including http
+        :param controller_id: The id of the current controller
+        :param int start: The start time to request the feedback from
+        :param int end: The end time to request the feedback from
+        :returns: A function without arguments that returns the feedback of
+                  :func:`get_user_feedback`.
+        :rtype: callable
+        """
+        return functools.partial(self.get_user_feedback, remote,
+                                 controller_id, start, end)
+
     def iteration(self, remote, controller_id, mixed):
         """Do the iteration request to a server or let the user know
         something.
@@ -38,6 +59,17 @@ class Communicator:
         """
         raise NotImplementedError("This method should be overridden")
 
+    def flush(self, timeout=None):
+        """Wait till all iterations are sent.
+
+        :param timeout: The maximum amount of seconds to wait, ``None`` means
+                        waiting until everything is sent.
+        :type timeout: float or None
+        :returns: If all iterations are sent.
+        :rtype: bool
+        """
+        return True
+
 
 class SimpleCommunicator(Communicator):
     """A simple communicator that does not conform to the standard protocol.
@@ -83,8 +115,35 @@ class ProtocolCommunicator(Communicator):
     required information.
     """
 
-    def __init__(self):
+    def __init__(self,
+                 keep_alive=False,
+                 async_iteration=False,
+                 async_feedback=False):
+        """
+        :param bool keep_alive: Keep the connection to the remote open and
+                                reuse it for every request, so only the first
+                                request has to connect.
+        :param bool async_iteration: Send the iterations on a background
+                                     thread so the core loop does not wait
+                                     for the remote. The iterations are still
+                                     sent in order.
+        :param bool async_feedback: Request the feedback on a background
+                                    thread while the core loop sleeps, so the
+                                    loop does not wait for the remote. The
+                                    feedback is requested one part earlier,
+                                    so the feedback given in the last part
+                                    before the request might be missed.
+        """
         super(ProtocolCommunicator, self).__init__()
+        self.session = requests.Session() if keep_alive else None
+        self.iteration_queue = TaskQueue(
+            'iterations') if async_iteration else None
+        self.feedback_pool = ThreadPoolExecutor(1) if async_feedback else None
+
+    def _post(self, url, **kwargs):
+        if self.session is None:
+            return requests.post(url, **kwargs)
+        return self.session.post(url, **kwargs)
 
     def get_user_feedback(self, remote, controller_id, start, end):
         """Perform a POST request to '/get_feedback'.
@@ -100,7 +159,7 @@ class ProtocolCommunicator(Communicator):
                   server
         :rtype: dict
         """
-        res = requests.post(
+        res = self._post(
             remote + '/get_feedback/',
             json={
                 'start': start,
@@ -109,21 +168,61 @@ class ProtocolCommunicator(Communicator):
             })
         return res.json()['feedback']
 
+    def request_user_feedback(self, remote, controller_id, start, end):
+        """Request the user feedback before it is needed.
+
+        If ``async_feedback`` is set the request is sent right away on a
+        background thread, otherwise it is sent when the returned function is
+        called.
+
+        :param string remote: The http address of the remote including http
+        :param controller_id: The id of the current controller
+        :param int start: The start time to request the feedback from
+        :param int end: The end time to request the feedback from
+        :returns: A function without arguments that returns the feedback, it
+                  raises the exception of the request if it failed.
+        :rtype: callable
+        """
+        if self.feedback_pool is None:
+            return super(ProtocolCommunicator, self).request_user_feedback(
+                remote, controller_id, start, end)
+        return self.feedback_pool.submit(self.get_user_feedback, remote,
+                                         controller_id, start, end).result
+
     def iteration(self, remote, controller_id, mixed):
         """Do a iteration request to the remote.
 
-        .. note:: This call is blocking: this means it waits till the remote as
-                  replied.
+        .. note:: This call is blocking unless ``async_iteration`` is set: this
+                  means it waits till the remote as replied.
 
         :param string remote: The http address of the remote including http
         :param controller_id: The id of the current controller
         :param string mixed: The filename without extension of the song mixed.
         :returns: Nothing of value
         """
-        requests.post(
+        post = functools.partial(
+            self._post,
             remote + '/iteration/',
             json={
                 'filename_mixed':
                 os.path.splitext(os.path.basename(mixed.file_location))[0],
                 'id': controller_id
             })
+        if self.iteration_queue is None:
+            post()
+        else:
+            self.iteration_queue.put(post)
+
+    def flush(self, timeout=None):
+        """Wait till all iterations are sent.
+
+        :param timeout: The maximum amount of seconds to wait, ``None`` means
+                        waiting until everything is sent.
+        :type timeout: float or None
+        :raises Exception: If sending an iteration failed.
+        :returns: If all iterations are sent.
+        :rtype: bool
+        """
+        if self.iteration_queue is None:
+            return True
+        return self.iteration_queue.join(timeout)
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 import sys
 import time
+import threading
 import requests
 import logging
 
+from .song import Song
+
 l = logging.getLogger(__name__)
 
 
@@ -26,6 +29,8 @@ def loop(app_id, remote, controller, picker, transitioner, communicator):
     :rtype: None
     """
     merge_times = []
+    pending_feedback = None  # Returns the feedback requested last iteration
+    unannounced = []  # The songs of written parts that are not announced
     new_sample = None
     old_sample = None
     segment_size = None
@@ -34,31 +39,45 @@ def loop(app_id, remote, controller, picker, transitioner, communicator):
     l.debug("Starting core loop.")
 
     while controller.should_continue():
-        if len(merge_times) == 4:
+        if pending_feedback is not None:
             l.debug('Getting feedback from the communicator.')
-            start, end = merge_times.pop(0)
-            feedback = communicator.get_user_feedback(remote, app_id, start,
-                                                      end)
+            feedback = pending_feedback()
+            pending_feedback = None
             l.debug('Received feedback from the server: %s.', feedback)
         else:
             l.debug('Not enough samples yet, so got no feedback.')
             feedback = {}
 
-        l.debug("Starting picking.")
-        new_sample = picker.get_next_song(feedback, force=False)
-        l.info("Got song: %s.", new_sample.file_location)
-        while True:
-            try:
-                result, merge_offset = transitioner.merge(old_sample,
-                                                          new_sample)
-                break
-            except ValueError:
-                l.info('Got song %s however' +
-                       ' this was not good, trying with force',
-                       new_sample.file_location)
-                new_sample = picker.get_next_song(feedback, force=True)
-
-        l.debug("Appending succeeded. Continuing")
+        opening = warmup = None
+        if old_sample is None:
+            opening = transitioner.fast_start(picker)
+
+        if opening is None:
+            l.debug("Starting picking.")
+            new_sample = picker.get_next_song(feedback, force=False)
+            l.info("Got song: %s.", new_sample.file_location)
+            while True:
+                try:
+                    result, merge_offset = transitioner.merge(old_sample,
+                                                              new_sample)
+                    break
+                except ValueError:
+                    l.info('Got song %s however' +
+                           ' this was not good, trying with force',
+                           new_sample.file_location)
+                    new_sample = picker.get_next_song(feedback, force=True)
+
+            l.debug("Appending succeeded. Continuing")
+        else:
+            # The first part is already written, so the song only has to be
+            # processed before the next merge.
+            song_file, merge_offset = opening
+            l.info("Fast started with song: %s.", song_file)
+            new_sample = Song(song_file, process=False)
+            new_sample.curr_time = merge_offset
+            warmup = threading.Thread(
+                target=new_sample.set_process_data, daemon=True)
+            warmup.start()
 
         if merge_times:
             # First update the previous segment with an ending time
@@ -67,6 +86,18 @@ def loop(app_id, remote, controller, picker, transitioner, communicator):
             # Now insert the starting time of the new segment
             merge_times.append([segment_size * i + merge_offset])
         else:
+            merge_times.append([0])
+            segment_size = merge_offset
+
+        if opening is None:
+            l.info("Writing result to output.")
+            transitioner.write_sample(result)
+        unannounced.append(new_sample)
+
+        if epoch is None:
+            # The epoch is the moment the first part is available, so wait
+            # till it is actually written.
+            transitioner.wait_for_output()
             epoch = time.time()
             requests.post(
                 remote + "/controller_started/",
@@ -74,13 +105,20 @@ def loop(app_id, remote, controller, picker, transitioner, communicator):
                     'id': app_id,
                     'epoch': round(epoch),
                 })
-            merge_times.append([0])
-            segment_size = merge_offset
-
-        l.info("Writing result to output.")
-        transitioner.write_sample(result)
         l.debug("Wrote to output.")
 
+        if warmup is not None:
+            warmup.join()
+            l.debug("Processed the fast started song.")
+
+        # Let the transitioner prepare the next merge and the communicator
+        # request the feedback for it while we are sleeping.
+        transitioner.speculate(new_sample, picker)
+        if len(merge_times) == 4:
+            start, end = merge_times.pop(0)
+            pending_feedback = communicator.request_user_feedback(
+                remote, app_id, start, end)
+
         sleep_time = controller.get_waittime(epoch, segment_size)
         l.info('Going to sleep for %f seconds', sleep_time)
         if sleep_time < 0:
@@ -88,9 +126,26 @@ def loop(app_id, remote, controller, picker, transitioner, communicator):
         else:
             time.sleep(sleep_time)
 
-        l.info("Letting the communicator know we did an iteration.")
-        communicator.iteration(remote, app_id, new_sample)
+        # Only announce parts that are written, the others are announced in
+        # a later iteration.
+        if transitioner.wait_for_output(timeout=0):
+            l.info("Letting the communicator know we did an iteration.")
+            for song in unannounced:
+                communicator.iteration(remote, app_id, song)
+            unannounced = []
+        else:
+            l.warning('Part %d is not yet written, postponing iteration.', i)
+
+        # Clients can still need the parts that are not yet announced or not
+        # yet played, all older parts may be deleted.
+        playing = int((time.time() - epoch) // segment_size)
+        transitioner.release_parts(min(i + 1 - len(unannounced), playing))
 
         old_sample = new_sample
         i += 1
+
+    transitioner.wait_for_output()
+    for song in unannounced:
+        communicator.iteration(remote, app_id, song)
+    communicator.flush()
     l.debug("Ended our core loop! We are terminating.")
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""This module contains the numeric kernels used by the transitioners.
+
+Every kernel has a numpy implementation and, if :mod:`numba` is installed, a
+compiled implementation. The module level names :func:`correlation_average`
+and :func:`fade` refer to the fastest available implementation, which is
+reported by :data:`BACKEND`. The compiled implementations are cached on disk
+and compiled when they are first called, :func:`warm_up` does this ahead of
+time.
+"""
+
+import logging
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+else:
+    # The compiler logs every compilation step on the debug level.
+    logging.getLogger('numba').setLevel(logging.WARNING)
+
+
+#: When the beats differ at most this amount of samples in length the cross
+#: correlation is calculated directly, which is faster for so few lags.
+DIRECT_LAGS = 16
+
+
+def _check_beats(prev_beat, next_beat):
+    if len(prev_beat) == 0 or len(next_beat) == 0:
+        raise ValueError("Beats cannot be empty")
+    if len(prev_beat) < len(next_beat):
+        return next_beat, prev_beat
+    return prev_beat, next_beat
+
+
+def correlation_average_numpy(prev_beat, next_beat):
+    """Get the average of the valid cross correlation of two beats.
+
+    This is equal to ``numpy.average(numpy.correlate(prev_beat, next_beat,
+    mode='valid'))``, however if there are more than :data:`DIRECT_LAGS` lags
+    this uses a prefix sum of the longest beat instead of calculating every
+    lag, which takes linear time.
+
+    :param numpy.array prev_beat: The samples of the first beat.
+    :param numpy.array next_beat: The samples of the second beat.
+    :raises ValueError: If one of the beats is empty.
+    :returns: The average of the cross correlation.
+    :rtype: float
+    """
+    longest, shortest = _check_beats(prev_beat, next_beat)
+    lags = len(longest) - len(shortest) + 1
+    if lags <= DIRECT_LAGS:
+        return float(np.average(np.correlate(longest, shortest, mode="valid")))
+    prefix = np.concatenate(([0.0], np.cumsum(longest, dtype=np.float64)))
+    windows = prefix[lags:lags + len(shortest)] - prefix[:len(shortest)]
+    return float(np.dot(shortest, windows) / lags)
+
+
+def _fade_gains(length, delta, fade_steps):
+    starts = np.arange(0, length, fade_steps)
+    ends = np.minimum(starts + fade_steps, length)
+    return np.repeat(delta * ((ends + starts) / 2), ends - starts)
+
+
+def fade_numpy(prev_seg, next_seg, fade_steps):
+    """Fade out ``prev_seg`` while fading in ``next_seg``.
+
+    The gain changes every ``fade_steps`` samples, so the fade is coarse. If
+    ``next_seg`` is longer than ``prev_seg`` it is truncated.
+
+    :param numpy.array prev_seg: The segment to fade out.
+    :param numpy.array next_seg: The segment to fade in.
+    :param int fade_steps: The amount of samples that get the same gain.
+    :returns: The faded segment, it has the length of ``prev_seg``.
+    :rtype: numpy.array
+    """
+    delta = 1 / len(prev_seg)
+    final_seg = prev_seg * (1 - _fade_gains(len(prev_seg), delta, fade_steps))
+    overlap = min(len(prev_seg), len(next_seg))
+    final_seg[:overlap] += (next_seg * _fade_gains(
+        len(next_seg), delta, fade_steps))[:overlap]
+    return final_seg
+
+
+if numba is not None:
+
+    @numba.njit(nogil=True, cache=True)
+    def _correlation_average_jit(longest, shortest):
+        lags = len(longest) - len(shortest) + 1
+        if lags <= DIRECT_LAGS:
+            total = 0.0
+            for k in range(lags):
+                for i in range(len(shortest)):
+                    total += longest[i + k] * shortest[i]
+            return total / lags
+        # A prefix sum instead of updating a running window sum, so rounding
+        # errors do not accumulate.
+        prefix = np.zeros(len(longest) + 1)
+        for i in range(len(longest)):
+            prefix[i + 1] = prefix[i] + longest[i]
+        total = 0.0
+        for i in range(len(shortest)):
+            total += shortest[i] * (prefix[i + lags] - prefix[i])
+        return total / lags
+
+    def correlation_average_jit(prev_beat, next_beat):
+        """The compiled version of :func:`correlation_average_numpy`."""
+        longest, shortest = _check_beats(prev_beat, next_beat)
+        return _correlation_average_jit(longest, shortest)
+
+    @numba.njit(nogil=True, cache=True)
+    def _fade_jit(prev_seg, next_seg, fade_steps):
+        delta = 1 / len(prev_seg)
+        final_seg = np.empty(len(prev_seg))
+        for p in range(0, len(prev_seg), fade_steps):
+            end = min(p + fade_steps, len(prev_seg))
+            gain = 1 - delta * ((end + p) / 2)
+            for i in range(p, end):
+                final_seg[i] = prev_seg[i] * gain
+        for n in range(0, len(next_seg), fade_steps):
+            end = min(n + fade_steps, len(next_seg))
+            gain = delta * ((end + n) / 2)
+            for i in range(n, min(end, len(prev_seg))):
+                final_seg[i] += next_seg[i] * gain
+        return final_seg
+
+    def fade_jit(prev_seg, next_seg, fade_steps):
+        """The compiled version of :func:`fade_numpy`."""
+        return _fade_jit(prev_seg, next_seg, fade_steps)
+
+    correlation_average = correlation_average_jit
+    fade = fade_jit
+    #: The implementation used by :func:`correlation_average` and
+    #: :func:`fade`.
+    BACKEND = 'numba'
+else:
+    correlation_average_jit = fade_jit = None
+    correlation_average = correlation_average_numpy
+    fade = fade_numpy
+    BACKEND = 'numpy'
+
+
+def warm_up():
+    """Compile or load the compiled kernels for the types of samples used.
+
+    The first call of a compiled kernel compiles it, or loads it from the
+    cache on disk, which should not happen while a part is created. Without
+    :mod:`numba` this does nothing.
+
+    :returns: Nothing of value.
+    :rtype: None
+    """
+    if numba is None:
+        return
+    for dtype in [np.float32, np.float64]:
+        samples = np.zeros(DIRECT_LAGS, dtype=dtype)
+        correlation_average_jit(samples, samples[:1])
+        fade_jit(samples, samples, 1)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""This module contains helpers to cut MP3 streams at frame boundaries.
+
+MP3 frames encoded without the bit reservoir can be decoded on their own, so
+pieces of a pre-encoded song can be copied into a part without encoding them
+again. See :class:`FrameStream`.
+"""
+
+import logging
+
+l = logging.getLogger(__name__)
+
+#: The layer III bitrates in kbps by MPEG version, MPEG 2.5 uses version 2.
+BITRATES = {
+    1: [None, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [None, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+#: The sampling rates by the version bits of the header.
+SAMPLING_RATES = {
+    0b11: [44100, 48000, 32000],  # MPEG 1
+    0b10: [22050, 24000, 16000],  # MPEG 2
+    0b00: [11025, 12000, 8000],  # MPEG 2.5
+}
+
+#: The amount of samples the LAME encoder and a decoder delay the audio. The
+#: decoded audio of frame ``j`` of a stream starts at input sample
+#: ``j * samples_per_frame - ENCODER_DELAY``.
+ENCODER_DELAY = 576 + 529
+#: The amount of whole frames of real audio an encoder needs before and after
+#: the delay around the frames it encodes, so they join the frames of another
+#: stream of the same audio. The filterbank and the overlapping MDCT of a
+#: frame depend on the audio around it.
+CONTEXT_FRAMES = 2
+
+
+class FrameHeader:
+    """The header of a single MPEG audio layer III frame."""
+
+    def __init__(self, data, offset=0):
+        """
+        :param bytes data: The data containing the header.
+        :param int offset: The offset of the header in ``data``.
+        :raises ValueError: If there is no valid layer III header at
+                            ``offset``.
+        """
+        if len(data) < offset + 4:
+            raise ValueError("Not enough data for a frame header")
+        b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+        if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+            raise ValueError("No frame sync at offset {}".format(offset))
+        version_bits = (b1 >> 3) & 0b11
+        layer_bits = (b1 >> 1) & 0b11
+        bitrate_index = b2 >> 4
+        rate_index = (b2 >> 2) & 0b11
+        if version_bits not in SAMPLING_RATES or layer_bits != 0b01 or \
+           bitrate_index in (0, 15) or rate_index == 3:
+            raise ValueError("Unsupported frame header at {}".format(offset))
+
+        self.version = 1 if version_bits == 0b11 else 2
+        self.bitrate = BITRATES[self.version][bitrate_index]
+        self.sampling_rate = SAMPLING_RATES[version_bits][rate_index]
+        self.padding = (b2 >> 1) & 1
+        self.mono = (b3 >> 6) == 0b11
+
+    @property
+    def samples(self):
+        """The amount of samples in this frame.
+
+        :rtype: int
+        """
+        return 1152 if self.version == 1 else 576
+
+    @property
+    def length(self):
+        """The length of this frame in bytes, including the header.
+
+        :rtype: int
+        """
+        return (self.samples // 8 * self.bitrate * 1000 //
+                self.sampling_rate) + self.padding
+
+    def side_info_length(self):
+        """The length of the side information following the header.
+
+        :rtype: int
+        """
+        if self.version == 1:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+
+def _skip_id3(data):
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    return 10 + size
+
+
+def _is_info_frame(data, offset, header):
+    tag_offset = offset + 4 + header.side_info_length()
+    return data[tag_offset:tag_offset + 4] in (b'Xing', b'Info')
+
+
+def parse_frames(data):
+    """Find all audio frames in the given MP3 data.
+
+    ID3v2 tags and Xing or Info frames are skipped.
+
+    :param bytes data: The MP3 data.
+    :raises ValueError: If the data contains something else than frames.
+    :returns: The offset and length of every frame and the amount of samples
+              per frame.
+    :rtype: tuple(list(tuple(int, int)), int)
+    """
+    frames = []
+    samples = None
+    offset = _skip_id3(data)
+    while offset < len(data):
+        if data[offset:offset + 3] == b'TAG':  # ID3v1 at the end
+            break
+        header = FrameHeader(data, offset)
+        if offset + header.length > len(data):
+            l.warning("Ignoring truncated frame at %d.", offset)
+            break
+        if samples is None and _is_info_frame(data, offset, header):
+            l.debug("Skipping info frame.")
+        else:
+            frames.append((offset, header.length))
+        if samples is None:
+            samples = header.samples
+        offset += header.length
+    return frames, samples
+
+
+def frame_index(sample, samples_per_frame, rounding=round):
+    """Get the index of the frame boundary at or near the given sample.
+
+    :param int sample: The index of the sample in the encoded audio.
+    :param int samples_per_frame: The amount of samples of every frame.
+    :param callable rounding: The function used to round to a boundary, for
+                              example :func:`math.floor` for the boundary at
+                              or before ``sample``.
+    :returns: The index of the frame starting at the boundary.
+    :rtype: int
+    """
+    return int(rounding((sample + ENCODER_DELAY) / samples_per_frame))
+
+
+def frame_start(index, samples_per_frame):
+    """Get the first sample of the frame with the given index.
+
+    :param int index: The index of the frame.
+    :param int samples_per_frame: The amount of samples of every frame.
+    :returns: The index of the first sample of this frame in the encoded
+              audio, this is negative for the first frames.
+    :rtype: int
+    """
+    return index * samples_per_frame - ENCODER_DELAY
+
+
+class FrameStream:
+    """A MP3 stream that can be cut at frame boundaries."""
+
+    def __init__(self, data):
+        """
+        :param bytes data: The MP3 data, this should be encoded without the
+                           bit reservoir.
+        :raises ValueError: If the data is not a valid MP3 stream.
+        """
+        self.data = data
+        self.frames, self.samples_per_frame = parse_frames(data)
+        if not self.frames:
+            raise ValueError("The stream does not contain any frames")
+
+    @classmethod
+    def from_file(cls, filename):
+        """Load a stream from the given file.
+
+        :param str filename: The MP3 file to load.
+        :returns: The loaded stream.
+        :rtype: FrameStream
+        """
+        with open(filename, 'rb') as f:
+            return cls(f.read())
+
+    def __len__(self):
+        return len(self.frames)
+
+    def cut(self, start, end):
+        """Get the data of the frames ``start`` till ``end``.
+
+        :param int start: The index of the first frame.
+        :param int end: The index of the frame after the last frame.
+        :raises IndexError: If the range is not within the stream.
+        :returns: The data of the frames.
+        :rtype: bytes
+        """
+        if start < 0 or end > len(self.frames) or start > end:
+            raise IndexError("Frames {} till {} are not in the stream".format(
+                start, end))
+        if start == end:
+            return b''
+        first, _ = self.frames[start]
+        last, length = self.frames[end - 1]
+        return self.data[first:last + length]
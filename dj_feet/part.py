@@ -0,0 +1,92 @@
+"""This file contains the classes needed to represent a part"""
+from collections import namedtuple
+import numpy as np
+
+#: A region of a part. The ``samples`` are usually a view of the time series of
+#: a song, the ``gain`` is ``None``, a number or an array with a gain for every
+#: sample. If the samples are an unchanged piece of a song the ``source`` is
+#: the file location of this song and ``start`` the index of the first sample
+#: in the song, otherwise both are ``None``.
+Region = namedtuple('Region', 'samples, gain, source, start')
+
+
+class Part:
+    """A part created by a transitioner, made of consecutive regions.
+
+    The regions are not copied, so a part that consists of unchanged pieces of
+    songs only references the time series of these songs. The samples are only
+    copied when the part is rendered or iterated in chunks.
+    """
+
+    def __init__(self, regions=None, key=None):
+        """
+        :param regions: The regions of this part, they can also be added later
+                        with :func:`append`.
+        :type regions: list(Region) or None
+        :param key: A description of how this part was created, parts with
+                    the same key have the same samples. This should only
+                    contain values that can be serialized as JSON.
+        :type key: tuple or None
+        """
+        self.key = key
+        self.regions = []
+        for region in regions or []:
+            self.append(*region)
+
+    def append(self, samples, gain=None, source=None, start=None):
+        """Add a region to the end of this part.
+
+        :param numpy.array samples: The samples of the region, they are not
+                                    copied.
+        :param gain: The gain to apply to the samples.
+        :type gain: float or numpy.array or None
+        :param source: The file location of the song the samples are from.
+        :type source: str or None
+        :param start: The index in the song of the first sample.
+        :type start: int or None
+        :raises ValueError: If the gain is an array of the wrong length.
+        :returns: Nothing of value.
+        """
+        if gain is not None and np.ndim(gain) and len(gain) != len(samples):
+            raise ValueError("The gain should have a value for every sample")
+        self.regions.append(Region(samples, gain, source, start))
+
+    def __len__(self):
+        return sum(len(region.samples) for region in self.regions)
+
+    def chunks(self, size):
+        """Iterate the samples of this part in chunks.
+
+        Chunks never span multiple regions, so the last chunk of a region may
+        be shorter than ``size``. Chunks of regions without a gain are views.
+
+        :param int size: The maximum amount of samples of a chunk.
+        :returns: A generator of the chunks.
+        :rtype: iter(numpy.array)
+        """
+        for samples, gain, _, _ in self.regions:
+            for start in range(0, len(samples), size):
+                chunk = samples[start:start + size]
+                if gain is None:
+                    yield chunk
+                elif np.ndim(gain):
+                    yield chunk * gain[start:start + size]
+                else:
+                    yield chunk * gain
+
+    def render(self):
+        """Copy all regions of this part in one contiguous array.
+
+        :returns: The samples of this part.
+        :rtype: numpy.array
+        """
+        if not self.regions:
+            return np.array([])
+        return np.concatenate([
+            region.samples if region.gain is None else
+            region.samples * region.gain for region in self.regions
+        ])
+
+    def __array__(self, dtype=None, copy=None):
+        rendered = self.render()
+        return rendered if dtype is None else rendered.astype(dtype)
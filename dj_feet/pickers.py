@@ -2,9 +2,13 @@
 
 from .helpers import EPSILON
 from .song import Song
+from .workers import TaskQueue
+from .ann import RandomProjectionForest
 import dj_feet.feedback
-from collections import defaultdict
+from collections import defaultdict, deque
+import bisect
 import os
+import threading
 import random
 import librosa
 import numpy
@@ -15,6 +19,11 @@ import logging
 
 l = logging.getLogger(__name__)
 
+#: The approximate nearest neighbour index of the :class:`NCAPicker` is
+#: rebuilt when an element of the weighted PCA vector changes more than this
+#: fraction.
+ANN_REBUILD_CHANGE = 0.1
+
 
 class Picker:
     """This is the base Picker class.
@@ -46,6 +55,36 @@ class Picker:
         """
         raise NotImplementedError("This should be overridden")
 
+    def get_candidates(self, amount):
+        """Get the songs that are most likely to be picked next.
+
+        This is used to prepare transitions ahead of time and should not
+        change the state of the picker. Pickers that cannot predict their next
+        pick do not have to override this method.
+
+        :param int amount: The maximum amount of songs to return.
+        :returns: The file locations of the most likely next songs, the most
+                  likely song first.
+        :rtype: list(str)
+        """
+        return []
+
+    def pick_first_song(self, song_files):
+        """Pick the song to start with from the given songs.
+
+        This is used when the first part can be written faster for some songs,
+        see :func:`dj_feet.transitioners.Transitioner.fast_start`. The picked
+        song should be handled as if it was returned by :func:`get_next_song`
+        with ``force`` set to ``False``, but it is not processed.
+
+        :param list(str) song_files: The file locations of the songs that can
+                                     be picked.
+        :returns: The file location of the picked song or ``None`` if none of
+                  the songs can be picked.
+        :rtype: str or None
+        """
+        return random.choice(song_files) if song_files else None
+
     @staticmethod
     def process_song_file(song_file):
         """Process the given music file.
@@ -108,6 +147,20 @@ class SimplePicker(Picker):
             self.song_files.remove(next_song)
         return Song(next_song)
 
+    def pick_first_song(self, song_files):
+        """Pick a random song of the given songs that is not chosen yet.
+
+        :param list(str) song_files: The songs that can be picked.
+        :returns: The picked song or ``None`` if all songs are chosen.
+        :rtype: str or None
+        """
+        next_song = super(SimplePicker, self).pick_first_song(
+            [song_file for song_file in song_files
+             if song_file in self.song_files])
+        if next_song is not None:
+            self.song_files.remove(next_song)
+        return next_song
+
     @staticmethod
     def process_song_file(song_file):
         """This does nothing however it is required.
@@ -121,6 +174,94 @@ class SimplePicker(Picker):
         return None
 
 
+class TempoIndex:
+    """An index of songs sorted by their tempo.
+
+    The songs in the index can be made unavailable with :func:`remove` and
+    all made available again with :func:`reset`. The songs are never moved,
+    so removing a song only needs a lookup.
+    """
+
+    def __init__(self, tempos):
+        """
+        :param tempos: The tempo of every song in the index.
+        :type tempos: dict(str, float)
+        """
+        ordered = sorted(
+            (float(tempo), song) for song, tempo in tempos.items())
+        self._tempos = [tempo for tempo, _ in ordered]
+        self._songs = [song for _, song in ordered]
+        self._positions = {song: i for i, song in enumerate(self._songs)}
+        self._available = [True] * len(self._songs)
+        self._amount = len(self._songs)
+
+    def __len__(self):
+        return self._amount
+
+    def remove(self, song_file):
+        """Make the given song unavailable.
+
+        :param str song_file: The song to remove, it is ignored if it is not in
+                              the index or already removed.
+        :returns: Nothing of value.
+        """
+        pos = self._positions.get(song_file)
+        if pos is not None and self._available[pos]:
+            self._available[pos] = False
+            self._amount -= 1
+
+    def reset(self, song_files=None):
+        """Make the given songs available and all other songs unavailable.
+
+        :param song_files: The songs to make available, if this is ``None``
+                           all songs are made available.
+        :type song_files: list(str) or None
+        :returns: Nothing of value.
+        """
+        if song_files is None:
+            self._available = [True] * len(self._songs)
+        else:
+            self._available = [False] * len(self._songs)
+            for song_file in song_files:
+                self._available[self._positions[song_file]] = True
+        self._amount = sum(self._available)
+
+    def window(self, base_tempo, max_percent):
+        """Get all available songs with a tempo close to the given tempo.
+
+        A song is close if the difference between its tempo and
+        ``base_tempo`` is less than ``max_percent`` percent of its own tempo.
+        This window is found with two binary searches.
+
+        :param float base_tempo: The tempo to compare with.
+        :param int max_percent: The maximum difference in percent.
+        :returns: The close songs ordered by their tempo.
+        :rtype: list(str)
+        """
+        factor = max_percent / 100
+
+        def close(i):
+            tempo = self._tempos[i]
+            return factor * tempo > abs(base_tempo - tempo)
+
+        start = bisect.bisect_left(self._tempos, base_tempo / (1 + factor))
+        end = len(self._tempos)
+        if factor < 1:
+            end = bisect.bisect_right(self._tempos, base_tempo / (1 - factor))
+        # The bounds are rounded, so move them until they are exact.
+        while start > 0 and close(start - 1):
+            start -= 1
+        while start < end and not close(start):
+            start += 1
+        while end < len(self._tempos) and close(end):
+            end += 1
+        while end > start and not close(end - 1):
+            end -= 1
+        return [
+            self._songs[i] for i in range(start, end) if self._available[i]
+        ]
+
+
 class NCAPicker(Picker):
     """This an sophisticated picker based on weighted NCA using user feedback.
 
@@ -131,9 +272,10 @@ class NCAPicker(Picker):
     are first pruned based on tempo. This distance is then softmaxed and the
     chances are simulated.
 
-    The feedback is to optimize a weight vector using ``scipy.optimize``. This
-    means that over time the distances should start to reflect how much the
-    dancers like the music instead of just the similarity between the songs.
+    The feedback is to optimize a weight vector using ``scipy.optimize``, or
+    online with a gradient step for every feedback. This means that over time
+    the distances should start to reflect how much the dancers like the music
+    instead of just the similarity between the songs.
 
     This picker also contains checks and safeguards for not getting stuck in an
     infinite loop and will reuse songs if no suitable new songs can be found.
@@ -150,7 +292,11 @@ class NCAPicker(Picker):
                  weights=None,
                  feedback_method='default',
                  max_tempo_percent=None,
-                 max_force_streak=10):
+                 max_force_streak=10,
+                 history_size=None,
+                 learning_rate=None,
+                 async_optimize=False,
+                 ann_candidates=None):
         """Create a new NCAPicker instance.
 
         :param str song_folder: The folder of the wav file to use for merging.
@@ -179,6 +325,26 @@ class NCAPicker(Picker):
                                      ``get_next_song`` before we should reset
                                      all the songs to start using already used
                                      songs.
+        :param int history_size: The maximum amount of transitions with
+                                 feedback to optimize the weights for, older
+                                 transitions are forgotten. If this is
+                                 ``None`` all transitions are remembered.
+        :param float learning_rate: If this is given the weights are learned
+                                    online: every new feedback does one
+                                    gradient step of this size instead of a
+                                    full optimization. The cost of this step
+                                    only depends on ``history_size``.
+        :param bool async_optimize: Optimize the weights on a background
+                                    thread using a snapshot of the feedback.
+                                    The songs are picked with the last
+                                    weights that are done, so a slow
+                                    optimization never delays a pick.
+        :param int ann_candidates: If this is given and more songs are close
+                                   in tempo to the current song, only this
+                                   amount of songs found with an approximate
+                                   nearest neighbour index are compared with
+                                   the exact distance. Use this for very large
+                                   libraries.
         """
         super(NCAPicker, self).__init__()
 
@@ -198,7 +364,26 @@ class NCAPicker(Picker):
         self.get_feedback = getattr(dj_feet.feedback,
                                     "feedback_" + feedback_method)
         self.picked_songs = list()
-        self.done_transitions = list()
+        if history_size is not None:
+            history_size = int(history_size)
+            if history_size < 1:
+                raise ValueError("The history size should be at least 1")
+        self.done_transitions = deque(maxlen=history_size)
+        self.learning_rate = learning_rate
+        if learning_rate is not None:
+            self.learning_rate = float(learning_rate)
+            if self.learning_rate <= 0:
+                raise ValueError("The learning rate should be positive")
+        self.optimize_queue = TaskQueue('weights') if async_optimize else None
+        self._weights_lock = threading.Lock()
+        self._new_weights = None
+        self._optimize_again = False
+        if ann_candidates is not None:
+            ann_candidates = int(ann_candidates)
+            if ann_candidates < 1:
+                raise ValueError("At least one candidate is needed")
+        self.ann_candidates = ann_candidates
+        self._ann = self._new_ann = None
 
         self.song_distances = defaultdict(lambda: defaultdict(lambda: None))
         self.song_properties = dict()
@@ -207,6 +392,13 @@ class NCAPicker(Picker):
             if os.path.isfile(os.path.join(song_folder, f))
         ]
         self.song_files = copy(self._song_files)
+        # The position of every song in ``self.song_files``, so a played song
+        # can be removed in constant time.
+        self._song_positions = {
+            song_file: i
+            for i, song_file in enumerate(self.song_files)
+        }
+        self._tempo_index = None
 
         if max_tempo_percent is None:
             max_tempo_percent = 8
@@ -341,6 +533,62 @@ class NCAPicker(Picker):
         """
         l.debug("Resetting songs.")
         self.song_files = copy(self._song_files)
+        self._song_positions = {
+            song_file: i
+            for i, song_file in enumerate(self.song_files)
+        }
+        if self._tempo_index is not None:
+            self._tempo_index.reset()
+
+    def remove_song(self, song_file):
+        """Remove the given song from ``self.song_files`` until the next call
+        to :func:`reset_songs`.
+
+        The last song of ``self.song_files`` takes the place of the removed
+        song, so this takes constant time.
+
+        :param str song_file: The song to remove.
+        :raises KeyError: If the song is not in ``self.song_files``.
+        :rtype: None
+        """
+        pos = self._song_positions.pop(song_file)
+        last = self.song_files.pop()
+        if last != song_file:
+            self.song_files[pos] = last
+            self._song_positions[last] = pos
+        if self._tempo_index is not None:
+            self._tempo_index.remove(song_file)
+
+    @property
+    def tempo_index(self):
+        """The :class:`TempoIndex` of the songs in ``self.song_files``.
+
+        :rtype: TempoIndex
+        """
+        if self._tempo_index is None:
+            self._tempo_index = TempoIndex({
+                song_file: self.song_properties[song_file][2]
+                for song_file in self._song_files
+            })
+            self._tempo_index.reset(self.song_files)
+        return self._tempo_index
+
+    @property
+    def weights(self):
+        """The weights used to calculate the covariance matrices.
+
+        Setting new weights increments :attr:`weights_version` and clears
+        the cached factorizations and distances, as they depend on the
+        weights.
+        """
+        return self._weights
+
+    @weights.setter
+    def weights(self, weights):
+        self._weights = weights
+        self.weights_version = getattr(self, 'weights_version', -1) + 1
+        self._factorizations = dict()
+        self.song_distances = defaultdict(lambda: defaultdict(lambda: None))
 
     @staticmethod
     def get_mfcc_and_tempo(song_file, mfcc_amount):
@@ -364,10 +612,7 @@ class NCAPicker(Picker):
         :returns: A square matrix of the same size as the PCA.
         :rtype: numpy.array
         """
-        return numpy.array([
-            sum((elem * weights[i] for i, elem in enumerate(row)))
-            for row in pca
-        ])
+        return numpy.dot(pca, weights)
 
     def covariance(self, song_file, weights):
         """Calculate a (approximation) of the covariance matrix.
@@ -381,6 +626,8 @@ class NCAPicker(Picker):
         :returns: A square matrix of the same size as the weights vector.
         :rtype: numpy.array
         """
+        if weights is self.weights:
+            return self.factorizations([song_file])[0][0]
         cholesky, _, _unused = self.song_properties[song_file]
         d = numpy.dot(
             numpy.diag(self.get_w_vector(self.pca, weights)), cholesky)
@@ -399,23 +646,91 @@ class NCAPicker(Picker):
                   symmetric.
         :rtype: int
         """
-        if weights is None:
-            weights = self.weights
+        return self.distances(song_q, [song_p], weights)[0]
+
+    def distances(self, song_file, others, weights=None):
+        """Calculate the distances between one song and many other songs.
+
+        This calculates the same distance as :func:`distance` for all songs in
+        ``others`` at once by stacking their covariance matrices. The
+        logarithms of the determinants of the two KL divergences cancel each
+        other out, so they are never calculated.
+
+        :param str song_file: The song to calculate the distances from.
+        :param others: The songs to calculate the distances to.
+        :type others: list(str)
+        :param numpy.array weights: The weights vector to use.
+        :returns: The distance to every song in ``others`` in the same order.
+        :rtype: numpy.array
+        """
+        if not others:
+            return numpy.array([])
 
-        def kl(p, q):
-            cov_p = self.covariance(p, weights)
-            cov_q = self.covariance(q, weights)
-            cov_q_inv = numpy.linalg.inv(cov_q)
-            m_p = self.song_properties[p][1]
-            m_q = self.song_properties[q][1]
-            d = cov_p.shape[0]
-            return (
-                numpy.log(numpy.linalg.det(cov_q) / numpy.linalg.det(cov_p)) +
-                numpy.trace(numpy.dot(cov_q_inv, cov_p)) + numpy.dot(
-                    numpy.transpose(m_p - m_q),
-                    numpy.dot(cov_q_inv, (m_p - m_q))) - d) / 2
-
-        return (kl(song_q, song_p) + kl(song_p, song_q)) / 2
+        songs = [song_file] + list(others)
+        if weights is None:
+            covariances, inverses, _ = self.factorizations(songs)
+        else:
+            covariances, inverses, _ = self.factorize(songs, weights)
+        means = numpy.array([self.song_properties[s][1] for s in songs])
+
+        cov_p, cov_p_inv, m_p = covariances[0], inverses[0], means[0]
+        cov_q, cov_q_inv, m_q = covariances[1:], inverses[1:], means[1:]
+        diff = m_p - m_q
+        # The trace of a product of two symmetric matrices is the sum of their
+        # elementwise product.
+        traces = (numpy.einsum('nij,ij->n', cov_q_inv, cov_p) +
+                  numpy.einsum('ij,nij->n', cov_p_inv, cov_q))
+        mahalanobis = numpy.einsum('ni,nij,nj->n', diff,
+                                   cov_q_inv + cov_p_inv, diff)
+        return (traces + mahalanobis - 2 * len(m_p)) / 4
+
+    def factorize(self, song_files, weights):
+        """Calculate the covariance matrices of the given songs with their
+        inverses and the logarithms of their determinants.
+
+        The weighted cholesky decomposition of a covariance matrix is
+        triangular, so the inverse and determinant are calculated from it
+        instead of from the covariance matrix itself.
+
+        :param song_files: The songs to factorize.
+        :type song_files: list(str)
+        :param numpy.array weights: The weights to use.
+        :returns: A tuple of respectively the stacked covariance matrices,
+                  their inverses and the logarithms of their determinants.
+        :rtype: tuple(numpy.array, numpy.array, numpy.array)
+        """
+        choleskys = numpy.array(
+            [self.song_properties[s][0] for s in song_files])
+        w_vector = self.get_w_vector(self.pca, weights)
+        d = w_vector[:, None] * choleskys
+        d_inv = numpy.linalg.inv(d)
+        covariances = numpy.matmul(d, d.transpose(0, 2, 1))
+        inverses = numpy.matmul(d_inv.transpose(0, 2, 1), d_inv)
+        log_dets = 2 * numpy.sum(
+            numpy.log(numpy.abs(numpy.diagonal(d, axis1=1, axis2=2))), 1)
+        return covariances, inverses, log_dets
+
+    def factorizations(self, song_files):
+        """Get the (cached) result of :func:`factorize` for the current
+        weights.
+
+        Every song is only factorized once for every version of the weights.
+
+        :param song_files: The songs to get the factorizations of.
+        :type song_files: list(str)
+        :returns: The same as :func:`factorize`.
+        :rtype: tuple(numpy.array, numpy.array, numpy.array)
+        """
+        cache = self._factorizations
+        missing = list(
+            dict.fromkeys(s for s in song_files if s not in cache))
+        if missing:
+            for song_file, *factorization in zip(
+                    missing, *self.factorize(missing, self.weights)):
+                cache[song_file] = factorization
+        return tuple(
+            numpy.array(arrays)
+            for arrays in zip(*(cache[s] for s in song_files)))
 
     def get_next_song(self, user_feedback, force=False):
         """Get the next song to play.
@@ -431,6 +746,7 @@ class NCAPicker(Picker):
         :return: The song to play next:
         :rtype: Song
         """
+        self._swap_weights()
         # We have only one song remaining so we won't be able to pick good new
         # songs. So reset all the available songs.
         if len(self.song_files) == 1:
@@ -468,19 +784,78 @@ class NCAPicker(Picker):
             self.streak += 1
         elif self.current_song is not None:
             # Remove the old song from the available so we have fresh tunes
-            self.song_files.remove(self.current_song)
+            self.remove_song(self.current_song)
             self.streak = 0
 
         self.current_song = next_song
         return Song(next_song)
 
+    def pick_first_song(self, song_files):
+        """Pick the first song randomly from the given songs.
+
+        The picked song is the current song and the first picked song, like
+        the first song returned by :func:`get_next_song`.
+
+        :param list(str) song_files: The songs that can be picked.
+        :returns: The picked song or ``None`` if a song was already picked or
+                  none of the songs are known to this picker.
+        :rtype: str or None
+        """
+        if self.current_song is not None:
+            return None
+        next_song = super(NCAPicker, self).pick_first_song([
+            song_file for song_file in song_files
+            if song_file in self._song_positions
+        ])
+        if next_song is not None:
+            self.picked_songs.append(next_song)
+            self.current_song = next_song
+        return next_song
+
+    def next_song_chances(self, force):
+        """Get the chance of every song to be picked as the next song.
+
+        This gets the distance between the current and the potential songs
+        and does a softmax with these distances. Based on this paper:
+        http://www.cs.cornell.edu/~kilian/papers/Slaney2008-MusicSimilarityMetricsISMIR.pdf
+
+        The chances are squared and normalized again, which is the same as a
+        softmax of twice the distances. The current song itself gets a weight
+        of ``1 / (1 + streak * multiplier)`` compared to the total weight of
+        one of the other songs.
+
+        :param bool force: Make it impossible to pick the current song.
+        :returns: A tuple of the songs and their chances, which sum to 1. The
+                  current song is the last song if it can be picked.
+        :rtype: tuple(list(str), numpy.array)
+        """
+        songs = self.nearest_songs(
+            list(self.all_but_current_song(
+                filter_songs=self.force_streak < 2)))
+        # calc distance between all songs and current_song at once
+        distances = numpy.array(self.current_distances(songs))
+
+        chances = numpy.array([])
+        if songs:
+            # Find the max distance and normalize it to 50. This is because of
+            # floating point errors when doing something to the power of a
+            # very large negative number
+            factor = 50 / max(distances.max(), 1)
+            logits = -2 * factor * distances
+            chances = numpy.exp(logits - logits.max())
+            chances /= chances.sum()
+
+        if not force:
+            songs.append(self.current_song)
+            chances = numpy.append(chances,
+                                   1 / (1 + self.streak * self.multiplier))
+        return songs, chances / max(chances.sum(), EPSILON)
+
     def _find_next_song(self, force):
         """Find the next song by doing song analysis.
 
-        This gets the distance between the current and the potential song,
-        does softmax with these distances and gets one by chance. Based on this
-        paper:
-        http://www.cs.cornell.edu/~kilian/papers/Slaney2008-MusicSimilarityMetricsISMIR.pdf
+        The next song is drawn from the chances of
+        :func:`next_song_chances` with one call to ``random.random``.
 
         :param bool force: Make it impossible to pick the current song.
         :returns: The filename of the next song.
@@ -488,72 +863,166 @@ class NCAPicker(Picker):
         """
         l.debug("Finding song by using NCA.")
 
-        max_dst = 0
-        filter_songs = self.force_streak < 2
-        for song_file in self.all_but_current_song(filter_songs=filter_songs):
-            # calc distance between song_file and current_song
-            dst = self.song_distances[self.current_song][song_file]
-            if dst is None:
-                dst = self.distance(self.current_song, song_file)
-                self.song_distances[self.current_song][song_file] = dst
-                self.song_distances[song_file][self.current_song] = dst
-
-            max_dst = max(max_dst, dst)
-
-        # Find the max distance and normalize it to 50. This is because of
-        # floating point errors when doing something to the power of a very
-        # large negative number
-        factor = 50 / max(max_dst, 1)
-
-        # Now calculate the distance sum needed for softmax
-        distance_sum = 0
-        for song_file in self.all_but_current_song(filter_songs=filter_songs):
-            dst = self.song_distances[self.current_song][song_file]
-            distance_sum += numpy.power(numpy.e, -(dst * factor))
-
-        chances = []
-        for song_file in self.all_but_current_song(filter_songs=filter_songs):
-            # Append the softmax chances to the chances list
-            if song_file != self.current_song:
-                dst = self.song_distances[self.current_song][song_file]
-                chance = numpy.power(numpy.e, -(dst * factor)) / distance_sum
-                chances.append((song_file, chance))
-
-        chances = list(
-            zip([x for x, _ in chances],
-                self.normalize_chances([x for _, x in chances])))
-
-        if not force:
-            chances.append(
-                (self.current_song, 1 / (1 + self.streak * self.multiplier)))
-
-        if not chances:
+        songs, chances = self.next_song_chances(force)
+        if not songs:
             self.reset_songs()
             self.force_streak += 1
             return self._find_next_song(force)
 
-        # Sort the chances by descending chance
-        chances.sort(key=lambda x: x[1])
-
-        # We do a range 10 so we are almost certain we find a match within the
-        # loop however we won't crash or slowdown to much if this doesn't
-        # happen.
-        next_song = chances[0][0]
-        for _ in range(10):
-            for song_file, chance in chances:
-                if random.random() < chance:
-                    next_song = song_file
-                    l.debug("Found next_song %s, its chance was %f", next_song,
-                            chance)
-                    break
-            else:
-                continue
-            # Make sure we actually break the OUTER loop
-            break
-        else:
-            l.critical("Terminated simulating odds without finding," +
-                       " picking song with highest odds (%s).", next_song)
-        return next_song
+        cumulative = numpy.cumsum(chances)
+        idx = min(
+            bisect.bisect_right(cumulative, random.random() * cumulative[-1]),
+            len(songs) - 1)
+        l.debug("Found next_song %s, its chance was %f", songs[idx],
+                chances[idx])
+        return songs[idx]
+
+    def embedding(self, song_files, weights):
+        """Embed the weighted gaussians of the given songs in a vector space.
+
+        The weighted distance between two songs is the distance between
+        gaussians with the means divided by the weighted PCA vector and the
+        unweighted covariance matrices. Both are whitened with the average
+        covariance matrix, the embedding of a song is the concatenation of
+        its whitened mean and the matrix logarithm of its whitened covariance
+        matrix. For songs that are close the squared euclidean distance
+        between their embeddings approximates their distance.
+
+        :param song_files: The songs to embed.
+        :type song_files: list(str)
+        :param numpy.array weights: The weights to use.
+        :returns: The embedding of every song, one song per row.
+        :rtype: numpy.array
+        """
+        choleskys = numpy.array(
+            [self.song_properties[s][0] for s in song_files])
+        means = numpy.array([self.song_properties[s][1] for s in song_files])
+        covariances = numpy.matmul(choleskys, choleskys.transpose(0, 2, 1))
+        whitening = numpy.linalg.inv(
+            numpy.linalg.cholesky(numpy.mean(covariances, 0)))
+
+        means = numpy.dot(means / self.get_w_vector(self.pca, weights),
+                          whitening.T)
+        values, vectors = numpy.linalg.eigh(
+            numpy.matmul(numpy.matmul(whitening, covariances), whitening.T))
+        logarithms = numpy.matmul(vectors * numpy.log(values)[:, None, :],
+                                  vectors.transpose(0, 2, 1))
+        return numpy.hstack([
+            means / numpy.sqrt(2),
+            logarithms.reshape(len(song_files), -1) / 2
+        ])
+
+    def ann_index(self):
+        """Get the approximate nearest neighbour index of all songs.
+
+        The index is built lazily over the :func:`embedding` of the songs
+        and rebuilt when the weights changed too much since it was built. If
+        ``async_optimize`` was set the index is rebuilt for the new weights
+        by the background optimization instead.
+
+        :returns: The index, the song of every point of the index and the
+                  position of every song in the index.
+        :rtype: tuple(dj_feet.ann.RandomProjectionForest, list(str),
+                      dict(str, int))
+        """
+        if self._ann_outdated(self._ann, self.weights):
+            self._ann = self._build_ann(self.weights)
+        return self._ann[:-1]
+
+    def _ann_outdated(self, ann, weights):
+        if ann is None:
+            return True
+        old_w_vector = ann[-1]
+        w_vector = self.get_w_vector(self.pca, weights)
+        change = numpy.abs(w_vector - old_w_vector) / numpy.maximum(
+            numpy.abs(old_w_vector), EPSILON)
+        return change.max() > ANN_REBUILD_CHANGE
+
+    def _build_ann(self, weights):
+        l.info("Building the nearest neighbour index.")
+        songs = list(self._song_files)
+        positions = {song: i for i, song in enumerate(songs)}
+        index = RandomProjectionForest(self.embedding(songs, weights))
+        return index, songs, positions, self.get_w_vector(self.pca, weights)
+
+    def nearest_songs(self, song_files):
+        """Get the songs that are probably the closest to the current song.
+
+        If ``ann_candidates`` was given and there are more songs than this
+        amount only the closest ``ann_candidates`` songs found in the
+        :func:`ann_index` are returned.
+
+        :param song_files: The songs to choose from.
+        :type song_files: list(str)
+        :returns: The closest songs, or all songs if no choice is needed.
+        :rtype: list(str)
+        """
+        if self.ann_candidates is None or len(
+                song_files) <= self.ann_candidates:
+            return song_files
+        index, songs, positions = self.ann_index()
+        allowed = numpy.zeros(len(songs), dtype=bool)
+        allowed[[positions[s] for s in song_files]] = True
+        nearest = index.query(index.points[positions[self.current_song]],
+                              self.ann_candidates, allowed)
+        return [songs[i] for i in nearest]
+
+    def current_distance(self, song_file):
+        """Get the (cached) distance between the current song and the given
+        song.
+
+        :param str song_file: The song to get the distance to.
+        :returns: The distance as calculated by :func:`distance`.
+        :rtype: float
+        """
+        dst = self.song_distances[self.current_song][song_file]
+        if dst is None:
+            dst = self.distance(self.current_song, song_file)
+            self.song_distances[self.current_song][song_file] = dst
+            self.song_distances[song_file][self.current_song] = dst
+        return dst
+
+    def current_distances(self, song_files):
+        """Get the (cached) distances between the current song and the given
+        songs.
+
+        The distances that are not yet cached are calculated in one batch by
+        :func:`distances`.
+
+        :param song_files: The songs to get the distance to.
+        :type song_files: list(str)
+        :returns: The distances in the same order as ``song_files``.
+        :rtype: list(float)
+        """
+        current = self.song_distances[self.current_song]
+        missing = [s for s in song_files if current[s] is None]
+        for song_file, dst in zip(missing,
+                                  self.distances(self.current_song, missing)):
+            current[song_file] = dst
+            self.song_distances[song_file][self.current_song] = dst
+        return [current[s] for s in song_files]
+
+    def get_candidates(self, amount):
+        """Get the songs that are most likely to be picked next.
+
+        These are the songs closest to the current song, the current song
+        itself is never included.
+
+        :param int amount: The maximum amount of songs to return.
+        :returns: The file locations of at most ``amount`` songs, the most
+                  likely song first.
+        :rtype: list(str)
+        """
+        if self.current_song is None:
+            return []
+        filter_songs = self.force_streak < 2
+        songs = self.nearest_songs(
+            list(self.all_but_current_song(filter_songs=filter_songs)))
+        distances = self.current_distances(songs)
+        candidates = [
+            song_file for _, song_file in sorted(zip(distances, songs))
+        ]
+        return candidates[:amount]
 
     @staticmethod
     def normalize_chances(original_chances):
@@ -578,52 +1047,243 @@ class NCAPicker(Picker):
     def _optimize_weights(self):
         """Optimize the weights of the picker.
 
-        This function optimizes the weights based on the saved feedback between
-        to songs using the :func:`scipy.optimize.minimize` function. It
-        constrains the weights to sum to 1.
+        The new weights are calculated by :func:`optimized_weights` with the
+        saved feedback. If ``async_optimize`` was set this is done on a
+        background thread with a snapshot of the feedback and the new weights
+        are only used from the next call to :func:`get_next_song` after the
+        optimization is done. While an optimization is running new feedback
+        is saved and optimized for when the running optimization is done.
 
         :returns: Nothing of value.
         :rtype: None
         """
-        l.debug("Optimize the current weights.")
+        if self.optimize_queue is None:
+            weights = self.optimized_weights(self.done_transitions,
+                                             self.weights)
+            if weights is not None:
+                self.weights = weights
+        elif self.optimize_queue.pending:
+            self._optimize_again = True
+        else:
+            with self._weights_lock:
+                weights = self._new_weights
+            if weights is None:
+                weights = self.weights
+            self.optimize_queue.put(self._publish_weights,
+                                    list(self.done_transitions),
+                                    numpy.array(weights, dtype=float))
+
+    def _publish_weights(self, transitions, weights):
+        weights = self.optimized_weights(transitions, weights)
+        if weights is None:
+            return
+        # Rebuilding the index takes seconds for large libraries, so it is
+        # done here instead of while picking, and swapped in with the weights.
+        with self._weights_lock:
+            ann = self._ann if self._new_ann is None else self._new_ann
+        if ann is not None and self._ann_outdated(ann, weights):
+            ann = self._build_ann(weights)
+        else:
+            ann = None
+        with self._weights_lock:
+            self._new_weights = weights
+            if ann is not None:
+                self._new_ann = ann
+
+    def _swap_weights(self):
+        """Start using the weights and nearest neighbour index of the last
+        finished background optimization, and start a new optimization if
+        feedback was saved while the last one was running.
+
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        if self.optimize_queue is None:
+            return
+        with self._weights_lock:
+            weights, self._new_weights = self._new_weights, None
+            ann, self._new_ann = self._new_ann, None
+        if weights is not None:
+            l.debug("Swapping in the optimized weights %s.", weights)
+            self.weights = weights
+        if ann is not None:
+            self._ann = ann
+        if self._optimize_again and not self.optimize_queue.pending:
+            self._optimize_again = False
+            self._optimize_weights()
+
+    def flush(self, timeout=None):
+        """Wait till the background optimization is done and use its weights.
+
+        :param timeout: The maximum amount of seconds to wait, ``None`` means
+                        waiting until the optimization is done.
+        :type timeout: float or None
+        :returns: If the optimization is done.
+        :rtype: bool
+        """
+        if self.optimize_queue is None:
+            return True
+        done = self.optimize_queue.join(timeout)
+        self._swap_weights()
+        if done and self.optimize_queue.pending:
+            done = self.optimize_queue.join(timeout)
+            self._swap_weights()
+        return done
+
+    def optimized_weights(self, transitions, weights):
+        """Calculate new weights for the given feedback.
+
+        This function optimizes the weights based on the feedback between two
+        songs using the :func:`scipy.optimize.minimize` function. It
+        constrains the weights to sum to 1. If a ``learning_rate`` was given
+        only one step is done by :func:`learned_weights`. This does not change
+        the picker, so it is safe to call it on another thread.
+
+        :param transitions: The transitions as tuples of the previous song,
+                            the next song and the feedback.
+        :type transitions: list(tuple(str, str, float))
+        :param numpy.array weights: The weights to start with.
+        :returns: The new weights or ``None`` if the optimization failed.
+        :rtype: numpy.array or None
+        """
+        if self.learning_rate is not None:
+            return self.learned_weights(transitions, weights)
 
-        def func_to_optimize(weights):
-            feedback_dsts = list()
-            feedbacks = list()
-            chances = list()
-
-            max_dst = -1
-            for prev_song, next_song, feedback in self.done_transitions:
-                dst = self.distance(prev_song, next_song, weights)
-                feedback_dsts.append((feedback, dst))
-                max_dst = max(max_dst, dst)
-            factor = 50 / float(max_dst)
-            distance_sum = sum((dst * factor for _, dst in feedback_dsts))
-            for feedback, dst in feedback_dsts:
-                chance = numpy.power(numpy.e, -(dst * factor)) / distance_sum
-                feedbacks.append(feedback)
-                chances.append(chance)
-            chances = self.normalize_chances(chances)
-            res_diff = 0
-
-            for feedback, chance in zip(feedbacks, chances):
-                res_diff = abs(feedback - chance)
-            return res_diff
+        l.debug("Optimize the current weights.")
 
         def contrains_fun(weights):
             diff = sum(weights) - 1
             return diff
 
         res = scipy.optimize.minimize(
-            func_to_optimize,
-            tuple(self.weights),
+            self.feedback_loss,
+            tuple(weights),
+            args=(transitions, ),
             method='SLSQP',
             constraints={'type': 'eq',
-                         'fun': contrains_fun},
-            jac=False,
-            bounds=[[0, 1] for _ in self.weights])
-        if res.success:
-            self.weights = res.x
+                         'fun': contrains_fun,
+                         'jac': numpy.ones_like},
+            jac=True,
+            bounds=[[0, 1] for _ in weights])
+        return res.x if res.success else None
+
+    def learned_weights(self, transitions, weights):
+        """Do one step of projected gradient descent on the weights.
+
+        The gradient of :func:`feedback_loss` is averaged over the given
+        transitions, so the size of a step does not depend on the amount of
+        transitions. The new weights are projected back onto the weights that
+        are at least 0 and sum to 1.
+
+        :param transitions: The transitions as tuples of the previous song,
+                            the next song and the feedback.
+        :type transitions: list(tuple(str, str, float))
+        :param numpy.array weights: The weights to start with.
+        :returns: The new weights.
+        :rtype: numpy.array
+        """
+        l.debug("Learning the weights from %d transitions.", len(transitions))
+        _, gradient = self.feedback_loss(weights, transitions)
+        step = self.learning_rate * gradient / len(transitions)
+        return self.project_weights(
+            numpy.asarray(weights, dtype=float) - step)
+
+    @staticmethod
+    def project_weights(weights):
+        """Project the given weights onto the probability simplex.
+
+        This finds the closest weights that are at least 0 and sum to 1, see
+        https://arxiv.org/abs/1309.1541
+
+        :param numpy.array weights: The weights to project.
+        :returns: The projected weights.
+        :rtype: numpy.array
+        """
+        ordered = numpy.sort(weights)[::-1]
+        cumulative = numpy.cumsum(ordered) - 1
+        ranks = numpy.arange(1, len(weights) + 1)
+        rho = numpy.flatnonzero(ordered - cumulative / ranks > 0)[-1]
+        return numpy.maximum(weights - cumulative[rho] / (rho + 1), 0)
+
+    def pair_distances(self, pairs, weights):
+        """Calculate the distances of the given pairs of songs and their
+        gradients with respect to the weights.
+
+        Only the Mahalanobis term of a distance depends on the weights, for a
+        pair with mean difference ``u`` and weighted covariance matrices
+        ``P`` and ``Q`` its gradient with respect to the weighted PCA vector
+        ``w`` is ``-((P^-1 + Q^-1) u) * u / w / 2``.
+
+        :param pairs: The pairs of songs.
+        :type pairs: list(tuple(str, str))
+        :param numpy.array weights: The weights to use.
+        :returns: A tuple of the distance of every pair, the same as
+                  :func:`distance`, and the gradient of every distance.
+        :rtype: tuple(numpy.array, numpy.array)
+        """
+        songs = list(dict.fromkeys(song for pair in pairs for song in pair))
+        positions = {song: i for i, song in enumerate(songs)}
+        p_idx = [positions[p] for p, _ in pairs]
+        q_idx = [positions[q] for _, q in pairs]
+        covariances, inverses, _ = self.factorize(songs, weights)
+        means = numpy.array([self.song_properties[s][1] for s in songs])
+
+        # The trace of a product of two symmetric matrices is the sum of their
+        # elementwise product.
+        traces = (numpy.einsum('nij,nij->n', inverses[q_idx],
+                               covariances[p_idx]) +
+                  numpy.einsum('nij,nij->n', inverses[p_idx],
+                               covariances[q_idx]))
+        diff = means[p_idx] - means[q_idx]
+        inverse_diff = numpy.einsum('nij,nj->ni',
+                                    inverses[p_idx] + inverses[q_idx], diff)
+        mahalanobis = numpy.einsum('ni,ni->n', diff, inverse_diff)
+        distances = (traces + mahalanobis - 2 * means.shape[1]) / 4
+
+        w_vector = self.get_w_vector(self.pca, weights)
+        gradients = numpy.dot(-inverse_diff * diff / w_vector / 2, self.pca)
+        return distances, gradients
+
+    def feedback_loss(self, weights, transitions):
+        """Calculate how badly the given weights explain the feedback and the
+        gradient of this loss.
+
+        The distances of the transitions are softmaxed and squared in the
+        same way as the chances of :func:`next_song_chances`, the loss is the
+        sum of the absolute differences between these chances and the
+        feedback of the transitions.
+
+        :param numpy.array weights: The weights to use.
+        :param transitions: The transitions as tuples of the previous song,
+                            the next song and the feedback.
+        :type transitions: list(tuple(str, str, float))
+        :returns: The loss and its gradient with respect to the weights.
+        :rtype: tuple(float, numpy.array)
+        """
+        weights = numpy.asarray(weights, dtype=float)
+        if not transitions:
+            return 0.0, numpy.zeros(len(weights))
+        feedbacks = numpy.array([feedback for _, _, feedback in transitions])
+        distances, gradients = self.pair_distances(
+            [(prev_song, next_song)
+             for prev_song, next_song, _ in transitions], weights)
+
+        # Find the max distance and normalize it to 50, just like when
+        # picking a song.
+        max_idx = numpy.argmax(distances)
+        factor = 50 / distances[max_idx]
+        logits = -2 * factor * distances
+        chances = numpy.exp(logits - logits.max())
+        chances /= chances.sum()
+
+        factor_gradient = -factor / distances[max_idx] * gradients[max_idx]
+        logit_gradients = -2 * (factor * gradients +
+                                distances[:, None] * factor_gradient)
+        chance_gradients = chances[:, None] * (
+            logit_gradients - numpy.dot(chances, logit_gradients))
+        signs = numpy.sign(chances - feedbacks)
+        return (numpy.sum(numpy.abs(feedbacks - chances)),
+                numpy.dot(signs, chance_gradients))
 
     def all_but_current_song(self, filter_songs=True):
         """Get all songs except for the current song.
@@ -647,7 +1307,8 @@ class NCAPicker(Picker):
         This function makes a generator that contains all not played songs
         after the last call to :func:`reset_songs` filtered by their tempo,
         which can have a maximum percentage offset of ``max_tempo_percent``
-        given to :class:`NCAPicker`.
+        given to :class:`NCAPicker`. The songs are found with
+        :attr:`tempo_index`, ordered by their tempo.
 
         :param string base_song: The base song of which its tempo used for
                                  filtering, if ``None`` the current song is
@@ -658,11 +1319,8 @@ class NCAPicker(Picker):
         if base_song is None:
             base_song = self.current_song
         _, _unused, base_tempo = self.song_properties[base_song]
-        tempo_factor = self.max_tempo_percent / 100
-        for song_file in self.song_files:
-            _, _unused, other_tempo = self.song_properties[song_file]
-            tempo_offset = abs(base_tempo - other_tempo)
-            if tempo_factor * other_tempo > tempo_offset:
-                yield song_file
-            else:
-                l.debug("Discarding %s because of its tempo.", song_file)
+        close = self.tempo_index.window(float(base_tempo),
+                                        self.max_tempo_percent)
+        l.debug("Discarding %d songs because of their tempo.",
+                len(self.tempo_index) - len(close))
+        yield from close
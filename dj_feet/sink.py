@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""This module contains a small listener for the output of a
+:class:`dj_feet.transitioners.StreamTransitioner`.
+
+The sink listens on a local UNIX socket and stores everything it receives,
+which is useful to test the stream. It can also be run on its own::
+
+    python3 -m dj_feet.sink /tmp/sdaas/stream.sock stream.mp3
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+import logging
+
+l = logging.getLogger(__name__)
+
+
+class StreamSink:
+    """A listener on a UNIX socket that stores the stream it receives.
+
+    Only one connection is handled at a time, when it is closed the sink
+    waits for the next connection.
+    """
+
+    def __init__(self, location, output_file=None):
+        """
+        :param str location: The location of the socket to create.
+        :param output_file: The file to append the received data to, if this
+                            is ``None`` the data is only kept in memory.
+        :type output_file: str or None
+        """
+        self.location = location
+        self.output_file = output_file
+        self.data = bytearray()
+        #: The time of the first received byte of the current connection.
+        self.first_received = None
+        self._stopped = threading.Event()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(location)
+        self._socket.listen(1)
+        self._socket.settimeout(0.1)
+        self._thread = threading.Thread(
+            target=self._listen, name='sink', daemon=True)
+        self._thread.start()
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            l.info("Listener connected.")
+            with connection:
+                self._receive(connection)
+            l.info("Listener disconnected.")
+
+    def _receive(self, connection):
+        connection.settimeout(0.1)
+        while not self._stopped.is_set():
+            try:
+                data = connection.recv(65536)
+            except socket.timeout:
+                continue
+            if not data:
+                return
+            if self.first_received is None:
+                self.first_received = time.monotonic()
+            self.data.extend(data)
+            if self.output_file is not None:
+                with open(self.output_file, 'ab') as f:
+                    f.write(data)
+
+    def close(self):
+        """Stop listening and remove the socket.
+
+        :returns: Nothing of value.
+        """
+        self._stopped.set()
+        self._thread.join()
+        self._socket.close()
+        os.remove(self.location)
+
+
+def main(location, output_file):
+    """Receive a stream until interrupted.
+
+    :param str location: The location of the socket to create.
+    :param str output_file: The file to write the stream to.
+    """
+    sink = StreamSink(location, output_file)
+    print("Listening on {}, writing to {}.".format(location, output_file))
+    try:
+        while True:
+            time.sleep(1)
+            print("Received {} bytes.".format(len(sink.data)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:3])
@@ -1,4 +1,5 @@
 """This file contains the classes needed to represent a song"""
+import hashlib
 import librosa
 import numpy as np
 
@@ -23,6 +24,7 @@ class Song:
         self.curr_time = 0
         self.time_series = self.sampling_rate = None
         self.tempo = self.beat_track = None
+        self._content_id = None
         if process:
             self.set_process_data()
 
@@ -42,6 +44,24 @@ class Song:
             self.time_series, self.sampling_rate)
         self.beat_track = librosa.core.frames_to_samples(beat_track_frames)
 
+    @property
+    def content_id(self):
+        """A hash of the wav file of this song.
+
+        Songs with the same ``content_id`` have the same samples, so this
+        identifies a song in persistent caches even if another song is stored
+        under the same name later. The hash is only calculated once.
+
+        :rtype: str
+        """
+        if self._content_id is None:
+            digest = hashlib.sha256()
+            with open(self.file_location, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            self._content_id = digest.hexdigest()
+        return self._content_id
+
     def next_segment(self, segment_size, begin=False):
         """Get the next sector starting from the ``begin`` or ``curr_time`` of
         ``segment_size`` long.
@@ -116,14 +136,12 @@ class Song:
         :param int seg_end: The sample index indicating the end of the range to
                             find beats on.
         :returns: A list containing all indices of beats in the given range.
-        :rtype: numpy.array(int)
+        :rtype: list(int)
         """
-        beat_tracks = []
-        for bt in self.beat_track:
-            if bt >= seg_start and bt <= seg_end:
-                beat_tracks.append(bt)
-
-        return beat_tracks
+        # The beats are sorted, so the range can be found by bisection.
+        first = np.searchsorted(self.beat_track, seg_start, side='left')
+        last = np.searchsorted(self.beat_track, seg_end, side='right')
+        return list(self.beat_track[first:last])
 
     def segment_size_left(self, segment_size):
         """
@@ -2,11 +2,30 @@
 
 import librosa
 import os
+import stat
+import json
+import shutil
+import tempfile
 import datetime
+import time
 import numpy as np
-import tempfile
+import math
+import errno
 import logging
-import pydub
+import traceback
+import socket
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pydub.exceptions import CouldntEncodeError
+
+from .caches import TransitionCache, PartCache
+from . import kernels
+from .codecs import get_codec, PassthroughMp3Codec
+from . import mp3
+from .part import Part
+from .song import Song
+from .workers import TaskQueue
 
 l = logging.getLogger(__name__)
 
@@ -54,6 +73,142 @@ class Transitioner:
         raise NotImplementedError(
             "This function should be overridden by the subclass")
 
+    def wait_for_output(self, timeout=None):
+        """Wait till all samples given to :func:`write_sample` are written.
+
+        Transitioners that write their samples synchronously do not have to
+        override this method.
+
+        :param timeout: The maximum amount of seconds to wait, ``None`` means
+                        waiting until everything is written.
+        :type timeout: float or None
+        :returns: If all samples are written to the output.
+        :rtype: bool
+        """
+        return True
+
+    def release_parts(self, part_no):
+        """Let the transitioner know the parts before ``part_no`` are no
+        longer needed.
+
+        This is called by the core loop with the oldest part that is not yet
+        announced or played, so a transitioner that deletes old parts does not
+        delete parts clients still need. Transitioners that do not delete
+        parts do not have to override this method.
+
+        :param int part_no: The number of the oldest part that is needed.
+        :returns: Nothing of value.
+        """
+        pass
+
+    @property
+    def output_usage(self):
+        """The parts this transitioner currently stores in its output.
+
+        :returns: ``None`` if this is not known, otherwise a dictionary with
+                  the amount of ``parts`` and ``bytes`` and the number of the
+                  oldest stored part as ``first_part``, which is ``None`` if
+                  no part is stored.
+        :rtype: dict or None
+        """
+        return None
+
+    def speculate(self, prev_song, picker):
+        """Prepare the next merge while the core loop is sleeping.
+
+        This is called after a sample is given to :func:`write_sample`.
+        Transitioners that can prepare merges ahead of time can use
+        :func:`dj_feet.pickers.Picker.get_candidates` to find out which songs
+        are likely to be given to the next call of :func:`merge`. This method
+        should not block.
+
+        :param Song prev_song: The song that will be ``prev_song`` in the next
+                               call to :func:`merge`.
+        :param dj_feet.pickers.Picker picker: The picker that picks the next
+                                              song.
+        :returns: Nothing of value.
+        """
+        pass
+
+    def fast_start(self, picker):
+        """Write the first part using a cheap path, if one is available.
+
+        This is called instead of :func:`merge` and :func:`write_sample` for
+        the first part, so the first part is available as soon as possible.
+        Transitioners without such a path do not have to override this method.
+
+        :param dj_feet.pickers.Picker picker: The picker that picks the first
+                                              song, see
+                                              :func:`Picker.pick_first_song`.
+        :returns: ``None`` if no part was written, otherwise a tuple of the
+                  file location of the song playing at the end of the written
+                  part and the ``curr_time`` of this song, which is also the
+                  ``segment_size`` of the part.
+        :rtype: tuple(str, int) or None
+        """
+        return None
+
+    @staticmethod
+    def process_song_file(song_file):
+        """Prepare the given song file when it is added.
+
+        This does nothing by default.
+
+        :param str song_file: The path to the wav to be processed.
+        :rtype: None
+        """
+        return None
+
+
+#: The state of a worker process of :func:`InfJukeboxTransitioner.speculate`,
+#: the ``transitioner`` to merge with and the last loaded ``prev_song``.
+_speculation_state = {}
+
+
+def _init_speculation(transitioner):
+    """Initialize a worker process that does speculative merges.
+
+    :param InfJukeboxTransitioner transitioner: The transitioner to merge
+                                                with, it is only sent once to
+                                                every worker.
+    :returns: Nothing of value.
+    """
+    _speculation_state['transitioner'] = transitioner
+    _speculation_state['prev_song'] = None
+    kernels.warm_up()
+
+
+def _speculative_merge(prev_file, prev_time, next_file):
+    """Merge the song in ``prev_file`` at ``prev_time`` with the song in
+    ``next_file``.
+
+    This is executed in a worker process by
+    :func:`InfJukeboxTransitioner.speculate`, the songs are loaded by the
+    worker so they do not have to be sent to it.
+
+    :returns: A tuple of the sample, the merge time, the ``curr_time`` of
+              the next song after the merge and the transitions that were
+              added to the transition cache.
+    :rtype: tuple(numpy.array, int, int, list)
+    """
+    transitioner = _speculation_state['transitioner']
+    cache = transitioner.transition_cache
+    if cache is not None:
+        # Load the transitions the parent process stored since the last
+        # merge. The parent also stores the transitions found here.
+        cache = TransitionCache(cache.cache_file)
+        cache.detach()
+        transitioner.transition_cache = cache
+    prev_song = _speculation_state['prev_song']
+    if prev_song is None or prev_song.file_location != prev_file:
+        prev_song = Song(prev_file)
+        _speculation_state['prev_song'] = prev_song
+    prev_song.curr_time = prev_time
+    next_song = Song(next_file)
+    sample, merge_time = transitioner.merge(prev_song, next_song)
+    added = [] if cache is None else cache.added
+    return sample, merge_time, next_song.curr_time, added
+
 
 class InfJukeboxTransitioner(Transitioner):
     """A Transitioner based on the Infinite Jukebox concept.
@@ -68,20 +223,303 @@ class InfJukeboxTransitioner(Transitioner):
                  output_folder,
                  segment_size=30,
                  fade_time=6,
-                 fade_steps=1000):
+                 fade_steps=1000,
+                 async_encode=False,
+                 output_format='mp3',
+                 bitrate=None,
+                 complexity=None,
+                 speculate_amount=0,
+                 cache_dir=None,
+                 max_full_comparisons=None,
+                 coarse_factor=32,
+                 search_budget=None,
+                 stream_parts=False,
+                 retention_parts=None,
+                 renditions=None,
+                 song_folder=None,
+                 fast_start=False,
+                 passthrough=False,
+                 part_cache_size=None):
         """
         :param str output_folder: The folder to write the new part to.
         :param int segment_size: The length (in seconds) of a part.
-        :param int fade_time: The total time in seconds a fade should last.
+        :param int fade_time: The total time in seconds a fade should last,
+                              this should be shorter than ``segment_size``.
         :param int fade_steps: The amount of samples to merge at the same time
                                during the coarse fading.
+        :param bool async_encode: Encode the parts on a background thread so
+                                  the core loop can continue while a part is
+                                  being encoded. The parts are still written
+                                  in order.
+        :param str output_format: The format to write the parts in. This
+                                  should be one of ``wav``, ``flac``, ``opus``
+                                  or ``mp3``.
+        :param int bitrate: The bitrate in kbps to encode the parts with. If
+                            this is ``None`` the default of the encoder is
+                            used.
+        :param int complexity: The compression level of the encoder, its range
+                               depends on the ``output_format``. If this is
+                               ``None`` the default of the encoder is used.
+        :param int speculate_amount: The amount of most likely next songs to
+                                     prepare a part for while the core loop is
+                                     sleeping. Every song is prepared in its
+                                     own process, a value of 0 disables this.
+        :param str cache_dir: The directory to cache the found transitions in.
+                              If this is ``None`` nothing is cached.
+        :param int max_full_comparisons: The maximum amount of pairs of beats
+                                         to compare at full resolution. If
+                                         there are more pairs they are first
+                                         compared using decimated signals and
+                                         only the best pairs are compared at
+                                         full resolution. If this is ``None``
+                                         all pairs are compared at full
+                                         resolution.
+        :param int coarse_factor: The factor to decimate the beats with when
+                                  comparing them coarsely.
+        :param float search_budget: The maximum amount of seconds to spend
+                                    searching for similar beats during a
+                                    merge. The most promising pairs of beats
+                                    are compared first and the best pair found
+                                    within the budget is used. If this is
+                                    ``None`` the search is not limited.
+        :param bool stream_parts: Stream the parts to the encoder in chunks of
+                                  a second, so the encoded part is written to
+                                  the output folder while it is being
+                                  encoded instead of only after it is fully
+                                  encoded.
+        :param int retention_parts: The amount of most recent parts to keep in
+                                    the output folder, older parts are deleted
+                                    after a new part is written. Parts that
+                                    are not released by :func:`release_parts`
+                                    are never deleted. This should be large
+                                    enough for all clients to have downloaded
+                                    a part before it is deleted. If this is
+                                    ``None`` all parts are kept.
+        :param renditions: The bitrates in kbps of the extra renditions to
+                           encode every part in. They are encoded in parallel
+                           and written next to the normal part together with a
+                           JSON manifest listing all files of the part. If
+                           this is ``None`` only the normal part is written.
+        :type renditions: list(int) or None
+        :param str song_folder: The folder that contains the wav files to use.
+        :param bool fast_start: Use the opening of a song, that is encoded
+                                when the song is added, as the first part.
+                                This makes the first part available almost
+                                immediately. This needs a ``cache_dir``.
+        :param bool passthrough: Copy the unmixed pieces of the songs from a
+                                 MP3 stream of the entire song, that is
+                                 encoded when the song is added, instead of
+                                 encoding them again. Only the transitions are
+                                 encoded. To cut the streams at frame
+                                 boundaries the beat of the next song is moved
+                                 at most half a frame (13 ms). This needs a
+                                 ``cache_dir`` and the ``mp3`` format.
+        :param int part_cache_size: The maximum amount of megabytes of encoded
+                                    parts to keep in the ``cache_dir``. When
+                                    the same part is created again, for
+                                    example when the same set is played again,
+                                    the cached part is copied instead of
+                                    encoding it again. If this is ``None`` no
+                                    parts are cached.
         """
+        if fade_time >= segment_size:
+            raise ValueError("The fade should be shorter than a part")
         self.output_folder = output_folder
         self.segment_size = segment_size
         self.segment_delta = datetime.timedelta(seconds=segment_size)
         self.part_no = 0
         self.fade_time = fade_time
         self.fade_steps = fade_steps
+        # Do not compile the kernels during the first merge.
+        kernels.warm_up()
+        self.encode_queue = TaskQueue('encoder') if async_encode else None
+        self.codec = get_codec(output_format, bitrate, complexity)
+        self.speculate_amount = speculate_amount
+        self._speculator = None
+        self._speculations = {}
+        if max_full_comparisons is not None and max_full_comparisons < 1:
+            raise ValueError("At least one full comparison is needed")
+        self.max_full_comparisons = max_full_comparisons
+        self.coarse_factor = coarse_factor
+        self.search_budget = search_budget
+        self.stream_parts = stream_parts
+        if retention_parts is not None and retention_parts < 1:
+            raise ValueError("At least one part should be retained")
+        self.retention_parts = retention_parts
+        self._part_files = OrderedDict()
+        self._released_part = 0
+        self.renditions = [
+            get_codec(output_format, rendition, complexity)
+            for rendition in renditions or []
+        ]
+        self._rendition_pool = None
+        self.song_folder = song_folder
+        self.cache_dir = cache_dir
+        self.use_fast_start = fast_start
+        self.passthrough = None
+        if passthrough:
+            if output_format != 'mp3' or cache_dir is None:
+                raise ValueError("Passthrough needs the mp3 format and a "
+                                 "cache_dir")
+            self.passthrough = PassthroughMp3Codec(bitrate, complexity)
+        self._frame_streams = OrderedDict()
+        self._output_usage = {'parts': 0, 'bytes': 0, 'first_part': None}
+        #: Statistics of the last search for similar beats, a dictionary with
+        #: the amount of ``candidates``, the amount of pairs ``compared``,
+        #: the ``coverage`` of the search and if it ``timed_out``.
+        self.last_search_stats = None
+        self.transition_cache = None
+        if cache_dir is not None:
+            self.transition_cache = TransitionCache(
+                os.path.join(cache_dir, 'transitions.json'))
+        self.part_cache = None
+        if part_cache_size is not None:
+            if cache_dir is None:
+                raise ValueError("Caching parts needs a cache_dir")
+            self.part_cache = PartCache(
+                os.path.join(cache_dir, 'parts'), part_cache_size * 1000000)
+
+    def __getstate__(self):
+        # The workers cannot be pickled, and are not needed in the processes
+        # doing the speculative merges.
+        state = self.__dict__.copy()
+        state.update({
+            'encode_queue': None,
+            '_speculator': None,
+            '_speculations': {},
+            '_rendition_pool': None,
+            '_frame_streams': OrderedDict(),
+        })
+        return state
+
+    @staticmethod
+    def opening_file(cache_dir, song_file, segment_size, extension):
+        """Get the location of the encoded opening of the given song.
+
+        :param str cache_dir: The directory the openings are stored in.
+        :param str song_file: The wav file of the song.
+        :param int segment_size: The length (in seconds) of the opening.
+        :param str extension: The extension of the used codec.
+        :returns: The location of the opening.
+        :rtype: str
+        """
+        filename, _ = os.path.splitext(os.path.basename(song_file))
+        return os.path.join(cache_dir, "{}_opening{}.{}".format(
+            filename, segment_size, extension))
+
+    @staticmethod
+    def frames_file(cache_dir, song_file, bitrate):
+        """Get the location of the passthrough stream of the given song.
+
+        :param str cache_dir: The directory the streams are stored in.
+        :param str song_file: The wav file of the song.
+        :param int bitrate: The bitrate of the stream, ``None`` for the
+                            default bitrate.
+        :returns: The location of the stream.
+        :rtype: str
+        """
+        filename, _ = os.path.splitext(os.path.basename(song_file))
+        return os.path.join(cache_dir, "{}_frames{}.mp3".format(
+            filename, 'default' if bitrate is None else bitrate))
+
+    @staticmethod
+    def process_song_file(cache_dir,
+                          song_file,
+                          segment_size=30,
+                          output_format='mp3',
+                          bitrate=None,
+                          complexity=None,
+                          fast_start=False,
+                          passthrough=False):
+        """Encode the opening of the given song for :func:`fast_start`.
+
+        The opening is exactly the first part :func:`merge` creates when the
+        loop starts with this song, it is only encoded if ``fast_start`` is
+        set. If ``passthrough`` is set the entire song is encoded, so the
+        parts can be cut from it. Nothing is done if neither is set.
+
+        :param str cache_dir: The directory to store the opening in.
+        :param str song_file: The path to the wav to be processed.
+        :param int segment_size: The length (in seconds) of a part.
+        :param str output_format: The format to encode the opening in.
+        :param int bitrate: The bitrate to encode the opening with.
+        :param int complexity: The compression level of the encoder.
+        :param bool fast_start: Encode the opening of the song.
+        :param bool passthrough: Encode the entire song for passthrough, this
+                                 is only done for the ``mp3`` format.
+        :rtype: None
+        """
+        passthrough = passthrough and output_format == 'mp3'
+        if not fast_start and not passthrough:
+            return None
+
+        def encode(codec, sample, sampling_rate, filename):
+            # Encode to a temporary file so a half written file is never used.
+            tmp_file = filename + '.tmp.' + codec.extension
+            codec.encode(sample, sampling_rate, tmp_file)
+            os.replace(tmp_file, filename)
+
+        if passthrough:
+            sample, sampling_rate = librosa.load(song_file)
+            encode(PassthroughMp3Codec(bitrate, complexity), sample,
+                   sampling_rate, InfJukeboxTransitioner.frames_file(
+                       cache_dir, song_file, bitrate))
+            l.info("Encoded %s for passthrough.", song_file)
+            sample = sample[:librosa.core.time_to_samples(
+                [segment_size], sampling_rate)[0]]
+        else:
+            sample, sampling_rate = librosa.load(song_file,
+                                                 duration=segment_size)
+        if fast_start:
+            codec = get_codec(output_format, bitrate, complexity)
+            encode(codec, sample, sampling_rate,
+                   InfJukeboxTransitioner.opening_file(
+                       cache_dir, song_file, segment_size, codec.extension))
+            l.info("Encoded the opening of %s.", song_file)
+
+    def fast_start(self, picker):
+        """Copy the opening of a song picked by the picker as the first part.
+
+        Only songs whose opening was encoded by :func:`process_song_file` can
+        be used.
+
+        :param dj_feet.pickers.Picker picker: The picker that picks the song
+                                              from the songs with an opening.
+        :returns: ``None`` if no opening could be used, otherwise the file
+                  location of the used song and the ``segment_size``.
+        :rtype: tuple(str, int) or None
+        """
+        if not self.use_fast_start or self.cache_dir is None or \
+           self.song_folder is None:
+            return None
+        if self.renditions:
+            l.info("No fast start as renditions are not cached.")
+            return None
+
+        openings = {}
+        for song in os.listdir(self.song_folder):
+            song_file = os.path.join(self.song_folder, song)
+            opening_file = self.opening_file(self.cache_dir, song_file,
+                                             self.segment_size,
+                                             self.codec.extension)
+            if os.path.isfile(opening_file):
+                openings[song_file] = opening_file
+        if not openings:
+            l.warning("No openings available, starting normally.")
+            return None
+
+        song_file = picker.pick_first_song(sorted(openings))
+        if song_file is None:
+            l.warning("The picker picked no opening, starting normally.")
+            return None
+        part_no = self.part_no
+        self.part_no += 1
+        part_file = os.path.join(self.output_folder, "part{}.{}".format(
+            part_no, self.codec.extension))
+        shutil.copyfile(openings[song_file], part_file)
+        self._retain_part(part_no, [part_file])
+        l.info("Used the opening of %s as part %d.", song_file, part_no)
+        return song_file, self.segment_size
 
     def merge(self, prev_song, next_song):
         """Merge two songs together.
@@ -99,8 +537,9 @@ class InfJukeboxTransitioner(Transitioner):
                           change songs, next_song should be the same as
                           prev_song.
         :returns: A tuple containing the next segment end the time the
-                  transition happens.
-        :rtype: tuple(numpy.array, int)
+                  transition happens. The segment references the time series
+                  of the songs, only the transition itself is a new array.
+        :rtype: tuple(Part, int)
         """
         if prev_song is None:
             if self.part_no > 0:
@@ -109,6 +548,21 @@ class InfJukeboxTransitioner(Transitioner):
                 l.debug('This is the first merge.')
             prev_song = next_song
 
+        speculation = self._take_speculation(prev_song, next_song)
+        if speculation is not None:
+            try:
+                sample, merge_time, curr_time, _ = speculation.get()
+            except ValueError:
+                raise
+            except Exception:
+                l.warning("Speculative merge failed, merging again: %s",
+                          traceback.format_exc())
+            else:
+                l.info("Using the speculative merge to %s.",
+                       next_song.file_location)
+                next_song.curr_time = curr_time
+                return sample, merge_time
+
         # Check whether the previous song still has segment size of time left
         if prev_song.file_location == next_song.file_location:
             # We check op times two as we need 30 seconds for now and we might
@@ -142,7 +596,9 @@ class InfJukeboxTransitioner(Transitioner):
             l.debug("Merging the same songs: appending")
             # If it is the same song, return the next segment.
             next_song.curr_time = prev_song.curr_time + self.segment_size
-            return (prev_song.time_series[seg_start:seg_end],
+            key = (prev_song.content_id, int(seg_start), int(seg_end))
+            return (Part([(prev_song.time_series[seg_start:seg_end], None,
+                           prev_song.file_location, seg_start)], key),
                     self.segment_size)
         else:
             l.info("Merging the two different songs.")
@@ -169,17 +625,91 @@ class InfJukeboxTransitioner(Transitioner):
             next_song.curr_time = next_song.time_delta(0, final_frame)
 
             # TODO: No errors with mixing frames / segments?
-            prev_part = np.append(prev_song.time_series[seg_start:prev_frame],
-                                  transition)
-            next_part = next_song.time_series[next_frame:final_frame]
-            song_array = np.append(prev_part, next_part)
+            song_part = Part(key=(
+                prev_song.content_id, int(seg_start), int(prev_frame),
+                next_song.content_id, int(next_frame), int(final_frame)))
+            song_part.append(prev_song.time_series[seg_start:prev_frame],
+                             source=prev_song.file_location, start=seg_start)
+            song_part.append(transition)
+            song_part.append(next_song.time_series[next_frame:final_frame],
+                             source=next_song.file_location, start=next_frame)
             merge_time = next_song.time_delta(seg_start, prev_frame)
 
             l.debug("Merged from %d to %d for the old song and from %d to" +
                     " %d fro the new song.", seg_start, prev_frame, next_frame,
                     final_frame)
 
-            return (song_array, merge_time)
+            return (song_part, merge_time)
+
+    def speculate(self, prev_song, picker):
+        """Merge ``prev_song`` with the most likely next songs in the
+        background.
+
+        The ``speculate_amount`` most likely candidates of the ``picker`` are
+        loaded and merged with ``prev_song`` in worker processes. If one of
+        these songs is given to the next call of :func:`merge` the prepared
+        part is used, the other parts are discarded.
+
+        :param Song prev_song: The song that will be ``prev_song`` in the next
+                               call to :func:`merge`.
+        :param dj_feet.pickers.Picker picker: The picker to get the candidates
+                                              from.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        self._discard_speculations()
+        if not self.speculate_amount:
+            return
+        if self._speculator is None:
+            # This process runs other threads, which could hold a lock while
+            # it forks, so the workers are started by a fork server. They
+            # are started right away and get this transitioner only once.
+            context = mp.get_context('forkserver')
+            self._speculator = context.Pool(
+                self.speculate_amount,
+                initializer=_init_speculation,
+                initargs=(self, ))
+
+        for next_file in picker.get_candidates(self.speculate_amount):
+            if next_file == prev_song.file_location:
+                continue
+            l.debug("Speculatively merging to %s.", next_file)
+            key = (prev_song.file_location, prev_song.curr_time, next_file)
+            self._speculations[key] = self._speculator.apply_async(
+                _speculative_merge, key, callback=self._store_transitions)
+
+    def _store_transitions(self, result):
+        """Store the transitions found by a speculative merge in the
+        transition cache.
+
+        This is also done for discarded merges that finished anyway.
+
+        :param tuple result: The result of :func:`_speculative_merge`.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        if self.transition_cache is not None:
+            self.transition_cache.update(result[3])
+
+    def _take_speculation(self, prev_song, next_song):
+        """Get the speculative merge of ``prev_song`` and ``next_song``.
+
+        All other speculative merges are discarded.
+
+        :returns: The result of the speculative merge or ``None`` if there is
+                  no such merge.
+        :rtype: multiprocessing.pool.AsyncResult or None
+        """
+        key = (prev_song.file_location, prev_song.curr_time,
+               next_song.file_location)
+        speculation = self._speculations.pop(key, None)
+        self._discard_speculations()
+        return speculation
+
+    def _discard_speculations(self):
+        # The pool cannot cancel merges, the discarded merges finish but only
+        # their transitions are used.
+        self._speculations = {}
 
     def combine_similar_frames(self, prev_song, next_song, seg_start, seg_end):
         """
@@ -188,7 +718,9 @@ class InfJukeboxTransitioner(Transitioner):
         Find a similar frame in the previous (current) and the next song. Only
         frames in the next segment of the current song and the first segment
         of the next song will be taken into account. Similarities between
-        beats are compared and approximated using cross correlation.
+        beats are compared and approximated using cross correlation. If a
+        ``cache_dir`` is set the found beats are cached, so the search is done
+        only once for every transition.
 
         :param Song prev_song: The song that is currently playing.
         :param Song next_song: The song to play next, after prev_song.
@@ -206,6 +738,124 @@ class InfJukeboxTransitioner(Transitioner):
             self.segment_size, begin=True)
         next_bt = next_song.beat_tracks_in_segment(next_start, next_end)
 
+        cached = key = None
+        if self.transition_cache is not None:
+            # The songs are identified by their content, another song can be
+            # stored under the same name. The found beats also depend on how
+            # many pairs the search could compare.
+            key = (prev_song.content_id, int(seg_start), int(seg_end),
+                   next_song.content_id, self.segment_size, self.fade_time,
+                   self.max_full_comparisons, self.coarse_factor)
+            cached = self.transition_cache.get(key)
+
+        if cached is not None and cached[0] < len(prev_bt) and cached[
+                1] < len(next_bt):
+            l.debug("Found transition in the cache.")
+            highest_p, highest_n, _ = cached
+        else:
+            highest_p, highest_n, highest = self.find_similar_beats(
+                prev_song, prev_bt, next_song, next_bt)
+            # A search that ran out of time did not see every pair, so a
+            # later merge with more time might find a better transition.
+            if key is not None and not self.last_search_stats['timed_out']:
+                self.transition_cache.put(key, (highest_p, highest_n,
+                                                float(highest)))
+
+        next_mid = next_bt[highest_n]
+        if self.passthrough is not None:
+            next_mid += self._passthrough_shift(prev_song, prev_bt[highest_p],
+                                                next_song, next_mid)
+        transition, prev_end, next_start = self.fade_frames(
+            prev_song, prev_bt[highest_p], next_song, next_mid)
+
+        l.info("Similar frames found, old: %d, new: %d.", highest_p, highest_n)
+        return transition, prev_end, next_start
+
+    def _passthrough_shift(self, prev_song, prev_mid, next_song, next_mid):
+        """Get the amount of samples to move the beat of the next song.
+
+        The samples between the last frame boundary of the previous song and
+        the first frame boundary of the next song are encoded again when
+        passing the frames through. These samples should fill a whole amount
+        of frames, which is achieved by moving the beat of the next song at
+        most half a frame.
+
+        :returns: The amount of samples to add to ``next_mid``, this is 0 if
+                  one of the songs cannot be passed through.
+        :rtype: int
+        """
+        prev_stream = self._frame_stream(prev_song.file_location)
+        next_stream = self._frame_stream(next_song.file_location)
+        if prev_stream is None or next_stream is None or \
+           prev_stream.samples_per_frame != next_stream.samples_per_frame:
+            return 0
+        frame = prev_stream.samples_per_frame
+        offset = librosa.core.time_to_samples([self.fade_time / 2],
+                                              prev_song.sampling_rate)[0]
+        prev_start = prev_mid - offset
+        boundary = mp3.frame_start(
+            mp3.frame_index(prev_start, frame, math.floor), frame)
+        # The fresh samples are ``prev_start - boundary``, the transition and
+        # the samples of the next song up to the next frame boundary, which is
+        # at ``-ENCODER_DELAY`` modulo the frame size.
+        shift = int(prev_start - boundary + 2 * offset - mp3.ENCODER_DELAY -
+                    (next_mid + offset)) % frame
+        if shift > frame // 2:
+            shift -= frame
+        if next_mid + shift - offset < 0:
+            shift += frame
+        return shift
+
+    def _frame_stream(self, song_file):
+        """Get the passthrough stream of the given song.
+
+        The last few loaded streams are kept in memory.
+
+        :param str song_file: The wav file of the song.
+        :returns: The stream or ``None`` if it was not encoded.
+        :rtype: dj_feet.mp3.FrameStream or None
+        """
+        if song_file in self._frame_streams:
+            self._frame_streams.move_to_end(song_file)
+            return self._frame_streams[song_file]
+        frames_file = self.frames_file(self.cache_dir, song_file,
+                                       self.passthrough.bitrate)
+        try:
+            stream = mp3.FrameStream.from_file(frames_file)
+        except FileNotFoundError:
+            l.debug("No passthrough stream for %s.", song_file)
+            return None
+        except ValueError:
+            l.warning("Broken passthrough stream %s, ignoring it.",
+                      frames_file)
+            return None
+        self._frame_streams[song_file] = stream
+        while len(self._frame_streams) > 4:
+            self._frame_streams.popitem(last=False)
+        return stream
+
+    def find_similar_beats(self, prev_song, prev_bt, next_song, next_bt):
+        """Find the most similar pair of beats of two songs.
+
+        :param Song prev_song: The song that is currently playing.
+        :param list(int) prev_bt: The beats of the next segment of
+                                  ``prev_song``.
+        :param Song next_song: The song to play next, after prev_song.
+        :param list(int) next_bt: The beats of the first segment of
+                                  ``next_song``.
+        If a ``search_budget`` is set the pairs are compared in order of their
+        coarse similarity and the best pair found so far is returned when the
+        budget is exhausted. The amount of the pairs that were compared is
+        stored in :attr:`last_search_stats`.
+
+        :returns: A tuple of the index in ``prev_bt`` and in ``next_bt`` of the
+                  most similar beats and the score of this pair.
+        :rtype: tuple(int, int, float)
+        """
+        deadline = None
+        if self.search_budget is not None:
+            deadline = time.monotonic() + self.search_budget
+
         min_prev_sample = librosa.core.time_to_samples(
             [prev_song.curr_time + self.fade_time / 2],
             prev_song.sampling_rate)[0]
@@ -218,36 +868,120 @@ class InfJukeboxTransitioner(Transitioner):
             [self.segment_size - self.fade_time / 2],
             next_song.sampling_rate)[0]
 
+        prev_beats = [
+            p for p in range(len(prev_bt) - 2)
+            if min_prev_sample <= prev_bt[p] < max_prev_sample
+        ]
+        next_beats = [
+            n for n in range(len(next_bt) - 2)
+            if min_next_sample <= next_bt[n] < max_next_sample
+        ]
+        pairs = [(p, n) for p in prev_beats for n in next_beats]
+        candidates = len(pairs)
+        limited = (self.max_full_comparisons is not None and
+                   candidates > self.max_full_comparisons)
+        timed_out = False
+        if limited or deadline is not None:
+            scores = self._coarse_scores(prev_song, prev_bt, next_song,
+                                         next_bt, pairs, deadline)
+            if np.isneginf(scores).any():
+                # The pairs without a coarse score are ranked last, so only
+                # the best scored pair is compared at full resolution.
+                timed_out = True
+                l.warning("Search budget exhausted after coarsely comparing "
+                          "%d of %d pairs of beats.",
+                          np.isfinite(scores).sum(), candidates)
+            ranked = np.argsort(-scores, kind='mergesort')
+            if limited:
+                l.debug("Only comparing %d of %d pairs of beats at full "
+                        "resolution.", self.max_full_comparisons, candidates)
+                ranked = ranked[:self.max_full_comparisons]
+            if deadline is None:
+                # Without a deadline the order does not matter, so keep the
+                # original order.
+                ranked = sorted(ranked)
+            pairs = [pairs[idx] for idx in ranked]
+
         highest = -9999999
         highest_n = 0
         highest_p = 0
+        compared = 0
         l.debug("Combining similar frames.")
-        for p in range(len(prev_bt) - 2):
-            if prev_bt[p] < min_prev_sample:
-                continue
-            if prev_bt[p] >= max_prev_sample:
+        for p, n in pairs:
+            if deadline is not None and compared and \
+               time.monotonic() > deadline:
+                timed_out = True
+                l.warning("Search budget exhausted after comparing %d of %d "
+                          "pairs of beats.", compared, candidates)
                 break
-            for n in range(len(next_bt) - 2):
-                if next_bt[n] < min_next_sample:
-                    continue
-                if next_bt[n] >= max_next_sample:
-                    break
-                corr = np.correlate(
-                    prev_song.time_series[prev_bt[p]:prev_bt[p + 1]],
-                    next_song.time_series[next_bt[n]:next_bt[n + 1]],
-                    mode="valid")
-                # Check whether the average of the array is higher than the
-                # highest previous found beat.
-                average = np.average(corr)
-                if average >= highest:
-                    highest = average
-                    highest_n = n
-                    highest_p = p
-        transition, prev_end, next_start = self.fade_frames(
-            prev_song, prev_bt[highest_p], next_song, next_bt[highest_n])
+            compared += 1
+            average = self.beat_similarity(
+                prev_song.time_series[prev_bt[p]:prev_bt[p + 1]],
+                next_song.time_series[next_bt[n]:next_bt[n + 1]])
+            # Check whether the average of the array is higher than the
+            # highest previous found beat.
+            if average >= highest:
+                highest = average
+                highest_n = n
+                highest_p = p
 
-        l.info("Similar frames found, old: %d, new: %d.", highest_p, highest_n)
-        return transition, prev_end, next_start
+        self.last_search_stats = {
+            'candidates': candidates,
+            'compared': compared,
+            'coverage': compared / candidates if candidates else 1.0,
+            'timed_out': timed_out,
+        }
+        return highest_p, highest_n, highest
+
+    @staticmethod
+    def beat_similarity(prev_beat, next_beat):
+        """Get the similarity of two beats.
+
+        This is the average of the cross correlation of both beats, see
+        :func:`dj_feet.kernels.correlation_average`.
+
+        :param numpy.array prev_beat: The samples of the first beat.
+        :param numpy.array next_beat: The samples of the second beat.
+        :returns: The similarity, higher is more similar.
+        :rtype: float
+        """
+        return kernels.correlation_average(prev_beat, next_beat)
+
+    def _coarse_scores(self, prev_song, prev_bt, next_song, next_bt, pairs,
+                       deadline=None):
+        """Score the given pairs of beats using decimated signals.
+
+        Every beat is decimated by :attr:`coarse_factor` by taking the mean
+        of blocks of samples, after which all pairs are scored by
+        :func:`beat_similarity`. When the ``deadline`` (a value of
+        :func:`time.monotonic`) passes the remaining pairs are not scored,
+        the first pair is always scored.
+
+        :returns: The coarse similarity of every pair in ``pairs``, pairs
+                  that were not scored get ``-inf``.
+        :rtype: numpy.array
+        """
+
+        def decimate(song, beats, i):
+            beat = song.time_series[beats[i]:beats[i + 1]]
+            blocks = len(beat) // self.coarse_factor
+            if blocks == 0:
+                return np.array([np.mean(beat)]) if len(beat) else beat
+            return beat[:blocks * self.coarse_factor].reshape(
+                blocks, self.coarse_factor).mean(axis=1)
+
+        prev_coarse = {}
+        next_coarse = {}
+        scores = np.full(len(pairs), -np.inf)
+        for idx, (p, n) in enumerate(pairs):
+            if deadline is not None and idx and time.monotonic() > deadline:
+                break
+            if p not in prev_coarse:
+                prev_coarse[p] = decimate(prev_song, prev_bt, p)
+            if n not in next_coarse:
+                next_coarse[n] = decimate(next_song, next_bt, n)
+            scores[idx] = self.beat_similarity(prev_coarse[p], next_coarse[n])
+        return scores
 
     def fade_frames(self, prev_song, prev_mid_sample, next_song,
                     next_mid_sample):
@@ -277,9 +1011,6 @@ class InfJukeboxTransitioner(Transitioner):
         next_seg = np.array(next_song.time_series[
             next_mid_sample - sample_offset:next_mid_sample + sample_offset])
 
-        final_seg = np.array([])
-        delta = 1 / len(prev_seg)
-
         if len(prev_seg) != len(next_seg):
             l.critical("Segments are not of the same length during fading." +
                        " (%d and %d)" + "Next starts at %d and ends at %d",
@@ -287,15 +1018,7 @@ class InfJukeboxTransitioner(Transitioner):
                        len(next_seg), next_mid_sample - sample_offset,
                        next_mid_sample + sample_offset)
 
-        for p in range(0, len(prev_seg), self.fade_steps):
-            end = min(p + self.fade_steps, len(prev_seg))
-            final_seg = np.append(final_seg, prev_seg[p:end] * (1 - delta * (
-                (end + p) / 2)))
-
-        for n in range(0, len(next_seg), self.fade_steps):
-            end = min(n + self.fade_steps, len(next_seg))
-            final_seg[n:end] += next_seg[n:end] * (delta * ((end + n) / 2))
-
+        final_seg = kernels.fade(prev_seg, next_seg, self.fade_steps)
         return (final_seg, prev_mid_sample - sample_offset,
                 next_mid_sample + sample_offset)
 
@@ -303,25 +1026,489 @@ class InfJukeboxTransitioner(Transitioner):
         """Write the given sample to the output stream.
 
         Write a given sample to the output stream. This is defined by the set
-        output folder when intializing the InfJukeboxTransitioner instance. As
-        a side-effect, a WAV file will be written in addition to the MP3 file.
+        output folder when intializing the InfJukeboxTransitioner instance. The
+        part is encoded with the codec selected by ``output_format``.
+        If ``async_encode`` was set the sample is only queued for encoding,
+        use :func:`wait_for_output` to check if it is written.
 
-        :param numpy.array sample: The created part / sample to write.
+        :param sample: The created part / sample to write. When the part is
+                       streamed its regions are given to the encoder without
+                       copying them first.
+        :type sample: Part or numpy.array
         :returns: Nothing of value
         :rtype: None
         """
-        l.info("Writing part %d to %s.", self.part_no, self.output_folder)
-        with tempfile.NamedTemporaryFile() as wavfile:
-            mp3file = os.path.join(self.output_folder,
-                                   "part{}.mp3".format(self.part_no))
-            l.debug("Using %s as wavfile and %s as mp3 file", wavfile.name,
-                    mp3file)
+        part_no = self.part_no
+        self.part_no += 1
 
-            librosa.output.write_wav(
-                wavfile.name, sample, sr=22050, norm=False)
-            wavfile.flush()
-            pydub.AudioSegment.from_wav(wavfile.name).export(
-                mp3file, format='mp3')
+        if self.encode_queue is None:
+            self._write_part(sample, part_no)
+        else:
+            l.debug("Queueing part %d for encoding.", part_no)
+            self.encode_queue.put(self._write_part, sample, part_no)
 
-        l.debug("Wrote mp3 file.")
-        self.part_no += 1
+    def wait_for_output(self, timeout=None):
+        """Wait till all samples given to :func:`write_sample` are written.
+
+        :param timeout: The maximum amount of seconds to wait, ``None`` means
+                        waiting until everything is written.
+        :type timeout: float or None
+        :returns: If all samples are written to the output folder.
+        :rtype: bool
+        """
+        if self.encode_queue is None:
+            return True
+        return self.encode_queue.join(timeout)
+
+    def _write_part(self, sample, part_no):
+        """Encode the given sample and write it as part ``part_no``.
+
+        If the part is in the part cache it is copied instead.
+
+        :param sample: The sample to write.
+        :type sample: Part or numpy.array
+        :param int part_no: The number of the part to write.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        l.info("Writing part %d to %s.", part_no, self.output_folder)
+        codecs = [self.codec] + self.renditions
+        part_files = [
+            os.path.join(self.output_folder, "part{}.{}".format(
+                part_no, self.codec.extension))
+        ] + [
+            os.path.join(self.output_folder, "part{}_{}k.{}".format(
+                part_no, codec.bitrate, codec.extension))
+            for codec in self.renditions
+        ]
+
+        keys = None
+        if self.part_cache is not None and getattr(sample, 'key', None):
+            keys = [
+                list(sample.key) + [
+                    self.segment_size, self.fade_time, self.fade_steps,
+                    self.passthrough is not None, codec.name, codec.bitrate,
+                    codec.complexity
+                ] for codec in codecs
+            ]
+        if keys is not None and all(
+                self.part_cache.get(key, part_file)
+                for key, part_file in zip(keys, part_files)):
+            l.debug("Copied %d cached %s files.", len(part_files),
+                    self.codec.name)
+        else:
+            self._encode_files(sample, codecs, part_files)
+            l.debug("Wrote %d %s files.", len(part_files), self.codec.name)
+            for key, part_file in zip(keys or [], part_files):
+                self.part_cache.put(key, part_file)
+
+        if self.renditions:
+            manifest_file = os.path.join(self.output_folder,
+                                         "part{}.json".format(part_no))
+            with open(manifest_file, 'w') as f:
+                json.dump({
+                    'part': part_no,
+                    'renditions': [{
+                        'bitrate': codec.bitrate,
+                        'file': os.path.basename(codec_file),
+                    } for codec, codec_file in zip(codecs, part_files)],
+                }, f)
+            part_files = part_files + [manifest_file]
+        self._retain_part(part_no, part_files)
+
+    def _encode_files(self, sample, codecs, part_files):
+        """Encode the given sample with every codec.
+
+        :param sample: The sample to encode.
+        :type sample: Part or numpy.array
+        :param list(dj_feet.codecs.Codec) codecs: The codecs to encode with,
+                                                  the first codec is the
+                                                  normal ``codec``.
+        :param list(str) part_files: The file to write for every codec.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        frames = None
+        if self.passthrough is not None and isinstance(sample, Part):
+            frames = self._passthrough_part(sample)
+        if frames is not None:
+            with open(part_files[0], 'wb') as f:
+                f.write(frames)
+            l.debug("Passed the frames of the part through.")
+            codecs, part_files = codecs[1:], part_files[1:]
+        if not codecs:
+            return
+
+        if len(codecs) == 1:
+            self._encode_part(codecs[0], sample, part_files[0])
+            return
+        if self._rendition_pool is None:
+            self._rendition_pool = ThreadPoolExecutor(
+                len(self.renditions) + 1)
+        # The encoders are separate processes, so threads are enough to run
+        # them in parallel.
+        futures = [
+            self._rendition_pool.submit(self._encode_part, codec, sample,
+                                        codec_file)
+            for codec, codec_file in zip(codecs, part_files)
+        ]
+        for future in futures:
+            future.result()
+
+    def _encode_part(self, codec, sample, part_file):
+        """Encode the given sample with the given codec.
+
+        :param dj_feet.codecs.Codec codec: The codec to encode with.
+        :param sample: The sample to encode, the regions of a :class:`Part`
+                       are written to the encoder without copying them.
+        :type sample: Part or numpy.array
+        :param str part_file: The file to write the encoded sample to.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        if self.stream_parts:
+            self._stream_part(codec, sample, part_file)
+        else:
+            codec.encode(sample, 22050, part_file)
+
+    def _passthrough_part(self, part):
+        """Create the MP3 data of a part using the passthrough streams.
+
+        The frames of the unchanged regions are copied from the streams, the
+        other regions and the samples between them and the frame boundaries
+        are encoded. The start and end of the part are moved to the nearest
+        frame boundary.
+
+        :param Part part: The part to create, its first and last region should
+                          be unchanged pieces of songs.
+        :returns: The MP3 data or ``None`` if the part cannot be passed
+                  through, in which case it should be encoded normally.
+        :rtype: bytes or None
+        """
+        regions = part.regions
+        if not regions or regions[0].source is None or \
+           regions[-1].source is None:
+            return None
+
+        pieces = []
+        fresh = []
+        frame = lead = None
+        for i, region in enumerate(regions):
+            if region.source is None or region.gain is not None:
+                fresh.append(np.asarray(region.samples if region.gain is None
+                                        else region.samples * region.gain))
+                continue
+            stream = self._frame_stream(region.source)
+            if stream is None or (frame is not None and
+                                  stream.samples_per_frame != frame):
+                return None
+            frame = stream.samples_per_frame
+            first = mp3.frame_index(region.start, frame,
+                                    round if i == 0 else math.ceil)
+            last = mp3.frame_index(region.start + len(region.samples), frame,
+                                   round if i == len(regions) - 1 else
+                                   math.floor)
+            if last <= first or last > len(stream):
+                return None
+            head = mp3.frame_start(first, frame) - region.start
+            if i > 0:
+                fresh.append(region.samples[:head])
+                # The last frame of the transition overlaps the frame after
+                # it, so the encoder needs the audio after the transition
+                # for its delay and whole frames more.
+                after = -(-mp3.ENCODER_DELAY // frame) + mp3.CONTEXT_FRAMES
+                tail = region.samples[head:head + after * frame]
+                encoded = self._encode_frames(lead, np.concatenate(fresh),
+                                              tail, frame)
+                if encoded is None:
+                    return None
+                pieces.append(encoded)
+            pieces.append(stream.cut(first, last))
+            end = mp3.frame_start(last, frame) - region.start
+            fresh = [region.samples[end:]]
+            lead = region.samples[:end]
+        return b''.join(pieces)
+
+    def _encode_frames(self, before, samples, after, frame):
+        """Encode samples so they fit between two passthrough frames.
+
+        :param numpy.array before: The samples before ``samples`` in the
+                                   part, ending at a frame boundary.
+        :param numpy.array samples: The samples to encode.
+        :param numpy.array after: The samples after ``samples`` in the part.
+        :param int frame: The amount of samples of a frame.
+        :returns: The encoded frames or ``None`` if ``samples`` is not a whole
+                  amount of frames.
+        :rtype: bytes or None
+        """
+        if len(samples) % frame:
+            l.warning("Cannot pass through a transition of %d samples.",
+                      len(samples))
+            return None
+        # Start with the end of ``before`` so the first frames, which contain
+        # the delay of the encoder, can be dropped. Whole frames of real
+        # audio are encoded before the first kept frame, so it joins the
+        # passthrough frame before it without a click.
+        skip = -(-mp3.ENCODER_DELAY // frame) + mp3.CONTEXT_FRAMES
+        lead = skip * frame - mp3.ENCODER_DELAY
+        before = before[max(len(before) - lead, 0):]
+        before = np.concatenate((np.zeros(lead - len(before)), before))
+        fd, tmp_file = tempfile.mkstemp(suffix='.mp3')
+        os.close(fd)
+        try:
+            self.passthrough.encode(
+                np.concatenate((before, samples, after)), 22050, tmp_file)
+            stream = mp3.FrameStream.from_file(tmp_file)
+        finally:
+            os.remove(tmp_file)
+        try:
+            return stream.cut(skip, skip + len(samples) // frame)
+        except IndexError:
+            return None
+
+    @property
+    def output_usage(self):
+        """The parts this transitioner currently stores in the output folder.
+
+        :returns: A dictionary with the amount of ``parts`` and ``bytes`` and
+                  the number of the oldest stored part as ``first_part``,
+                  which is ``None`` if no part is stored.
+        :rtype: dict
+        """
+        return dict(self._output_usage)
+
+    def release_parts(self, part_no):
+        """Allow the parts before ``part_no`` to be deleted.
+
+        Released parts are deleted after the next part is written, if there
+        are more than ``retention_parts`` parts.
+
+        :param int part_no: The number of the oldest part that is needed.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        # This is only a single assignment, the parts are deleted by the
+        # thread that writes them.
+        self._released_part = max(self._released_part, part_no)
+
+    def _retain_part(self, part_no, part_files):
+        """Register the written files of a part and delete expired parts.
+
+        :param int part_no: The number of the written part.
+        :param list(str) part_files: The files written for this part.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        self._part_files[part_no] = {
+            part_file: os.path.getsize(part_file)
+            for part_file in part_files if os.path.isfile(part_file)
+        }
+        usage = dict(self._output_usage)
+        usage['parts'] += 1
+        usage['bytes'] += sum(self._part_files[part_no].values())
+
+        while (self.retention_parts is not None and
+               len(self._part_files) > self.retention_parts and
+               next(iter(self._part_files)) < self._released_part):
+            old_no, old_files = self._part_files.popitem(last=False)
+            l.debug("Deleting expired part %d.", old_no)
+            for old_file in old_files:
+                try:
+                    os.remove(old_file)
+                except FileNotFoundError:
+                    l.warning("Expired part file %s was already removed.",
+                              old_file)
+            usage['parts'] -= 1
+            usage['bytes'] -= sum(old_files.values())
+        usage['first_part'] = next(iter(self._part_files))
+        # Replace the usage at once, so it is never read half updated.
+        self._output_usage = usage
+        l.debug("The output folder contains %(parts)d parts of %(bytes)d "
+                "bytes.", usage)
+
+    def _stream_part(self, codec, sample, part_file, sampling_rate=22050):
+        """Stream the given sample to the encoder in chunks of a second.
+
+        The sample consists of the rest of the current song, the fade and the
+        start of the next song, so they reach the encoder in this order. The
+        regions of a :class:`Part` are not copied before they are streamed.
+
+        :param dj_feet.codecs.Codec codec: The codec to encode with.
+        :param sample: The sample to write.
+        :type sample: Part or numpy.array
+        :param str part_file: The file to write the encoded sample to.
+        :param int sampling_rate: The sampling rate of the sample.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        if not isinstance(sample, Part):
+            sample = Part([(sample, None)])
+        stream = codec.open_stream(sampling_rate, part_file)
+        try:
+            for chunk in sample.chunks(sampling_rate):
+                stream.write(chunk)
+        finally:
+            stream.close()
+
+
+class StreamTransitioner(InfJukeboxTransitioner):
+    """A Transitioner that writes one continuous stream instead of parts.
+
+    The parts are created like the :class:`InfJukeboxTransitioner` does, but
+    they are all given to one running encoder that writes to a local UNIX
+    socket or named pipe. A listener receives the mix as soon as it is encoded
+    instead of after an entire part is written, see :mod:`dj_feet.sink`.
+    When the listener disconnects the stream is restarted for the next part,
+    parts created while nobody listens are dropped.
+    """
+
+    def __init__(self,
+                 output_folder,
+                 stream_location='/tmp/sdaas/stream.sock',
+                 segment_size=30,
+                 fade_time=6,
+                 fade_steps=1000,
+                 async_encode=False,
+                 output_format='mp3',
+                 bitrate=None,
+                 complexity=None,
+                 speculate_amount=0,
+                 cache_dir=None,
+                 max_full_comparisons=None,
+                 coarse_factor=32,
+                 search_budget=None):
+        """
+        :param str output_folder: The output folder, it is not used.
+        :param str stream_location: The UNIX socket or named pipe to write
+                                    the stream to. The listener should create
+                                    it before the first part is written.
+        :param int segment_size: The length (in seconds) of a part.
+        :param int fade_time: The total time in seconds a fade should last.
+        :param int fade_steps: The amount of samples to merge at the same time
+                               during the coarse fading.
+        :param bool async_encode: Write the parts to the stream on a
+                                  background thread.
+        :param str output_format: The format of the stream. This should be
+                                  ``mp3``, ``opus`` or ``flac``.
+        :param int bitrate: The bitrate in kbps to encode the stream with.
+        :param int complexity: The compression level of the encoder.
+        :param int speculate_amount: The amount of most likely next songs to
+                                     prepare a part for.
+        :param str cache_dir: The directory to cache the found transitions in.
+        :param int max_full_comparisons: The maximum amount of pairs of beats
+                                         to compare at full resolution.
+        :param int coarse_factor: The factor to decimate the beats with when
+                                  comparing them coarsely.
+        :param float search_budget: The maximum amount of seconds to spend
+                                    searching for similar beats during a
+                                    merge.
+        """
+        super(StreamTransitioner, self).__init__(
+            output_folder,
+            segment_size=segment_size,
+            fade_time=fade_time,
+            fade_steps=fade_steps,
+            async_encode=async_encode,
+            output_format=output_format,
+            bitrate=bitrate,
+            complexity=complexity,
+            speculate_amount=speculate_amount,
+            cache_dir=cache_dir,
+            max_full_comparisons=max_full_comparisons,
+            coarse_factor=coarse_factor,
+            search_budget=search_budget)
+        self.stream_location = stream_location
+        self._output = None
+        self._stream = None
+
+    def __getstate__(self):
+        state = super(StreamTransitioner, self).__getstate__()
+        state.update({'_output': None, '_stream': None})
+        return state
+
+    @staticmethod
+    def process_song_file(song_file):
+        """Nothing has to be done for a new song, the stream is not started
+        from cached openings.
+
+        :param str song_file: The path to the wav to be processed.
+        :rtype: None
+        """
+        return None
+
+    def _connect(self):
+        """Open the ``stream_location`` and start the encoder.
+
+        :raises OSError: If nobody is listening.
+        :returns: Nothing of value.
+        """
+        if stat.S_ISFIFO(os.stat(self.stream_location).st_mode):
+            # Opening a pipe for writing blocks until somebody reads it, so it
+            # is opened without blocking, which fails with ENXIO if nobody
+            # reads it yet.
+            try:
+                fd = os.open(self.stream_location,
+                             os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as exp:
+                if exp.errno == errno.ENXIO:
+                    raise OSError(errno.ENXIO, "Nobody reads the pipe",
+                                  self.stream_location)
+                raise
+            os.set_blocking(fd, True)
+            output = os.fdopen(fd, 'wb')
+        else:
+            output = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                output.connect(self.stream_location)
+            except OSError:
+                output.close()
+                raise
+        self._output = output
+        self._stream = self.codec.open_stream(22050, 'pipe:1', output)
+        l.info("Started streaming to %s.", self.stream_location)
+
+    def close(self):
+        """Finish the stream and close the connection to the listener.
+
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        stream, output = self._stream, self._output
+        self._stream = self._output = None
+        try:
+            if stream is not None:
+                stream.close()
+        finally:
+            if output is not None:
+                output.close()
+
+    def _write_part(self, sample, part_no):
+        """Write the given sample to the stream.
+
+        :param sample: The sample to write.
+        :type sample: Part or numpy.array
+        :param int part_no: The number of the part.
+        :returns: Nothing of value.
+        :rtype: None
+        """
+        if self._stream is None:
+            try:
+                self._connect()
+            except OSError as exp:
+                l.warning("Dropping part %d, nobody is listening on %s: %s",
+                          part_no, self.stream_location, exp)
+                return
+        if not isinstance(sample, Part):
+            sample = Part([(sample, None)])
+        try:
+            for chunk in sample.chunks(22050):
+                self._stream.write(chunk)
+        except CouldntEncodeError:
+            l.warning("The listener of %s disconnected during part %d.",
+                      self.stream_location, part_no)
+            try:
+                self.close()
+            except CouldntEncodeError:
+                pass
+            return
+        l.debug("Streamed part %d.", part_no)
@@ -5,6 +5,7 @@ controller.
 
 
 from tempfile import TemporaryDirectory
+from contextlib import contextmanager
 import os
 import multiprocessing as mp
 from flask import Flask, request, jsonify
@@ -16,6 +17,7 @@ import logging
 import traceback
 
 import dj_feet.pickers as pickers
+import dj_feet.transitioners as transitioners
 import dj_feet.core as core
 from .config import Config
 from .helpers import get_args
@@ -40,7 +42,7 @@ class MyFlask(Flask):
         self._worker = mp.Process(
             target=backend_worker,
             args=(self._queue, app.config['REMOTE'], app.config['ID'],
-                  app.config['OUTPUT_DIR']))
+                  app.config['OUTPUT_DIR'], app.config.get('CACHE_DIR')))
         self._worker.start()
 
     @property
@@ -82,8 +84,28 @@ START_LOOP = 3
 OPTIONS = 4
 
 
-def backend_worker(worker_queue, remote, app_id, output_dir):
-    with TemporaryDirectory() as cache_dir, TemporaryDirectory() as wav_dir:
+@contextmanager
+def cache_directory(cache_dir=None):
+    """Get the directory where the transitions and parts are cached.
+
+    :param cache_dir: The directory to use, it is created if it does not
+                      exist and it is never removed. If this is ``None`` a
+                      temporary directory is used that is removed when the
+                      context exits, so nothing is cached between runs.
+    :type cache_dir: str or None
+    :returns: A context manager that gives the path of the directory.
+    """
+    if cache_dir is None:
+        with TemporaryDirectory() as tmp_dir:
+            yield tmp_dir
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        yield cache_dir
+
+
+def backend_worker(worker_queue, remote, app_id, output_dir, cache_dir=None):
+    with cache_directory(cache_dir) as cache_dir, TemporaryDirectory(
+    ) as wav_dir:
         cfg = Config()
         cfg.FIXED_OPTIONS['cache_dir'] = cache_dir
         cfg.FIXED_OPTIONS['song_folder'] = wav_dir
@@ -107,17 +129,21 @@ def backend_worker(worker_queue, remote, app_id, output_dir):
                     wav_file_location = os.path.join(wav_dir,
                                                      (filename + '.wav'))
                     song.export(wav_file_location, format='wav')
-                    picker = cfg.get_class(pickers.Picker, None)
-                    kwargs = {}
-                    kwargs.update(cfg.user_config['Picker'][picker.__name__])
-                    kwargs.update(cfg.FIXED_OPTIONS)
-                    kwargs = {
-                        key: val
-                        for key, val in kwargs.items()
-                        if key in get_args(picker.process_song_file)
-                    }
-                    kwargs.update({'song_file': wav_file_location})
-                    picker.process_song_file(**kwargs)
+                    for basecls in [
+                            pickers.Picker, transitioners.Transitioner
+                    ]:
+                        cls = cfg.get_class(basecls, None)
+                        kwargs = {}
+                        kwargs.update(
+                            cfg.user_config[basecls.__name__][cls.__name__])
+                        kwargs.update(cfg.FIXED_OPTIONS)
+                        kwargs = {
+                            key: val
+                            for key, val in kwargs.items()
+                            if key in get_args(cls.process_song_file)
+                        }
+                        kwargs.update({'song_file': wav_file_location})
+                        cls.process_song_file(**kwargs)
                     requests.post(
                         remote + '/music_processed/', json={'id': file_id})
 
@@ -246,12 +272,13 @@ def im_alive():
         })
 
 
-def start(id_string, input_dir, output_dir, remote_addr):
+def start(id_string, input_dir, output_dir, remote_addr, cache_dir=None):
     app.config.update({
         'ID': int(id_string),
         'INPUT_DIR': input_dir,
         'OUTPUT_DIR': output_dir,
         'REMOTE': remote_addr,
+        'CACHE_DIR': cache_dir,
     })
     app.reset()
     app.setup()
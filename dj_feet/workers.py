@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""This module contains the background workers used by DJFeet."""
+
+import queue
+import threading
+import traceback
+import logging
+
+l = logging.getLogger(__name__)
+
+
+class TaskQueue:
+    """A queue of tasks that are executed in order by a single worker thread.
+
+    Tasks are executed in the same order as they were put on the queue. The
+    queue keeps track of the amount of finished tasks so the caller can check
+    or wait till everything it submitted has been done. If a task raises an
+    exception this exception is raised again on the next call to :func:`put`
+    or :func:`join`.
+    """
+
+    def __init__(self, name=None):
+        """
+        :param name: The name of the worker thread, used for logging.
+        :type name: str or None
+        """
+        self._tasks = queue.Queue()
+        self._condition = threading.Condition()
+        self._submitted = 0
+        self._done = 0
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._work, name=name, daemon=True)
+        self._thread.start()
+
+    def _work(self):
+        while True:
+            func, args = self._tasks.get()
+            if func is None:
+                return
+            try:
+                func(*args)
+            except Exception as exp:
+                l.error("Task failed: %s", traceback.format_exc())
+                with self._condition:
+                    if self._error is None:
+                        self._error = exp
+            finally:
+                with self._condition:
+                    self._done += 1
+                    self._condition.notify_all()
+
+    def _raise_error(self):
+        with self._condition:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    @property
+    def pending(self):
+        """The amount of tasks that are submitted but not yet finished.
+
+        :rtype: int
+        """
+        with self._condition:
+            return self._submitted - self._done
+
+    def put(self, func, *args):
+        """Add a task to the queue.
+
+        :param callable func: The function to call on the worker thread.
+        :param args: The arguments to call ``func`` with.
+        :raises Exception: If a previous task raised an exception.
+        :returns: Nothing of value.
+        """
+        self._raise_error()
+        with self._condition:
+            self._submitted += 1
+        self._tasks.put((func, args))
+
+    def join(self, timeout=None):
+        """Wait till all submitted tasks are finished.
+
+        :param timeout: The maximum amount of seconds to wait, ``None`` means
+                        waiting until all tasks are done.
+        :type timeout: float or None
+        :raises Exception: If a task raised an exception.
+        :returns: If all submitted tasks are finished.
+        :rtype: bool
+        """
+        with self._condition:
+            done = self._condition.wait_for(
+                lambda: self._done == self._submitted, timeout)
+        self._raise_error()
+        return done
+
+    def close(self):
+        """Finish all submitted tasks and stop the worker thread.
+
+        :returns: Nothing of value.
+        """
+        self._tasks.put((None, ()))
+        self._thread.join()
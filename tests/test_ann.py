@@ -0,0 +1,81 @@
+import pytest
+import os
+import sys
+import numpy
+
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../')
+
+import dj_feet.ann as ann
+
+
+@pytest.fixture
+def points():
+    rng = numpy.random.RandomState(0)
+    centers = rng.normal(size=(20, 16)) * 5
+    yield centers[rng.randint(20, size=2000)] + rng.normal(size=(2000, 16))
+
+
+def brute_force(points, point, amount, allowed=None):
+    distances = numpy.linalg.norm(points - point, axis=1)
+    if allowed is not None:
+        distances[~allowed] = numpy.inf
+    return numpy.argsort(distances)[:amount]
+
+
+@pytest.mark.parametrize('kwargs,search_amount', [
+    ({}, None),
+    ({'tree_amount': 1}, 100),
+    ({'leaf_size': 1}, None),
+    ({'tree_amount': 4, 'leaf_size': 100}, 200),
+])
+def test_forest_query(points, kwargs, search_amount):
+    forest = ann.RandomProjectionForest(points, **kwargs)
+    assert len(forest) == len(points)
+
+    recalls = []
+    for point in points[:50]:
+        found = forest.query(point, 10, search_amount=search_amount)
+        assert len(found) == len(set(found)) == 10
+        distances = numpy.linalg.norm(points[found] - point, axis=1)
+        assert (numpy.diff(distances) >= 0).all()
+        recalls.append(
+            len(set(found) & set(brute_force(points, point, 10))) / 10)
+    assert numpy.mean(recalls) > 0.8
+
+
+def test_forest_query_allowed(points):
+    forest = ann.RandomProjectionForest(points)
+    allowed = numpy.zeros(len(points), dtype=bool)
+    allowed[::3] = True
+    recalls = []
+    for point in points[:20]:
+        found = forest.query(point, 10, allowed)
+        assert allowed[found].all()
+        recalls.append(len(
+            set(found) & set(brute_force(points, point, 10, allowed))) / 10)
+    assert numpy.mean(recalls) > 0.8
+
+    allowed[:] = False
+    allowed[[5, 7]] = True
+    assert sorted(forest.query(points[0], 10, allowed)) == [5, 7]
+    assert sorted(forest.query(points[0], 10, allowed, 1)) in ([5], [7])
+
+
+def test_forest_exact_search(points):
+    forest = ann.RandomProjectionForest(points[:100], tree_amount=2)
+    found = forest.query(points[0], 100, search_amount=100)
+    assert sorted(found) == list(range(100))
+    assert list(found[:5]) == list(brute_force(points[:100], points[0], 5))
+
+
+def test_forest_same_points():
+    forest = ann.RandomProjectionForest(numpy.ones((100, 3)), leaf_size=4)
+    assert sorted(forest.query(numpy.ones(3), 100, search_amount=100)) == \
+        list(range(100))
+
+
+@pytest.mark.parametrize('kwargs', [{'tree_amount': 0}, {'leaf_size': 0}])
+def test_forest_broken_config(points, kwargs):
+    with pytest.raises(ValueError):
+        ann.RandomProjectionForest(points, **kwargs)
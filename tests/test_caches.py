@@ -0,0 +1,123 @@
+import pytest
+import os
+import sys
+import pickle
+
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../')
+
+import dj_feet.caches as caches
+
+
+@pytest.fixture
+def cache_file(tmpdir):
+    yield str(tmpdir.join('transitions.json'))
+
+
+def test_transition_cache(cache_file):
+    cache = caches.TransitionCache(cache_file)
+    key = ('prev.wav', 0, 100, 'next.wav', 30, 6)
+    assert cache.get(key) is None
+    assert len(cache) == 0
+
+    cache.put(key, (1, 2, 0.5))
+    assert cache.get(key) == [1, 2, 0.5]
+    assert cache.get(('prev.wav', 0, 100, 'next.wav', 30, 5)) is None
+    assert os.path.isfile(cache_file)
+    assert os.listdir(os.path.dirname(cache_file)) == ['transitions.json']
+
+    copy = caches.TransitionCache(cache_file)
+    assert copy.get(key) == [1, 2, 0.5]
+    assert len(copy) == 1
+
+
+def test_broken_transition_cache(cache_file):
+    with open(cache_file, 'w') as f:
+        f.write('{broken')
+    cache = caches.TransitionCache(cache_file)
+    assert len(cache) == 0
+    cache.put(('a', ), (0, 0, 0))
+    assert caches.TransitionCache(cache_file).get(('a', )) == [0, 0, 0]
+
+
+def test_pickle_transition_cache(cache_file):
+    cache = caches.TransitionCache(cache_file)
+    cache.put(('a', ), (1, 2, 3))
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.get(('a', )) == [1, 2, 3]
+    copy.put(('b', ), (0, 0, 0))
+    assert cache.get(('b', )) is None
+
+
+def test_detached_transition_cache(cache_file):
+    cache = caches.TransitionCache(cache_file)
+    cache.put(('a', ), (1, 2, 3))
+    copy = pickle.loads(pickle.dumps(cache))
+    copy.detach()
+    copy.put(('b', ), (0, 0, 0))
+    assert copy.get(('b', )) == [0, 0, 0]
+    assert copy.added == [(('b', ), [0, 0, 0])]
+    # The copy does not overwrite the file of the cache it was copied from.
+    cache.put(('c', ), (4, 5, 6))
+    assert caches.TransitionCache(cache_file).get(('c', )) == [4, 5, 6]
+
+    cache.update(copy.added)
+    loaded = caches.TransitionCache(cache_file)
+    assert len(loaded) == 3
+    assert loaded.get(('b', )) == [0, 0, 0]
+
+
+@pytest.fixture
+def part_cache(tmpdir):
+    yield caches.PartCache(str(tmpdir.join('parts')), 25)
+
+
+def write_part(tmpdir, name, content):
+    part_file = str(tmpdir.join(name))
+    with open(part_file, 'w') as f:
+        f.write(content)
+    return part_file
+
+
+def read_part(part_file):
+    with open(part_file) as f:
+        return f.read()
+
+
+def test_part_cache(part_cache, tmpdir):
+    output = str(tmpdir.join('part1.mp3'))
+    assert not part_cache.get(('a', 0, 'b'), output)
+    assert not os.path.exists(output)
+
+    part_cache.put(('a', 0, 'b'), write_part(tmpdir, 'part0.mp3', 'part a'))
+    assert part_cache.size == 6
+    assert part_cache.get(('a', 0, 'b'), output)
+    assert read_part(output) == 'part a'
+    assert not part_cache.get(('a', 1, 'b'), output)
+
+    # Existing files are replaced.
+    part_cache.put(('c', ), write_part(tmpdir, 'part2.mp3', 'part c'))
+    assert part_cache.get(('c', ), output)
+    assert read_part(output) == 'part c'
+
+    copy = caches.PartCache(part_cache.cache_folder, 25)
+    assert copy.size == 12
+    assert copy.get(('a', 0, 'b'), output)
+
+
+def test_part_cache_eviction(part_cache, tmpdir):
+    for i in range(3):
+        part_cache.put((i, ), write_part(tmpdir, 'part.mp3', '0123456789'))
+        # Use the first part so the second one is least recently used.
+        assert part_cache.get((0, ), str(tmpdir.join('used{}.mp3'.format(i))))
+        os.utime(part_cache._cached_file((i, )), (i - 10, i - 10))
+    assert part_cache.size == 20
+    assert part_cache.get((0, ), str(tmpdir.join('output.mp3')))
+    assert not part_cache.get((1, ), str(tmpdir.join('output.mp3')))
+    assert part_cache.get((2, ), str(tmpdir.join('output.mp3')))
+
+
+def test_pickle_part_cache(part_cache, tmpdir):
+    copy = pickle.loads(pickle.dumps(part_cache))
+    copy.put(('a', ), write_part(tmpdir, 'part.mp3', 'a'))
+    assert part_cache.get(('a', ), str(tmpdir.join('output.mp3')))
@@ -0,0 +1,164 @@
+import pytest
+import os
+import sys
+import librosa
+import numpy
+import pydub
+import shutil
+import scipy.io.wavfile
+from pydub.exceptions import CouldntEncodeError
+from helpers import MockingFunction
+
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../')
+
+import dj_feet.codecs as codecs
+from dj_feet.part import Part
+
+
+@pytest.fixture
+def mocked_export(monkeypatch):
+    mocking_export = MockingFunction()
+
+    class MyAudioSegment:
+        def __init__(self, wav):
+            assert wav.startswith('/tmp/')
+
+        def export(self, *args, **kwargs):
+            mocking_export(*args, **kwargs)
+
+    mocking_librosa = MockingFunction()
+    monkeypatch.setattr(librosa.output, 'write_wav', mocking_librosa)
+    monkeypatch.setattr(pydub.AudioSegment, 'from_wav', MyAudioSegment)
+    yield mocking_librosa, mocking_export
+
+
+@pytest.mark.parametrize('name', ['wav', 'flac', 'opus', 'mp3'])
+def test_get_codec(name):
+    codec = codecs.get_codec(name, bitrate=64, complexity=3)
+    assert isinstance(codec, codecs.Codec)
+    assert codec.name == name
+    assert codec.extension
+    assert codec.bitrate == 64
+    assert codec.complexity == 3
+
+
+def test_get_unknown_codec():
+    with pytest.raises(ValueError):
+        codecs.get_codec('wma')
+
+
+@pytest.mark.parametrize('name', ['flac', 'opus', 'mp3'])
+@pytest.mark.parametrize('bitrate,complexity', [(None, None), (96, 5)])
+def test_encode(mocked_export, name, bitrate, complexity):
+    mocking_librosa, mocking_export = mocked_export
+    codec = codecs.get_codec(name, bitrate, complexity)
+    sample = numpy.zeros(100)
+
+    codec.encode(sample, 22050, '/output/part0.' + codec.extension)
+
+    assert len(mocking_librosa.args) == 1
+    assert mocking_librosa.args[0][0][1] is sample
+    assert mocking_librosa.args[0][1]['sr'] == 22050
+
+    assert len(mocking_export.args) == 1
+    args, kwargs = mocking_export.args[0]
+    assert args == ('/output/part0.' + codec.extension, )
+    assert kwargs['format'] == name
+    if bitrate is None:
+        assert 'bitrate' not in kwargs
+    else:
+        assert kwargs['bitrate'] == '96k'
+    parameters = kwargs.get('parameters', [])
+    assert ('-compression_level' in parameters) == (complexity is not None)
+
+
+def test_encode_wav(mocked_export):
+    mocking_librosa, mocking_export = mocked_export
+    sample = numpy.zeros(100)
+    codecs.WavCodec().encode(sample, 22050, '/output/part0.wav')
+
+    assert not mocking_export.called
+    assert mocking_librosa.args[0][0] == ('/output/part0.wav', sample)
+
+
+@pytest.mark.parametrize('name', ['wav', 'flac', 'opus', 'mp3'])
+def test_stream_arguments(name):
+    codec = codecs.get_codec(name, bitrate=64)
+    args = codec.stream_arguments(22050, '/output/part0.' + codec.extension)
+    assert args[0] == pydub.AudioSegment.converter
+    assert args[args.index('-i') + 1] == 'pipe:0'
+    assert args[args.index('-ar') + 1] == '22050'
+    assert args[args.index('-b:a') + 1] == '64k'
+    assert args[-3:] == [
+        '-f', codec.format, '/output/part0.' + codec.extension
+    ]
+
+
+@pytest.mark.skipif(
+    shutil.which(pydub.AudioSegment.converter) is None,
+    reason="ffmpeg is needed to stream")
+@pytest.mark.parametrize('name', ['wav', 'flac', 'mp3'])
+def test_open_stream(tmpdir, name):
+    codec = codecs.get_codec(name)
+    part_file = str(tmpdir.join('part0.' + codec.extension))
+    stream = codec.open_stream(22050, part_file)
+    for _ in range(3):
+        stream.write(numpy.random.uniform(-0.5, 0.5, 22050))
+    stream.close()
+    assert os.path.getsize(part_file) > 0
+    # Closing twice should do nothing.
+    stream.close()
+
+
+@pytest.mark.skipif(
+    shutil.which(pydub.AudioSegment.converter) is None,
+    reason="ffmpeg is needed to stream")
+def test_broken_stream(tmpdir):
+    codec = codecs.get_codec('mp3')
+    stream = codec.open_stream(22050, str(tmpdir.join('missing', 'a.mp3')))
+    with pytest.raises(CouldntEncodeError):
+        for _ in range(100):
+            stream.write(numpy.zeros(22050))
+        stream.close()
+
+
+@pytest.mark.skipif(
+    shutil.which(pydub.AudioSegment.converter) is None,
+    reason="ffmpeg is needed to stream")
+def test_open_stream_output(tmpdir):
+    codec = codecs.get_codec('mp3')
+    output_file = str(tmpdir.join('stream.mp3'))
+    with open(output_file, 'wb') as output:
+        stream = codec.open_stream(22050, 'pipe:1', output)
+        assert '-flush_packets' in stream.args
+        stream.write(numpy.random.uniform(-0.5, 0.5, 22050))
+        stream.close()
+    assert os.path.getsize(output_file) > 0
+
+
+@pytest.mark.skipif(
+    shutil.which(pydub.AudioSegment.converter) is None,
+    reason="ffmpeg is needed to stream")
+@pytest.mark.parametrize('name', ['wav', 'mp3'])
+def test_encode_part(tmpdir, monkeypatch, name):
+    monkeypatch.setattr(pydub.AudioSegment, 'from_wav', None)
+    codec = codecs.get_codec(name)
+    time_series = numpy.random.uniform(-0.5, 0.5, 22050 * 2).astype('f4')
+    part = Part([(time_series[:22050 + 10], None), (numpy.ones(20), 0.5),
+                 (time_series[100:200], None)])
+    part_file = str(tmpdir.join('part0.' + codec.extension))
+
+    codec.encode(part, 22050, part_file)
+    assert os.listdir(str(tmpdir)) == ['part0.' + codec.extension]
+    if name == 'wav':
+        sampling_rate, samples = scipy.io.wavfile.read(part_file)
+        assert sampling_rate == 22050
+        assert numpy.array_equal(samples, part.render().astype('f4'))
+    else:
+        assert os.path.getsize(part_file) > 0
+
+    # A part that could not be encoded leaves no files behind.
+    with pytest.raises(CouldntEncodeError):
+        codec.encode(part, 22050, str(tmpdir.join('missing', 'part1.mp3')))
+    assert os.listdir(str(tmpdir)) == ['part0.' + codec.extension]
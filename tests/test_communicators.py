@@ -2,6 +2,7 @@ import pytest
 import os
 import sys
 import requests
+import threading
 from collections import namedtuple
 import random
 from helpers import MockingFunction
@@ -108,3 +109,79 @@ def test_protocol_communicator_iteration(protocol_communicator, monkeypatch,
             'filename_mixed': filename,
         }
     })]
+
+
+def test_protocol_communicator_keep_alive(monkeypatch):
+    class MyResponse:
+        def json(self):
+            return {'feedback': {'a': 1}}
+
+    mocked_post_request = MockingFunction(MyResponse, simple=True)
+    monkeypatch.setattr(requests.Session, 'post',
+                        lambda self, *args, **kwargs:
+                        mocked_post_request(*args, **kwargs))
+    monkeypatch.setattr(requests, 'post', None)
+
+    communicator = communicators.ProtocolCommunicator(keep_alive=True)
+    assert communicator.get_user_feedback('remote', 1, 0, 10) == {'a': 1}
+    assert mocked_post_request.args[0][0] == ('remote/get_feedback/', )
+
+
+@pytest.mark.parametrize('async_feedback', [True, False])
+def test_protocol_communicator_request_feedback(monkeypatch, async_feedback):
+    class MyResponse:
+        def json(self):
+            return {'feedback': {'a': 1}}
+
+    requested = threading.Event()
+
+    def post(*args, **kwargs):
+        requested.set()
+        return MyResponse()
+
+    monkeypatch.setattr(requests, 'post', post)
+    communicator = communicators.ProtocolCommunicator(
+        async_feedback=async_feedback)
+    get_feedback = communicator.request_user_feedback('remote', 1, 0, 10)
+    # The feedback is only requested in the background if async_feedback is
+    # set, otherwise it is requested when it is needed.
+    assert requested.wait(timeout=5 if async_feedback else 0.1) == \
+        async_feedback
+    assert get_feedback() == {'a': 1}
+    assert requested.is_set()
+
+    def fail(*args, **kwargs):
+        raise requests.ConnectionError()
+
+    monkeypatch.setattr(requests, 'post', fail)
+    get_feedback = communicator.request_user_feedback('remote', 1, 0, 10)
+    with pytest.raises(requests.ConnectionError):
+        get_feedback()
+
+
+def test_protocol_communicator_async_iteration(monkeypatch):
+    MySong = namedtuple('my_song', 'file_location')
+    mocked_post_request = MockingFunction()
+    monkeypatch.setattr(requests, 'post', mocked_post_request)
+
+    communicator = communicators.ProtocolCommunicator(async_iteration=True)
+    for i in range(5):
+        communicator.iteration('remote', 1, MySong('/songs/{}.wav'.format(i)))
+    assert communicator.flush(timeout=5)
+    mixed = [args[1]['json']['filename_mixed']
+             for args in mocked_post_request.args]
+    assert mixed == [str(i) for i in range(5)]
+
+
+def test_protocol_communicator_async_error(monkeypatch):
+    MySong = namedtuple('my_song', 'file_location')
+
+    def fail(*args, **kwargs):
+        raise requests.ConnectionError()
+
+    monkeypatch.setattr(requests, 'post', fail)
+    communicator = communicators.ProtocolCommunicator(async_iteration=True)
+    communicator.iteration('remote', 1, MySong('/songs/a.wav'))
+    with pytest.raises(requests.ConnectionError):
+        communicator.flush()
+    assert communicators.SimpleCommunicator().flush()
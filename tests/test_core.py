@@ -12,6 +12,7 @@ my_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, my_path + '/../')
 
 import dj_feet.core as core
+from dj_feet.song import Song
 
 MySong = namedtuple("MySong", 'val, file_location')
 
@@ -52,6 +53,10 @@ def mock_picker():
             self.emitted.append(to_emit)
             return to_emit
 
+        def pick_first_song(self, song_files):
+            self.emitted.append(song_files[0])
+            return song_files[0]
+
     yield MockPicker()
 
 
@@ -104,6 +109,18 @@ def mock_exception_transitioner():
         def write_sample(self, sample):
             assert sample == self.out
 
+        def wait_for_output(self, timeout=None):
+            return True
+
+        def speculate(self, prev, picker):
+            pass
+
+        def fast_start(self, picker):
+            return None
+
+        def release_parts(self, part_no):
+            pass
+
     yield MockTransitioner()
 
 
@@ -115,6 +132,8 @@ def mock_transitioner():
             self.write_args = []
             self.merge_emitted = []
             self.merge_times = []
+            self.speculate_args = []
+            self.released = []
             self.first = True
             self.max_size = 100
 
@@ -133,6 +152,18 @@ def mock_transitioner():
         def write_sample(self, sample):
             self.write_args.append(sample)
 
+        def wait_for_output(self, timeout=None):
+            return True
+
+        def speculate(self, prev, picker):
+            self.speculate_args.append((prev, picker))
+
+        def fast_start(self, picker):
+            return None
+
+        def release_parts(self, part_no):
+            self.released.append(part_no)
+
     yield MockTransitioner()
 
 
@@ -159,6 +190,10 @@ def mock_communicator():
                 assert self.controller_id == controller_id
                 assert self.remote == remote
 
+        def request_user_feedback(self, remote, controller_id, start, end):
+            return lambda: self.get_user_feedback(remote, controller_id,
+                                                  start, end)
+
         def iteration(self, remote, controller_id, file_mixed):
             self.files.append(file_mixed)
             if self.called_amount == 0:
@@ -168,6 +203,10 @@ def mock_communicator():
                 assert self.controller_id == controller_id
                 assert self.remote == remote
 
+        def flush(self, timeout=None):
+            self.flushed = True
+            return True
+
     yield MockCommunicator()
 
 
@@ -204,6 +243,9 @@ def test_loop(monkeypatch, mock_controller, mock_picker, mock_transitioner,
     assert mock_controller.amount + 1 == mock_controller.called_amount
 
     assert mock_transitioner.merge_emitted == mock_transitioner.write_args
+    assert mock_transitioner.speculate_args == [
+        (song, mock_picker) for song in mock_picker.emitted
+    ]
 
     if mock_controller.amount >= 5:
         assert mock_controller.amount == mock_communicator.called_amount + 4
@@ -211,6 +253,7 @@ def test_loop(monkeypatch, mock_controller, mock_picker, mock_transitioner,
         len(mock_picker.feedback) - 4, 0)
     assert mock_communicator.emitted == mock_picker.feedback[4:]
     assert mock_communicator.files == mock_picker.emitted
+    assert mock_communicator.flushed
 
     assert (not mock_picker.feedback) or mock_picker.feedback[0] == {}
 
@@ -234,3 +277,112 @@ def test_loop(monkeypatch, mock_controller, mock_picker, mock_transitioner,
             assert mock_picker.emitted[i - 1] == prev
         assert mock_picker.emitted[i] == new
         i += 1
+
+
+def test_loop_postponed_iteration(monkeypatch, mock_picker, mock_transitioner,
+                                  mock_communicator, patched_post):
+    class MockController:
+        def __init__(self):
+            self.called_amount = 0
+
+        def should_continue(self):
+            self.called_amount += 1
+            return self.called_amount <= 6
+
+        def get_waittime(self, epoch, segment_size):
+            return 1
+
+    written = []
+    mock_sleep = MockingFunction(lambda: None, simple=True)
+    monkeypatch.setattr(time, 'sleep', mock_sleep)
+
+    def wait_for_output(timeout=None):
+        # Every third part is not yet written after sleeping.
+        written.append(timeout)
+        return timeout is None or len(written) % 3 != 0
+
+    mock_transitioner.wait_for_output = wait_for_output
+    core.loop(0, 'localhost', MockController(), mock_picker,
+              mock_transitioner, mock_communicator)
+
+    assert None in written
+    assert mock_communicator.files == mock_picker.emitted
+    assert len(mock_communicator.files) == 6
+
+
+@pytest.mark.parametrize('speed,released', [(50, [0, 1, 1, 2, 2, 3]),
+                                            (250, [0, 2, 2, 4, 4, 6])])
+def test_loop_release_parts(monkeypatch, mock_picker, mock_transitioner,
+                            mock_communicator, patched_post, speed, released):
+    clock = [0]
+
+    class MockController:
+        def __init__(self):
+            self.called_amount = 0
+
+        def should_continue(self):
+            self.called_amount += 1
+            return self.called_amount <= 6
+
+        def get_waittime(self, epoch, segment_size):
+            # The parts are played ``speed`` percent of real time.
+            clock[0] += speed
+            return 1
+
+    monkeypatch.setattr(time, 'sleep', MockingFunction())
+    monkeypatch.setattr(time, 'time', lambda: clock[0])
+    written = []
+
+    def wait_for_output(timeout=None):
+        # Every second part is not yet written after sleeping.
+        written.append(timeout)
+        return timeout is None or len(written) % 2 != 0
+
+    mock_transitioner.wait_for_output = wait_for_output
+    core.loop(0, 'localhost', MockController(), mock_picker,
+              mock_transitioner, mock_communicator)
+
+    # Parts that are not announced or not played are never released, the
+    # segment size is 100.
+    assert mock_transitioner.released == released
+
+
+def test_loop_fast_start(monkeypatch, mock_picker, mock_transitioner,
+                         mock_communicator, patched_post):
+    class MockController:
+        def __init__(self):
+            self.called_amount = 0
+            self.segment_sizes = []
+
+        def should_continue(self):
+            self.called_amount += 1
+            return self.called_amount <= 3
+
+        def get_waittime(self, epoch, segment_size):
+            self.segment_sizes.append(segment_size)
+            return 1
+
+    processed = []
+    monkeypatch.setattr(time, 'sleep', MockingFunction())
+    monkeypatch.setattr(Song, 'set_process_data',
+                        lambda self: processed.append(self.file_location))
+    mock_transitioner.fast_start = lambda picker: (
+        picker.pick_first_song(['opening.wav']), 30)
+    controller = MockController()
+    core.loop(0, 'localhost', controller, mock_picker, mock_transitioner,
+              mock_communicator)
+
+    opening = mock_communicator.files[0]
+    assert isinstance(opening, Song)
+    assert opening.file_location == 'opening.wav'
+    assert opening.curr_time == 30
+    assert processed == ['opening.wav']
+    assert controller.segment_sizes == [30, 30, 30]
+    assert patched_post.args[0][0][0] == 'localhost/controller_started/'
+
+    # The first part was not merged or written by the loop.
+    assert len(mock_transitioner.write_args) == 2
+    # The picker picked the opening, so it knows it is the first song.
+    assert mock_picker.emitted[0] == 'opening.wav'
+    assert mock_transitioner.merge_args[0] == (opening, mock_picker.emitted[1])
+    assert mock_communicator.files[1:] == mock_picker.emitted[1:]
@@ -0,0 +1,87 @@
+import pytest
+import os
+import sys
+import numpy
+
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../')
+
+import dj_feet.kernels as kernels
+
+BACKENDS = [
+    pytest.param(
+        backend,
+        marks=pytest.mark.skipif(
+            kernels.numba is None and backend == 'jit',
+            reason="numba is not installed")) for backend in ['numpy', 'jit']
+]
+
+
+def reference_fade(prev_seg, next_seg, fade_steps):
+    final_seg = numpy.array([])
+    delta = 1 / len(prev_seg)
+    for p in range(0, len(prev_seg), fade_steps):
+        end = min(p + fade_steps, len(prev_seg))
+        final_seg = numpy.append(final_seg, prev_seg[p:end] * (1 - delta * (
+            (end + p) / 2)))
+    for n in range(0, len(next_seg), fade_steps):
+        end = min(n + fade_steps, len(next_seg))
+        final_seg[n:end] += next_seg[n:end] * (delta * ((end + n) / 2))
+    return final_seg
+
+
+def test_default_backend():
+    assert kernels.BACKEND == ('numpy' if kernels.numba is None else 'numba')
+    assert callable(kernels.correlation_average)
+    assert callable(kernels.fade)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('prev_len,next_len', [(1, 1), (100, 37), (37, 100),
+                                               (500, 500), (1000, 999),
+                                               (1000, 984), (1000, 985)])
+def test_correlation_average(backend, prev_len, next_len):
+    correlation_average = getattr(kernels,
+                                  'correlation_average_' + backend)
+    prev_beat = numpy.random.uniform(-1, 1, prev_len).astype(numpy.float32)
+    next_beat = numpy.random.uniform(-1, 1, next_len).astype(numpy.float32)
+    expected = numpy.average(
+        numpy.correlate(
+            prev_beat.astype(numpy.float64),
+            next_beat.astype(numpy.float64),
+            mode='valid'))
+    # The beats are in single precision, just like the songs.
+    assert abs(correlation_average(prev_beat, next_beat) - expected) < max(
+        abs(expected), 1) * 1e-5
+    with pytest.raises(ValueError):
+        correlation_average(prev_beat, numpy.array([]))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('length,fade_steps', [(1, 1), (1000, 7), (1000, 1000),
+                                               (132300, 1000)])
+def test_fade(backend, length, fade_steps):
+    fade = getattr(kernels, 'fade_' + backend)
+    prev_seg = numpy.random.uniform(-1, 1, length).astype(numpy.float32)
+    next_seg = numpy.random.uniform(-1, 1, length).astype(numpy.float32)
+    expected = reference_fade(prev_seg, next_seg, fade_steps)
+    result = fade(prev_seg, next_seg, fade_steps)
+    assert result.shape == expected.shape
+    # The reference fades in single precision.
+    assert numpy.allclose(result, expected, atol=1e-6)
+
+    shorter = fade(prev_seg, next_seg[:length // 2], fade_steps)
+    assert numpy.allclose(
+        shorter,
+        reference_fade(prev_seg, next_seg[:length // 2], fade_steps),
+        atol=1e-6)
+
+
+def test_warm_up(monkeypatch):
+    kernels.warm_up()
+    if kernels.numba is not None:
+        for kernel in [kernels._correlation_average_jit, kernels._fade_jit]:
+            # Both kernels are compiled for single and double precision.
+            assert len(kernel.signatures) >= 2
+    monkeypatch.setattr(kernels, 'numba', None)
+    kernels.warm_up()
@@ -0,0 +1,84 @@
+import pytest
+import os
+import math
+import sys
+
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../')
+
+import dj_feet.mp3 as mp3
+
+# A MPEG 2 layer III header of a 64 kbps mono frame at 22050 Hz.
+HEADER = bytes([0xFF, 0xF3, 0x80, 0xC0])
+FRAME_LENGTH = 208
+
+
+def make_frame(number):
+    return HEADER + bytes([number]) * (FRAME_LENGTH - len(HEADER))
+
+
+@pytest.fixture
+def frames():
+    yield b''.join(make_frame(i) for i in range(10))
+
+
+def test_frame_header():
+    header = mp3.FrameHeader(HEADER)
+    assert header.version == 2
+    assert header.bitrate == 64
+    assert header.sampling_rate == 22050
+    assert header.mono
+    assert header.samples == 576
+    assert header.length == FRAME_LENGTH
+    assert header.side_info_length() == 9
+
+
+@pytest.mark.parametrize('data', [
+    b'\xFF\xF3\x80', b'\x00\xF3\x80\xC0', b'\xFF\xF5\x80\xC0',
+    b'\xFF\xF3\xF0\xC0', b'\xFF\xF3\x8C\xC0'
+])
+def test_broken_frame_header(data):
+    with pytest.raises(ValueError):
+        mp3.FrameHeader(data)
+
+
+def test_parse_frames(frames):
+    info = HEADER + bytes(9) + b'Info' + bytes(FRAME_LENGTH - 17)
+    id3 = b'ID3\x04\x00\x00\x00\x00\x00\x05' + bytes(5)
+    found, samples = mp3.parse_frames(id3 + info + frames + b'TAG' +
+                                      bytes(125))
+    assert samples == 576
+    assert found == [(15 + FRAME_LENGTH * (i + 1), FRAME_LENGTH)
+                     for i in range(10)]
+
+    found, _ = mp3.parse_frames(frames + HEADER)
+    assert len(found) == 10
+    with pytest.raises(ValueError):
+        mp3.parse_frames(frames + b'garbage')
+
+
+@pytest.mark.parametrize('index', [0, 1, 2, 100])
+def test_frame_index(index):
+    start = mp3.frame_start(index, 576)
+    assert start == index * 576 - mp3.ENCODER_DELAY
+    assert mp3.frame_index(start, 576) == index
+    assert mp3.frame_index(start + 1, 576) == index
+    assert mp3.frame_index(start + 1, 576, math.ceil) == index + 1
+    assert mp3.frame_index(start - 1, 576, math.floor) == index - 1
+
+
+def test_frame_stream(frames, tmpdir):
+    filename = str(tmpdir.join('song.mp3'))
+    with open(filename, 'wb') as f:
+        f.write(frames)
+    stream = mp3.FrameStream.from_file(filename)
+    assert len(stream) == 10
+    assert stream.samples_per_frame == 576
+    assert stream.cut(2, 4) == make_frame(2) + make_frame(3)
+    assert stream.cut(3, 3) == b''
+    assert stream.cut(0, 10) == frames
+    for start, end in [(-1, 2), (5, 11), (4, 3)]:
+        with pytest.raises(IndexError):
+            stream.cut(start, end)
+    with pytest.raises(ValueError):
+        mp3.FrameStream(b'')
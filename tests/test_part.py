@@ -0,0 +1,52 @@
+import pytest
+import os
+import sys
+import numpy
+
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../')
+
+from dj_feet.part import Part, Region
+
+
+@pytest.fixture
+def time_series():
+    yield numpy.arange(100, dtype=float)
+
+
+def test_empty_part():
+    part = Part()
+    assert len(part) == 0
+    assert list(part.chunks(10)) == []
+    assert len(part.render()) == 0
+
+
+def test_part_regions(time_series):
+    gain = numpy.linspace(1, 0, 20)
+    part = Part([(time_series[:50], None)])
+    part.append(time_series[50:70], gain)
+    part.append(time_series[70:], 0.5)
+
+    assert len(part) == 100
+    assert isinstance(part.regions[0], Region)
+    assert part.regions[0].gain is None
+    assert part.regions[0].samples.base is time_series
+
+    expected = numpy.concatenate(
+        [time_series[:50], time_series[50:70] * gain, time_series[70:] * 0.5])
+    assert numpy.array_equal(part.render(), expected)
+    assert numpy.array_equal(numpy.asarray(part), expected)
+
+
+def test_part_chunks(time_series):
+    part = Part([(time_series[:25], None), (time_series[25:], 2)])
+    chunks = list(part.chunks(10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5, 10, 10, 10, 10,
+                                                10, 10, 10, 5]
+    assert all(chunk.base is time_series for chunk in chunks[:3])
+    assert numpy.array_equal(numpy.concatenate(chunks), part.render())
+
+
+def test_wrong_gain(time_series):
+    with pytest.raises(ValueError):
+        Part([(time_series, numpy.ones(10))])
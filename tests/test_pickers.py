@@ -6,14 +6,19 @@ from configparser import ConfigParser
 from helpers import MockingFunction, EPSILON, slow
 from itertools import product
 import random
+import numpy
+import scipy.optimize
 from pprint import pprint
 import gc
+import threading
+from collections import deque
 
 my_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, my_path + '/../')
 
 import dj_feet.song
 import dj_feet.helpers
+import dj_feet.workers
 import dj_feet.pickers as pickers
 from dj_feet.helpers import get_all_subclasses
 
@@ -63,6 +68,30 @@ def nca_picker(request, cache_dir, songs_dir):
     gc.collect()
 
 
+@pytest.fixture
+def synthetic_nca_picker(monkeypatch, tmpdir):
+    rng = numpy.random.RandomState(42)
+    mfcc_amount, weight_amount = 6, 3
+    for i in range(12):
+        tmpdir.join('song{}.wav'.format(i)).write('')
+
+    def characteristics(self, mfcc_amount, cache_dir):
+        song_properties = dict()
+        for song_file in self.song_files:
+            base = rng.normal(size=(mfcc_amount, mfcc_amount))
+            covariance = numpy.dot(base, base.T) + numpy.eye(mfcc_amount)
+            song_properties[song_file] = (numpy.linalg.cholesky(covariance),
+                                          rng.normal(size=mfcc_amount),
+                                          rng.uniform(115, 125))
+        pca = rng.uniform(0.5, 1, size=(mfcc_amount, weight_amount))
+        return pca, song_properties, numpy.ones(weight_amount) / weight_amount
+
+    monkeypatch.setattr(pickers.NCAPicker, 'calculate_songs_characteristics',
+                        characteristics)
+    yield pickers.NCAPicker(
+        str(tmpdir), mfcc_amount=mfcc_amount, weight_amount=weight_amount)
+
+
 @pytest.fixture(params=[{}])
 def user_feedback(request):
     yield request.param
@@ -85,6 +114,469 @@ def test_all_pickers(all_pickers):
             assert var in dj_feet.helpers.get_args(all_pickers.__init__)
 
 
+def test_base_picker_candidates(picker_base):
+    assert picker_base.get_candidates(5) == []
+
+
+def test_base_picker_first_song(picker_base):
+    assert picker_base.pick_first_song([]) is None
+    assert picker_base.pick_first_song(['a', 'b']) in ['a', 'b']
+
+
+def test_nca_picker_first_song(synthetic_nca_picker):
+    songs = sorted(synthetic_nca_picker.song_files)
+    assert synthetic_nca_picker.pick_first_song(['unknown.wav']) is None
+    assert synthetic_nca_picker.current_song is None
+
+    first = synthetic_nca_picker.pick_first_song(songs[:2] + ['unknown.wav'])
+    assert first in songs[:2]
+    assert synthetic_nca_picker.current_song == first
+    assert synthetic_nca_picker.picked_songs == [first]
+    assert synthetic_nca_picker.pick_first_song(songs) is None
+
+    # The next pick is a transition from the first song.
+    second = synthetic_nca_picker.get_next_song({}).file_location
+    assert synthetic_nca_picker.picked_songs == [first, second]
+    if second != first:
+        assert first not in synthetic_nca_picker.song_files
+
+
+def test_nca_picker_candidates(synthetic_nca_picker):
+    assert synthetic_nca_picker.get_candidates(3) == []
+    current = synthetic_nca_picker.get_next_song({}).file_location
+
+    candidates = synthetic_nca_picker.get_candidates(3)
+    assert len(candidates) == 3
+    assert current not in candidates
+
+    distances = [synthetic_nca_picker.distance(current, c) for c in candidates]
+    assert distances == sorted(distances)
+    others = set(synthetic_nca_picker.all_but_current_song()) - set(candidates)
+    for other in others:
+        assert synthetic_nca_picker.distance(current, other) >= distances[-1]
+
+
+def reference_distance(picker, song_q, song_p):
+    def kl(p, q):
+        cov_p = picker.covariance(p, picker.weights)
+        cov_q = picker.covariance(q, picker.weights)
+        cov_q_inv = numpy.linalg.inv(cov_q)
+        m_p = picker.song_properties[p][1]
+        m_q = picker.song_properties[q][1]
+        d = cov_p.shape[0]
+        return (
+            numpy.log(numpy.linalg.det(cov_q) / numpy.linalg.det(cov_p)) +
+            numpy.trace(numpy.dot(cov_q_inv, cov_p)) + numpy.dot(
+                numpy.transpose(m_p - m_q), numpy.dot(cov_q_inv,
+                                                      (m_p - m_q))) - d) / 2
+
+    return (kl(song_q, song_p) + kl(song_p, song_q)) / 2
+
+
+def test_nca_picker_distances(synthetic_nca_picker):
+    picker = synthetic_nca_picker
+    songs = sorted(picker.song_properties)
+    current, others = songs[0], songs[1:]
+
+    distances = picker.distances(current, others)
+    assert len(distances) == len(others)
+    for other, dst in zip(others, distances):
+        expected = reference_distance(picker, current, other)
+        assert abs(dst - expected) <= 1e-9 * max(1, abs(expected))
+        assert picker.distance(current, other) == picker.distance(
+            other, current)
+    assert abs(picker.distance(current, current)) <= EPSILON
+    assert len(picker.distances(current, [])) == 0
+
+    picker.current_song = current
+    assert picker.current_distances(others) == list(distances)
+    assert picker.song_distances[others[0]][current] == distances[0]
+
+
+def test_nca_picker_factorization_cache(synthetic_nca_picker, monkeypatch):
+    picker = synthetic_nca_picker
+    songs = sorted(picker.song_properties)
+    mock_factorize = MockingFunction(func=picker.factorize)
+    monkeypatch.setattr(picker, 'factorize', mock_factorize)
+
+    picker.current_song = songs[0]
+    distances = picker.current_distances(songs[1:])
+    for song_file in songs[1:4]:
+        picker.distances(song_file, songs)
+    assert len(mock_factorize.args) == 1
+    assert len(mock_factorize.args[0][0][0]) == len(songs)
+
+    covariances, inverses, log_dets = picker.factorizations(songs[:3])
+    for covariance, inverse, log_det in zip(covariances, inverses, log_dets):
+        assert numpy.allclose(numpy.dot(covariance, inverse),
+                              numpy.eye(len(covariance)))
+        assert abs(log_det - numpy.log(numpy.linalg.det(covariance))) < 1e-9
+    assert numpy.allclose(picker.covariance(songs[0], picker.weights),
+                          covariances[0])
+
+    version = picker.weights_version
+    picker.weights = numpy.array([0.5, 0.3, 0.2])
+    assert picker.weights_version == version + 1
+    assert picker.song_distances[songs[0]][songs[1]] is None
+    new_distances = picker.current_distances(songs[1:])
+    assert len(mock_factorize.args) == 2
+    assert not numpy.allclose(distances, new_distances)
+    for song_file, dst in zip(songs[1:], new_distances):
+        assert abs(dst - reference_distance(picker, songs[0],
+                                            song_file)) < 1e-9 * max(1, dst)
+
+
+@pytest.mark.parametrize('max_percent', [0, 3, 8, 50, 100, 150])
+def test_tempo_index(max_percent):
+    rng = random.Random(max_percent)
+    tempos = {'song{}'.format(i): rng.uniform(80, 160) for i in range(200)}
+    tempos.update({'same0': 120.0, 'same1': 120.0, 'edge': 120.0 / 1.08})
+    index = pickers.TempoIndex(tempos)
+    assert len(index) == len(tempos)
+
+    def expected(base, available):
+        return {
+            song
+            for song in available
+            if max_percent / 100 * tempos[song] > abs(base - tempos[song])
+        }
+
+    available = set(tempos)
+    for song in rng.sample(sorted(tempos), 50) + ['missing', 'song0']:
+        index.remove(song)
+        available.discard(song)
+    assert len(index) == len(available)
+    for base in [80, 100.5, 120, 159.9] + list(tempos.values())[:20]:
+        window = index.window(base, max_percent)
+        assert set(window) == expected(base, available)
+        assert len(window) == len(set(window))
+        assert [tempos[s] for s in window] == sorted(tempos[s]
+                                                     for s in window)
+
+    index.reset(['same0', 'edge'])
+    assert len(index) == 2
+    window = index.window(120, max_percent)
+    assert set(window) == expected(120, {'same0', 'edge'})
+    index.reset()
+    assert set(index.window(120, max_percent)) == expected(120, set(tempos))
+
+
+def test_nca_picker_close_songs(synthetic_nca_picker):
+    picker = synthetic_nca_picker
+    picker.max_tempo_percent = 2
+
+    def expected(base):
+        base_tempo = picker.song_properties[base][2]
+        return {
+            song
+            for song in picker.song_files
+            if 0.02 * picker.song_properties[song][2] > abs(
+                base_tempo - picker.song_properties[song][2])
+        }
+
+    for _ in range(8):
+        song = picker.get_next_song({}).file_location
+        assert set(picker.all_close_songs()) == expected(song)
+        assert song in picker.all_close_songs()
+    assert len(picker.tempo_index) == len(picker.song_files)
+    picker.reset_songs()
+    assert len(picker.tempo_index) == len(picker.song_files)
+    assert set(picker.all_close_songs()) == expected(picker.current_song)
+
+
+def test_nca_picker_remove_song(synthetic_nca_picker):
+    picker = synthetic_nca_picker
+    songs = sorted(picker.song_files)
+    for song in [songs[0], songs[-1], songs[5]]:
+        picker.remove_song(song)
+        assert song not in picker.song_files
+        assert song not in picker.tempo_index.window(120, 100)
+    assert sorted(picker.song_files) == sorted(
+        set(songs) - {songs[0], songs[-1], songs[5]})
+    assert len(picker.tempo_index) == len(picker.song_files)
+    with pytest.raises(KeyError):
+        picker.remove_song(songs[0])
+
+    picker.reset_songs()
+    assert sorted(picker.song_files) == songs
+    for song in songs:
+        picker.remove_song(song)
+    assert picker.song_files == []
+
+
+@pytest.mark.parametrize('force', [False, True])
+@pytest.mark.parametrize('streak', [0, 3])
+def test_nca_picker_next_song_chances(synthetic_nca_picker, monkeypatch,
+                                      force, streak):
+    picker = synthetic_nca_picker
+    picker.max_tempo_percent = 100
+    current = picker.get_next_song({}).file_location
+    picker.streak = streak
+
+    songs, chances = picker.next_song_chances(force)
+    assert abs(chances.sum() - 1) < EPSILON
+    others = list(picker.all_but_current_song())
+    assert songs[:len(others)] == others
+    if force:
+        assert current not in songs
+        self_weight = 0
+    else:
+        assert songs[-1] == current
+        self_weight = 1 / (1 + streak * picker.multiplier)
+        assert abs(chances[-1] / chances[:-1].sum() - self_weight) < 1e-9
+
+    distances = numpy.array([picker.distance(current, s) for s in others])
+    factor = 50 / max(distances.max(), 1)
+    expected = picker.normalize_chances(
+        list(numpy.exp(-factor * distances) /
+             numpy.exp(-factor * distances).sum()))
+    assert numpy.allclose(chances[:len(others)] * (1 + self_weight), expected)
+
+    rng = random.Random(0)
+    monkeypatch.setattr(random, 'random', rng.random)
+    counts = dict.fromkeys(songs, 0)
+    for _ in range(4000):
+        counts[picker._find_next_song(force)] += 1
+    for song_file, chance in zip(songs, chances):
+        assert abs(counts[song_file] / 4000 - chance) < 0.03
+
+    monkeypatch.setattr(random, 'random', lambda: 0.0)
+    assert picker._find_next_song(force) == songs[numpy.argmax(chances > 0)]
+    if not force:
+        monkeypatch.setattr(random, 'random', lambda: 1 - 1e-12)
+        assert picker._find_next_song(force) == current
+
+
+@pytest.fixture
+def transitions(synthetic_nca_picker):
+    rng = random.Random(1)
+    songs = sorted(synthetic_nca_picker.song_properties)
+    yield [
+        tuple(rng.sample(songs, 2)) + (rng.random(), ) for _ in range(15)
+    ]
+
+
+def test_nca_picker_pair_distances(synthetic_nca_picker, transitions):
+    picker = synthetic_nca_picker
+    weights = numpy.array([0.2, 0.5, 0.3])
+    pairs = [(prev, next_song) for prev, next_song, _ in transitions]
+    distances, gradients = picker.pair_distances(pairs, weights)
+    assert gradients.shape == (len(pairs), len(weights))
+
+    for (prev, next_song), dst, gradient in zip(pairs, distances, gradients):
+        assert abs(dst - picker.distance(prev, next_song, weights)) < 1e-9
+        expected = scipy.optimize.approx_fprime(
+            weights, lambda w: picker.distance(prev, next_song, w), 1e-7)
+        assert numpy.allclose(gradient, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_nca_picker_feedback_loss(synthetic_nca_picker, transitions):
+    picker = synthetic_nca_picker
+    weights = numpy.array([0.2, 0.5, 0.3])
+
+    distances = [picker.distance(p, n, weights) for p, n, _ in transitions]
+    factor = 50 / max(distances)
+    chances = picker.normalize_chances(
+        [numpy.exp(-dst * factor) for dst in distances])
+    expected = sum(
+        abs(feedback - chance)
+        for (_, _, feedback), chance in zip(transitions, chances))
+
+    loss, gradient = picker.feedback_loss(weights, transitions)
+    assert abs(loss - expected) < 1e-9
+    assert numpy.allclose(
+        gradient,
+        scipy.optimize.approx_fprime(
+            weights, lambda w: picker.feedback_loss(w, transitions)[0], 1e-7),
+        rtol=1e-3, atol=1e-5)
+    loss, gradient = picker.feedback_loss(weights, [])
+    assert loss == 0 and not gradient.any()
+
+
+def test_nca_picker_optimize_weights(synthetic_nca_picker, transitions,
+                                     monkeypatch):
+    picker = synthetic_nca_picker
+    picker.done_transitions = transitions
+    mock_minimize = MockingFunction(func=scipy.optimize.minimize)
+    monkeypatch.setattr(scipy.optimize, 'minimize', mock_minimize)
+    old_loss, _ = picker.feedback_loss(picker.weights, transitions)
+
+    picker._optimize_weights()
+    assert mock_minimize.args[0][1]['jac'] is True
+    assert abs(sum(picker.weights) - 1) < 1e-6
+    assert all(-EPSILON <= w <= 1 + EPSILON for w in picker.weights)
+    assert picker.feedback_loss(picker.weights, transitions)[0] <= old_loss
+
+
+@pytest.mark.parametrize('weights', [
+    [0.2, 0.5, 0.3],
+    [0.5, 0.9, -0.1],
+    [-1, -2, -3],
+    [3, 0, 0],
+])
+def test_nca_picker_project_weights(weights):
+    projected = pickers.NCAPicker.project_weights(numpy.array(weights))
+    assert abs(projected.sum() - 1) < EPSILON
+    assert (projected >= 0).all()
+    # The projection is the closest point, so random other points on the
+    # simplex are never closer.
+    rng = numpy.random.RandomState(0)
+    for other in rng.dirichlet(numpy.ones(len(weights)), 200):
+        assert numpy.linalg.norm(projected - weights) <= numpy.linalg.norm(
+            other - weights) + EPSILON
+
+
+def test_nca_picker_online_weights(synthetic_nca_picker, transitions,
+                                   monkeypatch):
+    picker = synthetic_nca_picker
+    picker.done_transitions = deque(maxlen=5)
+    picker.learning_rate = 0.01
+    mock_minimize = MockingFunction(func=scipy.optimize.minimize)
+    monkeypatch.setattr(scipy.optimize, 'minimize', mock_minimize)
+
+    for transition in transitions:
+        picker.done_transitions.append(transition)
+        old_weights = picker.weights
+        old_loss, _ = picker.feedback_loss(old_weights,
+                                           picker.done_transitions)
+        picker._optimize_weights()
+        assert len(picker.done_transitions) <= 5
+        assert abs(sum(picker.weights) - 1) < EPSILON
+        assert (picker.weights >= 0).all()
+        assert picker.feedback_loss(picker.weights,
+                                    picker.done_transitions)[0] <= old_loss
+    assert not mock_minimize.called
+
+
+def test_nca_picker_async_optimize(synthetic_nca_picker, transitions,
+                                   monkeypatch):
+    picker = synthetic_nca_picker
+    picker.optimize_queue = dj_feet.workers.TaskQueue('weights')
+    started, release = threading.Event(), threading.Event()
+    snapshots = []
+
+    def slow_optimize(transitions, weights):
+        snapshots.append((list(transitions), weights))
+        started.set()
+        assert release.wait(5)
+        return numpy.array(weights) + len(transitions)
+
+    monkeypatch.setattr(picker, 'optimized_weights', slow_optimize)
+    old_weights = picker.weights
+    picker.done_transitions.extend(transitions[:3])
+    picker._optimize_weights()
+    assert started.wait(5)
+
+    # New feedback while optimizing is saved for the next optimization, and
+    # picking songs does not wait for the optimization.
+    picker.done_transitions.append(transitions[3])
+    picker._optimize_weights()
+    picker.get_next_song({})
+    assert picker.weights is old_weights
+    assert len(snapshots) == 1 and len(snapshots[0][0]) == 3
+
+    release.set()
+    assert picker.flush(5)
+    assert len(snapshots) == 2
+    assert snapshots[1][0] == transitions[:4]
+    assert numpy.allclose(snapshots[1][1], numpy.array(old_weights) + 3)
+    assert numpy.allclose(picker.weights, numpy.array(old_weights) + 7)
+    assert picker.optimize_queue.pending == 0
+
+
+def test_nca_picker_async_optimize_error(synthetic_nca_picker, transitions,
+                                         monkeypatch):
+    picker = synthetic_nca_picker
+    picker.optimize_queue = dj_feet.workers.TaskQueue('weights')
+
+    def broken_optimize(transitions, weights):
+        raise ZeroDivisionError
+
+    monkeypatch.setattr(picker, 'optimized_weights', broken_optimize)
+    picker.done_transitions.extend(transitions)
+    picker._optimize_weights()
+    with pytest.raises(ZeroDivisionError):
+        picker.flush(5)
+    assert picker.flush(5)
+
+
+def test_nca_picker_ann(synthetic_nca_picker):
+    picker = synthetic_nca_picker
+    picker.max_tempo_percent = 100
+    current = picker.get_next_song({}).file_location
+    others = list(picker.all_but_current_song())
+    assert picker.nearest_songs(others) == others
+
+    picker.ann_candidates = 4
+    nearest = picker.nearest_songs(others[1:])
+    assert len(nearest) == 4
+    assert set(nearest) <= set(others[1:])
+    index, songs, positions = picker.ann_index()
+    embeddings = picker.embedding(songs, picker.weights)
+    assert numpy.allclose(index.points, embeddings)
+    distances = numpy.linalg.norm(
+        embeddings - embeddings[positions[current]], axis=1)
+    expected = sorted(others[1:], key=lambda s: distances[positions[s]])
+    assert nearest == expected[:4]
+
+    songs, chances = picker.next_song_chances(False)
+    assert len(songs) == 5 and songs[-1] == current
+    assert len(picker.get_candidates(10)) == 4
+
+    # Small changes of the weights do not rebuild the index.
+    picker.weights = picker.weights * 1.01
+    assert picker.ann_index()[0] is index
+    picker.weights = numpy.array([0.6, 0.2, 0.2])
+    assert picker.ann_index()[0] is not index
+
+
+def test_nca_picker_async_ann(synthetic_nca_picker, monkeypatch):
+    picker = synthetic_nca_picker
+    picker.optimize_queue = dj_feet.workers.TaskQueue('weights')
+    picker.ann_candidates = 4
+    index = picker.ann_index()[0]
+    builds = []
+    build_ann = picker._build_ann
+
+    def tracked_build_ann(weights):
+        builds.append(threading.current_thread())
+        return build_ann(weights)
+
+    monkeypatch.setattr(picker, '_build_ann', tracked_build_ann)
+    new_weights = [numpy.array(picker.weights) * 1.01,
+                   numpy.array([0.6, 0.2, 0.2])]
+    monkeypatch.setattr(picker, 'optimized_weights',
+                        lambda transitions, weights: new_weights.pop(0))
+
+    # A small change of the weights keeps the index.
+    picker._optimize_weights()
+    assert picker.flush(5)
+    assert picker.ann_index()[0] is index
+    assert not builds
+
+    # A large change rebuilds it in the background, and it is swapped in
+    # with the weights.
+    picker._optimize_weights()
+    assert picker.flush(5)
+    assert len(builds) == 1 and builds[0] is not threading.current_thread()
+    assert numpy.allclose(picker.weights, [0.6, 0.2, 0.2])
+    assert picker.ann_index()[0] is not index
+    assert len(builds) == 1
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'history_size': 0},
+    {'ann_candidates': 0},
+    {'learning_rate': 0},
+    {'learning_rate': -0.1},
+])
+def test_nca_picker_broken_online_config(monkeypatch, songs_dir, kwargs):
+    monkeypatch.setattr(pickers.NCAPicker, 'calculate_songs_characteristics',
+                        lambda x, y, z: (True, True, False))
+    with pytest.raises(ValueError):
+        pickers.NCAPicker(songs_dir, **kwargs)
+
+
 def test_simple_picker_no_files_left(monkeypatch, simple_picker):
     monkeypatch.setattr(os.path, 'isfile', lambda _: False)
     with pytest.raises(ValueError):
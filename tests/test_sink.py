@@ -0,0 +1,37 @@
+import pytest
+import os
+import sys
+import time
+import socket
+
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../')
+
+from dj_feet.sink import StreamSink
+
+
+def wait_for(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_stream_sink(tmpdir):
+    location = str(tmpdir.join('stream.sock'))
+    output_file = str(tmpdir.join('stream.mp3'))
+    sink = StreamSink(location, output_file)
+    assert sink.first_received is None
+
+    for data in [b'first', b'second']:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(location)
+            client.sendall(data)
+        assert wait_for(lambda: sink.data.endswith(data))
+    assert sink.data == b'firstsecond'
+    assert sink.first_received is not None
+    with open(output_file, 'rb') as f:
+        assert f.read() == b'firstsecond'
+
+    sink.close()
+    assert not os.path.exists(location)
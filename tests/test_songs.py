@@ -84,3 +84,18 @@ def test_beat_tracks_in_segement(process_base_song, start, end, expected):
         assert beats
     else:
         assert not beats
+
+
+def test_content_id(tmpdir):
+    song_file = tmpdir.join('song.wav')
+    song_file.write_binary(b'first song')
+    first = song.Song(str(song_file), process=False)
+    assert first.content_id == song.Song(str(song_file),
+                                         process=False).content_id
+
+    # Another song under the same name has another id, the id of the first
+    # song is not calculated again.
+    old_id = first.content_id
+    song_file.write_binary(b'second song')
+    assert song.Song(str(song_file), process=False).content_id != old_id
+    assert first.content_id == old_id
@@ -4,6 +4,12 @@ import sys
 import librosa
 import numpy
 import pydub
+import pickle
+import time
+import json
+import shutil
+import subprocess
+import threading
 from configparser import ConfigParser
 from helpers import EPSILON, MockingFunction
 from pprint import pprint
@@ -12,6 +18,10 @@ my_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, my_path + '/../')
 
 import dj_feet.transitioners as transitioners
+import dj_feet.mp3 as mp3
+import dj_feet.pickers as pickers
+from dj_feet.part import Part
+from dj_feet.sink import StreamSink
 from dj_feet.song import Song
 
 
@@ -104,8 +114,6 @@ def test_write_sample(inf_jukebox_transitioner, _, random_song_file,
 @pytest.mark.parametrize('same', [True, False])
 def test_merge_sample(inf_jukebox_transitioner, random_song_files, monkeypatch,
                       same):
-    mocking_append = MockingFunction(func=numpy.append)
-    monkeypatch.setattr(numpy, 'append', mocking_append)
     song1 = Song(random_song_files[0])
     if same:
         song2 = song1
@@ -113,9 +121,13 @@ def test_merge_sample(inf_jukebox_transitioner, random_song_files, monkeypatch,
         song2 = Song(random_song_files[1])
     res, time_delta = inf_jukebox_transitioner.merge(song1, song2)
     assert (time_delta == inf_jukebox_transitioner.segment_size) == same
-    assert mocking_append.called != same
+    assert isinstance(res, Part)
+    assert len(res.regions) == (1 if same else 3)
+    # Only the transition is a new array, the other regions are views.
+    assert numpy.shares_memory(res.regions[0].samples, song1.time_series)
+    assert numpy.shares_memory(res.regions[-1].samples, song2.time_series)
     assert abs(
-        librosa.core.get_duration(res, song1.sampling_rate) -
+        librosa.core.get_duration(res.render(), song1.sampling_rate) -
         inf_jukebox_transitioner.segment_size) < 0.0001
 
 
@@ -126,3 +138,860 @@ def test_time_exceeded_exception(inf_jukebox_transitioner, random_song_file):
     inf_jukebox_transitioner.merge(song, song)
     with pytest.raises(ValueError):
         inf_jukebox_transitioner.merge(song, song)
+
+
+def test_async_write_sample(song_output_file, monkeypatch):
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file, async_encode=True)
+    mocking_write = MockingFunction()
+    monkeypatch.setattr(transitioner, '_write_part', mocking_write)
+
+    for i in range(5):
+        transitioner.write_sample(i)
+    assert transitioner.wait_for_output()
+    assert [args for args, _ in mocking_write.args] == [(i, i)
+                                                        for i in range(5)]
+    assert transitioner.part_no == 5
+
+
+def test_sync_wait_for_output(inf_jukebox_transitioner, transitioner_base):
+    assert inf_jukebox_transitioner.encode_queue is None
+    assert inf_jukebox_transitioner.wait_for_output()
+    assert transitioner_base.wait_for_output(timeout=0)
+
+
+@pytest.mark.parametrize('output_format', ['wav', 'flac', 'opus', 'mp3'])
+def test_output_format(song_output_file, monkeypatch, output_format):
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file, output_format=output_format, bitrate=64)
+    mocking_encode = MockingFunction()
+    monkeypatch.setattr(transitioner.codec, 'encode', mocking_encode)
+
+    transitioner.write_sample(None)
+    assert mocking_encode.args[0][0] == (None, 22050, os.path.join(
+        song_output_file, "part0." + output_format))
+
+
+def test_unknown_output_format(song_output_file):
+    with pytest.raises(ValueError):
+        transitioners.InfJukeboxTransitioner(
+            song_output_file, output_format='wma')
+
+
+class MySong:
+    def __init__(self, file_location, curr_time=0):
+        self.file_location = file_location
+        self.curr_time = curr_time
+        self.content_id = 'content of ' + file_location
+
+
+class MyResult:
+    def __init__(self, result=None, exception=None):
+        self.result = result
+        self.exception = exception
+
+    def get(self):
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+
+def test_merge_speculation(song_output_file):
+    transitioner = transitioners.InfJukeboxTransitioner(song_output_file)
+    prev_song, next_song = MySong('prev', 30), MySong('next')
+    sample = numpy.zeros(10)
+
+    transitioner._speculations = {
+        ('prev', 30, 'next'): MyResult((sample, 12, 42, [])),
+        ('prev', 30, 'other'): MyResult(),
+    }
+
+    assert transitioner.merge(prev_song, next_song) == (sample, 12)
+    assert next_song.curr_time == 42
+    assert transitioner._speculations == {}
+
+
+def test_merge_speculation_exception(song_output_file):
+    transitioner = transitioners.InfJukeboxTransitioner(song_output_file)
+    transitioner._speculations = {
+        ('prev', 0, 'next'): MyResult(exception=ValueError('Song time')),
+    }
+
+    with pytest.raises(ValueError):
+        transitioner.merge(MySong('prev'), MySong('next'))
+
+
+def test_speculate(song_output_file):
+    class MyPool:
+        def __init__(self):
+            self.args = []
+
+        def apply_async(self, func, args, callback):
+            self.args.append((func, args, callback))
+            return MyResult()
+
+    class MyPicker:
+        def get_candidates(self, amount):
+            assert amount == 2
+            return ['prev', 'next', 'other']
+
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file, speculate_amount=2)
+    transitioner._speculator = MyPool()
+    prev_song = MySong('prev', 60)
+
+    transitioner.speculate(prev_song, MyPicker())
+    assert set(transitioner._speculations) == {('prev', 60, 'next'),
+                                               ('prev', 60, 'other')}
+    for func, args, callback in transitioner._speculator.args:
+        assert func is transitioners._speculative_merge
+        # Only the locations of the songs are sent to the workers.
+        assert args in [('prev', 60, 'next'), ('prev', 60, 'other')]
+        assert callback == transitioner._store_transitions
+
+    transitioner.speculate(prev_song, MyPicker())
+    assert len(transitioner._speculator.args) == 4
+    assert len(transitioner._speculations) == 2
+
+
+def test_speculative_merge(song_output_file, tmpdir, monkeypatch):
+    loaded = []
+
+    class LoadedSong(MySong):
+        def __init__(self, file_location):
+            super(LoadedSong, self).__init__(file_location)
+            loaded.append(file_location)
+
+    def merge(prev_song, next_song):
+        transitioner.transition_cache.put((prev_song.file_location, ), [1])
+        next_song.curr_time = prev_song.curr_time + 1
+        return 'sample', 12
+
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file, cache_dir=str(tmpdir))
+    monkeypatch.setattr(transitioners, 'Song', LoadedSong)
+    monkeypatch.setattr(transitioner, 'merge', merge)
+    transitioners._init_speculation(transitioner)
+
+    assert transitioners._speculative_merge('prev', 30, 'next') == (
+        'sample', 12, 31, [(('prev', ), [1])])
+    assert transitioners._speculative_merge('prev', 30, 'other') == (
+        'sample', 12, 31, [(('prev', ), [1])])
+    # The previous song is only loaded once and the cache is not written by
+    # the worker.
+    assert loaded == ['prev', 'next', 'other']
+    assert not os.path.exists(str(tmpdir.join('transitions.json')))
+
+
+def test_speculation_transitions(song_output_file, tmpdir):
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file, cache_dir=str(tmpdir))
+    key = ('prev.wav', 0, 100, 'next.wav', 30, 6)
+    transitioner._store_transitions(
+        (numpy.zeros(10), 12, 42, [(key, [1, 2, 0.5])]))
+    assert transitioner.transition_cache.get(key) == [1, 2, 0.5]
+
+
+def test_speculate_disabled(inf_jukebox_transitioner):
+    inf_jukebox_transitioner.speculate(MySong('prev'), None)
+    assert inf_jukebox_transitioner._speculator is None
+
+
+def test_pickle_transitioner(song_output_file):
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file, async_encode=True)
+    copy = pickle.loads(pickle.dumps(transitioner))
+    assert copy.encode_queue is None
+    assert copy.segment_size == transitioner.segment_size
+    assert transitioner.encode_queue is not None
+
+
+class BeatSong(MySong):
+    sampling_rate = 10
+    time_series = numpy.arange(1000, dtype=float)
+
+    def beat_tracks_in_segment(self, start, end):
+        return list(range(0, 1000, 10))
+
+    def next_segment(self, segment_size, begin=False):
+        return 0, segment_size * self.sampling_rate
+
+
+def test_transition_cache(song_output_file, tmpdir, monkeypatch):
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file, cache_dir=str(tmpdir))
+    mocking_fade = MockingFunction(func=lambda *_: (None, 0, 0))
+    mocking_search = MockingFunction(func=transitioner.find_similar_beats)
+    monkeypatch.setattr(transitioner, 'fade_frames', mocking_fade)
+    monkeypatch.setattr(transitioner, 'find_similar_beats', mocking_search)
+
+    prev_song, next_song = BeatSong('prev'), BeatSong('next')
+    transitioner.combine_similar_frames(prev_song, next_song, 0, 300)
+    assert mocking_search.called
+    first = mocking_fade.args[0][0]
+
+    copy = transitioners.InfJukeboxTransitioner(
+        song_output_file, cache_dir=str(tmpdir))
+    mocking_search = MockingFunction(func=copy.find_similar_beats)
+    monkeypatch.setattr(copy, 'fade_frames', mocking_fade)
+    monkeypatch.setattr(copy, 'find_similar_beats', mocking_search)
+    copy.combine_similar_frames(prev_song, next_song, 0, 300)
+    assert not mocking_search.called
+    assert mocking_fade.args[1][0] == first
+
+    copy.combine_similar_frames(prev_song, next_song, 10, 310)
+    assert mocking_search.called
+
+    # Another song with the same name is searched again.
+    mocking_search.called = False
+    next_song.content_id = 'content of another next'
+    copy.combine_similar_frames(prev_song, next_song, 0, 300)
+    assert mocking_search.called
+
+    # A search that compares less pairs can find other beats.
+    mocking_search.called = False
+    copy.max_full_comparisons = 5
+    copy.combine_similar_frames(prev_song, next_song, 0, 300)
+    assert mocking_search.called
+
+
+@pytest.mark.parametrize('max_full_comparisons', [1, 5, 50])
+def test_coarse_to_fine_search(song_output_file, monkeypatch,
+                               max_full_comparisons):
+    prev_song, next_song = BeatSong('prev'), BeatSong('next')
+    prev_song.time_series = numpy.random.uniform(-1, 1, 1000)
+    next_song.time_series = numpy.random.uniform(-1, 1, 1000)
+    beats = prev_song.beat_tracks_in_segment(0, 1000)
+
+    exhaustive = transitioners.InfJukeboxTransitioner(
+        song_output_file, segment_size=20, fade_time=6)
+    best = exhaustive.find_similar_beats(prev_song, beats, next_song, beats)
+
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file,
+        segment_size=20,
+        fade_time=6,
+        max_full_comparisons=max_full_comparisons,
+        coarse_factor=5)
+    mocking_similarity = MockingFunction(func=transitioner.beat_similarity)
+    monkeypatch.setattr(transitioner, 'beat_similarity', mocking_similarity)
+    p, n, score = transitioner.find_similar_beats(prev_song, beats, next_song,
+                                                  beats)
+
+    full = [args for args, _ in mocking_similarity.args if len(args[0]) == 10]
+    assert len(full) == max_full_comparisons
+    # Only 14 beats fall in both windows, so the exhaustive search compares
+    # 196 pairs.
+    assert len(mocking_similarity.args) == 196 + max_full_comparisons
+    assert score <= best[2]
+    assert score == transitioner.beat_similarity(
+        prev_song.time_series[beats[p]:beats[p + 1]],
+        next_song.time_series[beats[n]:beats[n + 1]])
+
+    transitioner.max_full_comparisons = 196
+    assert transitioner.find_similar_beats(prev_song, beats, next_song,
+                                           beats) == best
+
+
+def test_broken_coarse_config(song_output_file):
+    with pytest.raises(ValueError):
+        transitioners.InfJukeboxTransitioner(
+            song_output_file, max_full_comparisons=0)
+
+
+@pytest.mark.parametrize('search_budget', [0, 60])
+def test_search_budget(song_output_file, tmpdir, monkeypatch, search_budget):
+    prev_song, next_song = BeatSong('prev'), BeatSong('next')
+    prev_song.time_series = numpy.random.uniform(-1, 1, 1000)
+    next_song.time_series = numpy.random.uniform(-1, 1, 1000)
+    beats = prev_song.beat_tracks_in_segment(0, 1000)
+
+    exhaustive = transitioners.InfJukeboxTransitioner(
+        song_output_file, segment_size=20, fade_time=6)
+    best = exhaustive.find_similar_beats(prev_song, beats, next_song, beats)
+    assert exhaustive.last_search_stats == {
+        'candidates': 196,
+        'compared': 196,
+        'coverage': 1.0,
+        'timed_out': False,
+    }
+
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file,
+        segment_size=20,
+        fade_time=6,
+        coarse_factor=5,
+        search_budget=search_budget,
+        cache_dir=str(tmpdir))
+    mocking_fade = MockingFunction(func=lambda *_: (None, 0, 0))
+    monkeypatch.setattr(transitioner, 'fade_frames', mocking_fade)
+    mocking_similarity = MockingFunction(func=transitioner.beat_similarity)
+    monkeypatch.setattr(transitioner, 'beat_similarity', mocking_similarity)
+    transitioner.combine_similar_frames(prev_song, next_song, 0, 1000)
+    stats = transitioner.last_search_stats
+
+    if search_budget:
+        assert len(mocking_similarity.args) == 2 * 196
+        assert not stats['timed_out']
+        assert stats['coverage'] == 1
+        assert mocking_fade.args[0][0][1] == beats[best[0]]
+        assert len(transitioner.transition_cache) == 1
+    else:
+        # The budget also limits the coarse comparisons, but one pair is
+        # always compared coarsely and at full resolution.
+        assert len(mocking_similarity.args) == 2
+        assert stats['timed_out']
+        assert stats['compared'] == 1
+        assert stats['coverage'] == 1 / 196
+        assert len(transitioner.transition_cache) == 0
+
+
+def test_stream_parts(song_output_file, monkeypatch):
+    class MyStream:
+        def __init__(self):
+            self.chunks = []
+            self.closed = False
+
+        def write(self, sample):
+            self.chunks.append(sample)
+
+        def close(self):
+            self.closed = True
+
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file, stream_parts=True)
+    stream = MyStream()
+    mocking_open = MockingFunction(func=lambda *_: stream)
+    mocking_encode = MockingFunction()
+    monkeypatch.setattr(transitioner.codec, 'open_stream', mocking_open)
+    monkeypatch.setattr(transitioner.codec, 'encode', mocking_encode)
+
+    sample = numpy.arange(22050 * 2 + 100)
+    transitioner.write_sample(sample)
+    assert not mocking_encode.called
+    assert mocking_open.args[0][0] == (22050, os.path.join(
+        song_output_file, "part0.mp3"))
+    assert [len(chunk) for chunk in stream.chunks] == [22050, 22050, 100]
+    assert numpy.array_equal(numpy.concatenate(stream.chunks), sample)
+    assert stream.closed
+
+
+@pytest.mark.parametrize('retention_parts', [None, 1, 3])
+def test_retention_parts(tmpdir, monkeypatch, retention_parts):
+    def encode(sample, sampling_rate, filename):
+        with open(filename, 'wb') as f:
+            f.write(b'0' * sample)
+
+    transitioner = transitioners.InfJukeboxTransitioner(
+        str(tmpdir), retention_parts=retention_parts)
+    monkeypatch.setattr(transitioner.codec, 'encode', encode)
+
+    for i in range(1, 6):
+        transitioner.write_sample(i)
+    # Parts that are not released are never deleted.
+    assert len(os.listdir(str(tmpdir))) == 5
+    assert transitioner.output_usage == {
+        'parts': 5,
+        'bytes': 15,
+        'first_part': 0,
+    }
+
+    transitioner.release_parts(5)
+    transitioner.write_sample(6)
+    kept = [i for i in range(6)][-(retention_parts or 6):]
+    assert sorted(os.listdir(str(tmpdir))) == [
+        'part{}.mp3'.format(i) for i in kept
+    ]
+    assert transitioner.output_usage == {
+        'parts': len(kept),
+        'bytes': sum(i + 1 for i in kept),
+        'first_part': kept[0],
+    }
+    assert transitioners.Transitioner().output_usage is None
+
+
+def test_broken_retention_config(song_output_file):
+    with pytest.raises(ValueError):
+        transitioners.InfJukeboxTransitioner(
+            song_output_file, retention_parts=0)
+
+
+def test_renditions(tmpdir, monkeypatch):
+    encoded = []
+
+    def encode(self, sample, sampling_rate, filename):
+        encoded.append((self.bitrate, filename))
+        with open(filename, 'wb') as f:
+            f.write(b'0' * sample)
+
+    transitioner = transitioners.InfJukeboxTransitioner(
+        str(tmpdir), renditions=[64, 192], retention_parts=1)
+    monkeypatch.setattr(type(transitioner.codec), 'encode', encode)
+
+    transitioner.write_sample(10)
+    transitioner.release_parts(1)
+    transitioner.write_sample(20)
+    assert sorted(encoded[3:], key=lambda e: e[1]) == [
+        (None, str(tmpdir.join('part1.mp3'))),
+        (192, str(tmpdir.join('part1_192k.mp3'))),
+        (64, str(tmpdir.join('part1_64k.mp3'))),
+    ]
+    assert sorted(os.listdir(str(tmpdir))) == [
+        'part1.json', 'part1.mp3', 'part1_192k.mp3', 'part1_64k.mp3'
+    ]
+    with open(str(tmpdir.join('part1.json'))) as f:
+        assert json.load(f) == {
+            'part': 1,
+            'renditions': [
+                {'bitrate': None, 'file': 'part1.mp3'},
+                {'bitrate': 64, 'file': 'part1_64k.mp3'},
+                {'bitrate': 192, 'file': 'part1_192k.mp3'},
+            ],
+        }
+    assert transitioner.output_usage['parts'] == 1
+    copy = pickle.loads(pickle.dumps(transitioner))
+    assert copy._rendition_pool is None
+
+
+@pytest.fixture
+def fast_start_dirs(tmpdir, monkeypatch):
+    song_folder = tmpdir.mkdir('songs')
+    cache_dir = tmpdir.mkdir('cache')
+    output_folder = tmpdir.mkdir('output')
+
+    def encode(self, sample, sampling_rate, filename):
+        with open(filename, 'w') as f:
+            f.write('{} {}'.format(len(sample), sampling_rate))
+
+    monkeypatch.setattr(transitioners.get_codec('mp3').__class__, 'encode',
+                        encode)
+    monkeypatch.setattr(
+        librosa, 'load',
+        lambda song_file, duration: (numpy.zeros(duration * 22050), 22050))
+    yield str(song_folder), str(cache_dir), str(output_folder)
+
+
+def test_process_song_file(fast_start_dirs):
+    song_folder, cache_dir, _ = fast_start_dirs
+    song_file = os.path.join(song_folder, 'song.wav')
+    # Nothing is encoded for a feature that is not used.
+    transitioners.InfJukeboxTransitioner.process_song_file(
+        cache_dir, song_file, segment_size=10)
+    assert os.listdir(cache_dir) == []
+
+    transitioners.InfJukeboxTransitioner.process_song_file(
+        cache_dir, song_file, segment_size=10, fast_start=True)
+    assert os.listdir(cache_dir) == ['song_opening10.mp3']
+    with open(os.path.join(cache_dir, 'song_opening10.mp3')) as f:
+        assert f.read() == '220500 22050'
+    assert transitioners.Transitioner.process_song_file(song_file) is None
+
+
+@pytest.mark.parametrize('enabled', [True, False])
+def test_fast_start(fast_start_dirs, enabled):
+    song_folder, cache_dir, output_folder = fast_start_dirs
+    for song in ['a', 'b', 'c']:
+        song_file = os.path.join(song_folder, song + '.wav')
+        open(song_file, 'w').close()
+        if song != 'c':
+            transitioners.InfJukeboxTransitioner.process_song_file(
+                cache_dir, song_file, segment_size=10, fast_start=True)
+
+    transitioner = transitioners.InfJukeboxTransitioner(
+        output_folder,
+        segment_size=10,
+        cache_dir=cache_dir,
+        song_folder=song_folder,
+        fast_start=enabled)
+    picker = pickers.SimplePicker(song_folder)
+    result = transitioner.fast_start(picker)
+
+    if enabled:
+        song_file, segment_size = result
+        assert segment_size == 10
+        assert song_file in [
+            os.path.join(song_folder, song + '.wav') for song in ['a', 'b']
+        ]
+        # The picker picked the song, so it will not pick it again.
+        assert song_file not in picker.song_files
+        assert os.listdir(output_folder) == ['part0.mp3']
+        assert transitioner.part_no == 1
+        assert transitioner.output_usage['parts'] == 1
+    else:
+        assert result is None
+        assert os.listdir(output_folder) == []
+        assert transitioner.part_no == 0
+
+
+def test_fast_start_without_openings(fast_start_dirs):
+    song_folder, cache_dir, output_folder = fast_start_dirs
+    transitioner = transitioners.InfJukeboxTransitioner(
+        output_folder,
+        cache_dir=cache_dir,
+        song_folder=song_folder,
+        fast_start=True)
+    assert transitioner.fast_start(pickers.Picker()) is None
+    assert transitioners.Transitioner().fast_start(pickers.Picker()) is None
+
+    # No opening is used if the picker cannot pick any of them.
+    open(os.path.join(song_folder, 'a.wav'), 'w').close()
+    transitioners.InfJukeboxTransitioner.process_song_file(
+        cache_dir, os.path.join(song_folder, 'a.wav'), fast_start=True)
+    assert transitioner.fast_start(pickers.SimplePicker(output_folder)) is None
+    assert os.listdir(output_folder) == []
+
+
+def test_stream_part_regions(song_output_file, monkeypatch):
+    transitioner = transitioners.InfJukeboxTransitioner(
+        song_output_file, stream_parts=True)
+    chunks = []
+
+    class MyStream:
+        write = chunks.append
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(transitioner.codec, 'open_stream',
+                        lambda *_: MyStream())
+    time_series = numpy.arange(22050 * 3, dtype=float)
+    part = Part([(time_series[:22050 + 10], None), (numpy.ones(20), 0.5),
+                 (time_series[100:200], None)])
+    transitioner.write_sample(part)
+
+    assert [len(chunk) for chunk in chunks] == [22050, 10, 20, 100]
+    assert chunks[0].base is time_series
+    assert chunks[-1].base is time_series
+    assert numpy.array_equal(numpy.concatenate(chunks), part.render())
+
+
+def test_write_part_regions(song_output_file, monkeypatch):
+    transitioner = transitioners.InfJukeboxTransitioner(song_output_file)
+    mocking_encode = MockingFunction()
+    monkeypatch.setattr(transitioner.codec, 'encode', mocking_encode)
+
+    # The part is given to the codec as is, so it is not copied.
+    part = Part([(numpy.arange(5), None), (numpy.ones(2), 2)])
+    transitioner.write_sample(part)
+    assert mocking_encode.args[0][0][0] is part
+
+
+def make_frames(first, amount):
+    # Frames of a 64 kbps mono MPEG 2 layer III stream at 22050 Hz.
+    return b''.join(
+        bytes([0xFF, 0xF3, 0x80, 0xC0, i % 256]) + bytes(203)
+        for i in range(first, first + amount))
+
+
+class PassthroughSong(MySong):
+    sampling_rate = 22050
+
+
+@pytest.fixture
+def passthrough_transitioner(tmpdir, monkeypatch):
+    transitioner = transitioners.InfJukeboxTransitioner(
+        str(tmpdir), cache_dir=str(tmpdir), passthrough=True)
+    streams = {
+        'a': mp3.FrameStream(make_frames(0, 200)),
+        'b': mp3.FrameStream(make_frames(100, 100)),
+    }
+    monkeypatch.setattr(transitioner, '_frame_stream', streams.get)
+    yield transitioner
+
+
+@pytest.mark.parametrize('kwargs', [{
+    'output_format': 'wav'
+}, {
+    'cache_dir': None
+}])
+def test_passthrough_options(tmpdir, kwargs):
+    options = {'cache_dir': str(tmpdir), 'passthrough': True}
+    options.update(kwargs)
+    with pytest.raises(ValueError):
+        transitioners.InfJukeboxTransitioner(str(tmpdir), **options)
+
+
+def test_process_song_file_passthrough(fast_start_dirs, monkeypatch):
+    song_folder, cache_dir, _ = fast_start_dirs
+    monkeypatch.setattr(
+        librosa, 'load',
+        lambda song_file: (numpy.zeros(60 * 22050), 22050))
+    transitioners.InfJukeboxTransitioner.process_song_file(
+        cache_dir,
+        os.path.join(song_folder, 'song.wav'),
+        segment_size=10,
+        bitrate=64,
+        passthrough=True)
+    assert os.listdir(cache_dir) == ['song_frames64.mp3']
+
+    transitioners.InfJukeboxTransitioner.process_song_file(
+        cache_dir,
+        os.path.join(song_folder, 'song.wav'),
+        segment_size=10,
+        bitrate=64,
+        fast_start=True,
+        passthrough=True)
+    assert sorted(os.listdir(cache_dir)) == [
+        'song_frames64.mp3', 'song_opening10.mp3'
+    ]
+    with open(os.path.join(cache_dir, 'song_frames64.mp3')) as f:
+        assert f.read() == '1323000 22050'
+    with open(os.path.join(cache_dir, 'song_opening10.mp3')) as f:
+        assert f.read() == '220500 22050'
+
+
+@pytest.mark.parametrize('prev_mid', [100000, 123456, 200001])
+@pytest.mark.parametrize('next_mid', [70000, 98765, 120000])
+def test_passthrough_shift(passthrough_transitioner, prev_mid, next_mid):
+    prev_song, next_song = PassthroughSong('a'), PassthroughSong('b')
+    shift = passthrough_transitioner._passthrough_shift(
+        prev_song, prev_mid, next_song, next_mid)
+    assert -288 < shift <= 288
+
+    offset = 3 * 22050
+    fresh = (prev_mid - offset + mp3.ENCODER_DELAY) % 576 + 2 * offset + (
+        -(next_mid + shift + offset + mp3.ENCODER_DELAY)) % 576
+    assert fresh % 576 == 0
+
+    assert passthrough_transitioner._passthrough_shift(
+        prev_song, prev_mid, PassthroughSong('c'), next_mid) == 0
+
+
+def test_passthrough_part(passthrough_transitioner, monkeypatch):
+    encoded = []
+
+    def encode(sample, sampling_rate, filename):
+        encoded.append(sample)
+        with open(filename, 'wb') as f:
+            f.write(make_frames(50, 8))
+
+    monkeypatch.setattr(passthrough_transitioner.passthrough, 'encode',
+                        encode)
+    prev_series = numpy.arange(100000, dtype=float)
+    next_series = -numpy.arange(100000, dtype=float)
+    part = Part()
+    part.append(prev_series[1000:21000], source='a', start=1000)
+    part.append(numpy.ones(1280), 0.5)
+    part.append(next_series[5000:15000], source='b', start=5000)
+
+    # The frames of the first song start at the frame nearest to the start
+    # and the frames of the next song end at the frame nearest to the end.
+    assert passthrough_transitioner._passthrough_part(part) == (
+        make_frames(4, 34) + make_frames(54, 3) + make_frames(111, 17))
+
+    # The encoded sample starts with whole frames of the first song before
+    # the delay of the encoder.
+    sample, = encoded
+    lead = 47 + mp3.CONTEXT_FRAMES * 576
+    lead, samples, tail = (sample[:lead], sample[lead:lead + 1728],
+                           sample[lead + 1728:])
+    assert numpy.array_equal(lead, prev_series[20783 - len(lead):20783])
+    assert numpy.array_equal(samples[:217], prev_series[20783:21000])
+    assert numpy.array_equal(samples[217:1497], numpy.full(1280, 0.5))
+    assert numpy.array_equal(samples[1497:], next_series[5000:5231])
+    assert numpy.array_equal(tail, next_series[5231:5231 + 4 * 576])
+
+
+def test_passthrough_part_fallback(passthrough_transitioner):
+    time_series = numpy.arange(100000, dtype=float)
+    part = Part()
+    part.append(time_series[1000:21000], source='a', start=1000)
+    part.append(numpy.ones(1000), 0.5)
+    part.append(time_series[5000:15000], source='b', start=5000)
+    # The transition does not fill a whole amount of frames.
+    assert passthrough_transitioner._passthrough_part(part) is None
+
+    for regions in [[(numpy.ones(10), 0.5)],
+                    [(time_series[:20000], None, 'c', 0)],
+                    [(time_series[:100], None, 'a', 0)]]:
+        assert passthrough_transitioner._passthrough_part(
+            Part(regions)) is None
+
+
+@pytest.mark.parametrize('frames', [b'frames', None])
+def test_write_passthrough(passthrough_transitioner, monkeypatch, frames):
+    mocking_encode = MockingFunction()
+    monkeypatch.setattr(passthrough_transitioner.codec, 'encode',
+                        mocking_encode)
+    monkeypatch.setattr(passthrough_transitioner, '_passthrough_part',
+                        lambda part: frames)
+
+    passthrough_transitioner.write_sample(Part([(numpy.arange(5), None)]))
+    part_file = os.path.join(passthrough_transitioner.output_folder,
+                             'part0.mp3')
+    assert mocking_encode.called == (frames is None)
+    assert passthrough_transitioner._rendition_pool is None
+    if frames is not None:
+        with open(part_file, 'rb') as f:
+            assert f.read() == frames
+
+
+def test_part_cache(tmpdir, monkeypatch):
+    output_folder = tmpdir.mkdir('output')
+
+    def encode(self, sample, sampling_rate, filename):
+        with open(filename, 'w') as f:
+            f.write(str(len(sample)))
+
+    mocking_encode = MockingFunction(func=encode)
+    monkeypatch.setattr(transitioners.get_codec('mp3').__class__, 'encode',
+                        lambda *args: mocking_encode(*args))
+
+    def make_transitioner(**kwargs):
+        return transitioners.InfJukeboxTransitioner(
+            str(output_folder),
+            cache_dir=str(tmpdir),
+            part_cache_size=1,
+            **kwargs)
+
+    transitioner = make_transitioner()
+    transitioner.write_sample(Part([(numpy.arange(3), None)], ('a', 0, 3)))
+    assert len(mocking_encode.args) == 1
+
+    # A new session creating the same part copies it from the cache.
+    transitioner = make_transitioner()
+    transitioner.write_sample(Part([(numpy.arange(3), None)], ('a', 0, 3)))
+    assert len(mocking_encode.args) == 1
+    with open(str(output_folder.join('part0.mp3'))) as f:
+        assert f.read() == '3'
+
+    transitioner.write_sample(Part([(numpy.arange(4), None)], ('a', 0, 4)))
+    transitioner.write_sample(numpy.arange(4))
+    make_transitioner(fade_steps=10).write_sample(
+        Part([(numpy.arange(3), None)], ('a', 0, 3)))
+    assert len(mocking_encode.args) == 4
+
+    with pytest.raises(ValueError):
+        transitioners.InfJukeboxTransitioner(
+            str(output_folder), part_cache_size=1)
+
+
+def test_merge_part_keys(inf_jukebox_transitioner):
+    time_series = numpy.arange(1000, dtype=float)
+    song = BeatSong('songs/a.wav')
+    song.time_series = time_series
+    song.next_segment = lambda segment_size: (100, 200)
+    song.segment_size_left = lambda segment_size: True
+    part, _ = inf_jukebox_transitioner.merge(song, song)
+    assert part.key == ('content of songs/a.wav', 100, 200)
+
+
+needs_ffmpeg = pytest.mark.skipif(
+    shutil.which(pydub.AudioSegment.converter) is None,
+    reason="ffmpeg is needed to stream")
+
+
+@needs_ffmpeg
+def test_stream_transitioner(tmpdir):
+    location = str(tmpdir.join('stream.sock'))
+    transitioner = transitioners.StreamTransitioner(
+        str(tmpdir), stream_location=location)
+    # Nobody is listening yet, so the part is dropped.
+    transitioner.write_sample(numpy.zeros(22050))
+    assert transitioner._stream is None
+
+    sink = StreamSink(location)
+    try:
+        transitioner.write_sample(numpy.random.uniform(-0.5, 0.5, 22050))
+        transitioner.write_sample(
+            Part([(numpy.random.uniform(-0.5, 0.5, 22050), 0.5)]))
+        transitioner.close()
+        assert transitioner._stream is None
+        # The parts form one stream of about two seconds.
+        for _ in range(100):
+            frames, samples = mp3.parse_frames(bytes(sink.data))
+            if len(frames) * samples >= 2 * 22050:
+                break
+            time.sleep(0.01)
+        assert 2 * 22050 <= len(frames) * samples < 3 * 22050
+    finally:
+        sink.close()
+
+    # The listener is gone, so the stream stops without raising.
+    sink = StreamSink(location)
+    transitioner.write_sample(numpy.zeros(22050))
+    sink.close()
+    for _ in range(3):
+        transitioner.write_sample(numpy.zeros(22050 * 10))
+    assert transitioner._stream is None
+    assert transitioners.StreamTransitioner.process_song_file('a') is None
+
+
+@needs_ffmpeg
+def test_stream_transitioner_fifo(tmpdir):
+    location = str(tmpdir.join('stream.fifo'))
+    os.mkfifo(location)
+    transitioner = transitioners.StreamTransitioner(
+        str(tmpdir), stream_location=location)
+    # Nobody reads the pipe yet, so the part is dropped without blocking.
+    transitioner.write_sample(numpy.zeros(22050))
+    assert transitioner._stream is None
+
+    received = []
+    fd = os.open(location, os.O_RDONLY | os.O_NONBLOCK)
+    os.set_blocking(fd, True)
+
+    def listen():
+        with os.fdopen(fd, 'rb') as f:
+            received.append(f.read())
+
+    transitioner.write_sample(numpy.zeros(22050))
+    assert transitioner._stream is not None
+    # The pipe has a writer now, so the listener does not see its end yet.
+    listener = threading.Thread(target=listen)
+    listener.start()
+    transitioner.close()
+    listener.join()
+    assert mp3.parse_frames(received[0])[0]
+
+
+@needs_ffmpeg
+def test_passthrough_part_encoded(tmpdir, monkeypatch):
+    transitioner = transitioners.InfJukeboxTransitioner(
+        str(tmpdir), cache_dir=str(tmpdir), passthrough=True)
+    t = numpy.arange(4 * 22050) / 22050
+    series = {
+        'a': 0.5 * numpy.sin(2 * numpy.pi * (200 * t + 400 * t**2)),
+        'b': 0.5 * numpy.sin(2 * numpy.pi * (1500 * t - 300 * t**2)),
+    }
+    streams = {}
+    for source, time_series in series.items():
+        stream_file = str(tmpdir.join(source + '.mp3'))
+        transitioner.passthrough.encode(time_series, 22050, stream_file)
+        streams[source] = mp3.FrameStream.from_file(stream_file)
+    monkeypatch.setattr(transitioner, '_frame_stream', streams.get)
+
+    # Both songs are cut at frame boundaries, so the crossfade fills whole
+    # frames.
+    prev_start, prev_end, next_start = [
+        mp3.frame_start(i, 576) for i in (10, 80, 60)
+    ]
+    fade = numpy.linspace(1, 0, 40 * 576)
+    part = Part()
+    part.append(series['a'][prev_start:prev_end], source='a',
+                start=prev_start)
+    part.append(series['a'][prev_end:prev_end + len(fade)] * fade +
+                series['b'][next_start - len(fade):next_start] * (1 - fade))
+    part.append(series['b'][next_start:next_start + 40 * 576], source='b',
+                start=next_start)
+    part_file = str(tmpdir.join('part.mp3'))
+    with open(part_file, 'wb') as f:
+        f.write(transitioner._passthrough_part(part))
+
+    samples = numpy.frombuffer(subprocess.check_output([
+        pydub.AudioSegment.converter, '-v', 'quiet', '-i', part_file, '-f',
+        'f64le', '-'
+    ]), dtype='<f8')
+    expected = part.render()
+    # The coding error is the same around both joins as in the frames that
+    # were passed through, the first and last frames have no neighbours.
+    error = numpy.abs(samples[:len(expected)] - expected)[576:-576]
+    assert len(samples) >= len(expected)
+    assert numpy.max(error) < 0.1
+
+
+@pytest.mark.parametrize('segment_size,fade_time', [(5, 5), (5, 6)])
+def test_fade_longer_than_part(song_output_file, segment_size, fade_time):
+    with pytest.raises(ValueError):
+        transitioners.InfJukeboxTransitioner(
+            song_output_file, segment_size=segment_size, fade_time=fade_time)
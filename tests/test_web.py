@@ -15,6 +15,7 @@ my_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, my_path + '/../')
 
 import dj_feet.pickers as pickers
+import dj_feet.transitioners as transitioners
 import dj_feet.web as web
 import dj_feet.core as core
 import dj_feet.config as config
@@ -85,6 +86,7 @@ def test_setup(monkeypatch):
         stop_worker(web.app.queue, web.app.worker)
         assert web.app.config['INPUT_DIR'] == '/in'
         assert web.app.config['OUTPUT_DIR'] == '/out'
+        assert web.app.config['CACHE_DIR'] is None
 
     assert my_post_request.called
     assert len(my_post_request.args[0][0]) == 1
@@ -183,6 +185,36 @@ def test_add_music(monkeypatch, app_client, throw, url, expected_code):
         monkeypatch.undo()
 
 
+def test_cache_directory(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    with web.cache_directory(cache_dir) as found:
+        assert found == cache_dir
+        assert os.path.isdir(cache_dir)
+    assert os.path.isdir(cache_dir)
+
+    with web.cache_directory() as found:
+        assert os.path.isdir(found)
+    assert not os.path.exists(found)
+
+
+@pytest.mark.parametrize("persistent", [True, False])
+def test_backend_worker_cache_dir(persistent, tmpdir, monkeypatch):
+    mocked_post = MockingFunction()
+    monkeypatch.setattr(requests, 'post', mocked_post)
+    monkeypatch.setattr(config.Config, 'FIXED_OPTIONS', {})
+
+    worker_queue = queue.Queue()
+    worker_queue.put((web.STOP, ))
+    cache_dir = str(tmpdir.join('cache')) if persistent else None
+
+    web.backend_worker(worker_queue, 'remote', 1, '/output', cache_dir)
+
+    used_dir = config.Config.FIXED_OPTIONS['cache_dir']
+    if persistent:
+        assert used_dir == cache_dir
+    assert os.path.isdir(used_dir) == persistent
+
+
 @pytest.mark.parametrize("raises", [Exception, ValueError, MemoryError])
 def test_exception_backend_worker(raises, monkeypatch):
     mocked_post = MockingFunction()
@@ -235,6 +267,16 @@ def test_backend_worker(monkeypatch):
             MyPicker.args.append((song_file, rest))
             MyPicker.called = True
 
+    class MyTransitioner(transitioners.Transitioner):
+        args = []
+
+        def __init__(self, output_folder, segment_size=12):
+            pass
+
+        @staticmethod
+        def process_song_file(cache_dir, song_file, segment_size):
+            MyTransitioner.args.append((cache_dir, song_file, segment_size))
+
     mocked_get_controller = MockingFunction(lambda: 'Controller')
     mocked_get_picker = MockingFunction(lambda: 'Picker')
     mocked_get_transitioner = MockingFunction(lambda: 'Transitioner')
@@ -253,7 +295,11 @@ def test_backend_worker(monkeypatch):
     monkeypatch.setattr(pydub.AudioSegment, 'from_mp3', mocked_from_mp3)
     # This also patches .export as this is done in MyAudioSegement
 
-    mocked_get_class = MockingFunction(lambda: MyPicker, simple=True)
+    mocked_get_class = MockingFunction(
+        lambda basecls, _: {
+            pickers.Picker: MyPicker,
+            transitioners.Transitioner: MyTransitioner,
+        }[basecls])
     monkeypatch.setattr(config.Config, 'get_class', mocked_get_class)
 
     mocked_post = MockingFunction()
@@ -321,6 +367,11 @@ def test_backend_worker(monkeypatch):
     assert mocked_get_class.called
     assert MyPicker.called
     assert MyPicker.args == [(my_segment.args[0][0], 101)]
+    assert len(MyTransitioner.args) == 1
+    cache_dir, song_file, segment_size = MyTransitioner.args[0]
+    assert cache_dir.startswith('/tmp/')
+    assert song_file == my_segment.args[0][0]
+    assert segment_size == 12
 
 
 def test_setting_user_config(incomplete_app_client):
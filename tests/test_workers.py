@@ -0,0 +1,48 @@
+import pytest
+import os
+import sys
+import threading
+
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../')
+
+import dj_feet.workers as workers
+
+
+@pytest.fixture
+def task_queue():
+    task_queue = workers.TaskQueue('test')
+    yield task_queue
+    task_queue.close()
+
+
+def test_task_queue_order(task_queue):
+    done = []
+    for i in range(50):
+        task_queue.put(done.append, i)
+    assert task_queue.join()
+    assert done == list(range(50))
+    assert task_queue.pending == 0
+
+
+def test_task_queue_timeout(task_queue):
+    event = threading.Event()
+    task_queue.put(event.wait)
+    assert task_queue.pending == 1
+    assert not task_queue.join(timeout=0)
+    event.set()
+    assert task_queue.join()
+    assert task_queue.pending == 0
+
+
+def test_task_queue_exception(task_queue):
+    def raising():
+        raise ValueError('WAAA!')
+
+    done = []
+    task_queue.put(raising)
+    task_queue.put(done.append, 1)
+    with pytest.raises(ValueError):
+        task_queue.join()
+    assert done == [1]
+    assert task_queue.join()
@@ -20,10 +20,10 @@ def test_app_test(monkeypatch):
 
     assert mocked_start.called
     assert mocked_getenv.called
-    assert len(mocked_getenv.args) == 4
+    assert len(mocked_getenv.args) == 5
 
     for idx, var in enumerate([
             'SDAAS_ID', 'SDAAS_INPUT_DIR', 'SDAAS_OUTPUT_DIR',
-            'SDAAS_REMOTE_URL'
+            'SDAAS_REMOTE_URL', 'SDAAS_CACHE_DIR'
     ]):
         assert var == mocked_getenv.args[idx][0][0]